@@ -0,0 +1,223 @@
+# api.py
+# Local JSON HTTP API for the calculation engine, so other tools can use
+# series bounds, layout validation and catalog lookups without the UI.
+#
+#   python api.py [--host 127.0.0.1] [--port 8502]
+#
+#   GET  /health
+#   GET  /modules?q=...&limit=50     GET /modules/<model_number>
+#   GET  /pcs?q=...&limit=50         GET /pcs/<name>
+#   POST /bounds    {"pcs", "module", "t_min"}
+#   POST /validate  {"pcs", "module", "t_min", "series"}
+#
+# "pcs" / "module" are catalog keys or full spec dicts. POST bodies may be
+# a JSON list of requests; a list is answered with a list, and /validate
+# checks the whole list in one vectorized engine pass per t_min.
+#
+# The server is a plain asyncio HTTP/1.1 loop with keep-alive. The catalog
+# comes from db.load_pcs()/load_modules(), a snapshot shared with every
+# other user in the process. Bounds go through the engine's LRU cache.
+# Catalog loads and SQLite searches run in worker threads so the event loop
+# never blocks on them.
+import argparse
+import asyncio
+import json
+import sys
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import db
+import engine
+
+DEFAULT_PORT = 8502
+MAX_BODY = 8 * 1024 * 1024
+MAX_SERIES = 1000         # upper bound accepted for one series count
+KEEP_ALIVE_TIMEOUT = 30   # seconds an idle connection is kept open
+
+_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+async def _catalogs():
+    # A snapshot miss runs SQL, so load off the event loop
+    return {"pcs": await asyncio.to_thread(db.load_pcs), "module": await asyncio.to_thread(db.load_modules)}
+
+def _spec(kind, value, catalogs):
+    if isinstance(value, dict):
+        return value
+    catalog = catalogs[kind]
+    if not isinstance(value, str) or value not in catalog:
+        raise ApiError(404, f"unknown {kind}: {value}")
+    return catalog[value]
+
+def _t_min(req):
+    try:
+        return float(req["t_min"])
+    except (KeyError, TypeError, ValueError):
+        raise ApiError(400, "t_min is required")
+
+def _series(req):
+    series = req.get("series")
+    if not isinstance(series, list) or not all(isinstance(r, list) for r in series):
+        raise ApiError(400, "series must be a list of lists")
+    # bool is an int subclass; fractional or negative counts are not silently truncated
+    if not all(type(v) is int and 0 <= v <= MAX_SERIES for row in series for v in row):
+        raise ApiError(400, f"series counts must be integers from 0 to {MAX_SERIES}")
+    return series
+
+def bounds(req, catalogs):
+    pcs, module = _spec("pcs", req.get("pcs"), catalogs), _spec("module", req.get("module"), catalogs)
+    t_max = req.get("t_max", engine.T_MAX)
+    min_s, max_s = engine.cached_series_bounds(pcs, module, _t_min(req), t_max)
+    return {"min_series": min_s, "max_series": max_s}
+
+def validate(reqs, catalogs):
+    """Validate a list of layout requests, batched per t_min."""
+    results = [None] * len(reqs)
+    groups = {}
+    for k, req in enumerate(reqs):
+        series = _series(req)
+        groups.setdefault((_t_min(req), req.get("t_max", engine.T_MAX)), []).append(
+            (k, _spec("pcs", req.get("pcs"), catalogs), _spec("module", req.get("module"), catalogs), series))
+    for (t_min, t_max), items in groups.items():
+        out = engine.validate_layouts_batch([i[1] for i in items], [i[2] for i in items],
+                                            [i[3] for i in items], t_min, t_max)
+        for n, ((k, _, module, _), errors) in enumerate(zip(items, engine.layout_errors(out))):
+            total = int(out["total"][n])
+            results[k] = {
+                "valid": not errors,
+                "errors": [list(e) for e in errors],
+                "total_modules": total,
+                "power_w": total * module["pmax_stc"],
+                "min_series": int(out["min_series"][n]),
+                "max_series": int(out["max_series"][n]),
+            }
+    return results
+
+async def handle(method, path, body=b""):
+    """Dispatch one request; returns (status, JSON-serializable payload)."""
+    url = urlsplit(path)
+    parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    try:
+        if parts == ["health"]:
+            return 200, {"status": "ok", "calc_cache": engine.calc_cache_stats()}
+        if parts and parts[0] in ("modules", "pcs"):
+            if method != "GET":
+                raise ApiError(405, "use GET")
+            kind = parts[0]
+            if len(parts) == 2:
+                spec_kind = "pcs" if kind == "pcs" else "module"
+                return 200, dict(_spec(spec_kind, parts[1], await _catalogs()), key=parts[1])
+            search = db.search_pcs if kind == "pcs" else db.search_modules
+            try:
+                limit = int(query.get("limit", 50))
+            except ValueError:
+                raise ApiError(400, "limit must be an integer")
+            return 200, await asyncio.to_thread(search, query.get("q", ""), limit)
+        if parts in (["bounds"], ["validate"]):
+            if method != "POST":
+                raise ApiError(405, "use POST")
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise ApiError(400, "body is not valid JSON")
+            many = isinstance(payload, list)
+            reqs = payload if many else [payload]
+            if not all(isinstance(r, dict) for r in reqs):
+                raise ApiError(400, "body must be an object or a list of objects")
+            catalogs = await _catalogs()
+            results = validate(reqs, catalogs) if parts == ["validate"] else [bounds(r, catalogs) for r in reqs]
+            return 200, results if many else results[0]
+        raise ApiError(404, f"no such endpoint: {url.path}")
+    except ApiError as exc:
+        return exc.status, {"error": str(exc)}
+    except (KeyError, TypeError, ValueError, OverflowError) as exc:
+        # Spec dicts with missing / non-numeric fields
+        return 400, {"error": f"invalid request: {exc!r}"}
+    except Exception as exc:
+        # Never drop the connection without an answer
+        return 500, {"error": f"internal error: {exc!r}"}
+
+async def _read_request(reader):
+    """Read one HTTP/1.1 request; returns (method, path, headers, body) or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ApiError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise ApiError(400, "invalid Content-Length")
+    if length > MAX_BODY:
+        raise ApiError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+def _response(status, payload, keep_alive):
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {_STATUS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + data
+
+async def _serve_connection(reader, writer):
+    try:
+        while True:
+            try:
+                req = await asyncio.wait_for(_read_request(reader), KEEP_ALIVE_TIMEOUT)
+            except ApiError as exc:
+                writer.write(_response(exc.status, {"error": str(exc)}, False))
+                break
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                break
+            if req is None:
+                break
+            method, path, headers, body = req
+            keep_alive = headers.get("connection", "").lower() != "close"
+            status, payload = await handle(method, path, body)
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT):
+    db.init_db()
+    return await asyncio.start_server(_serve_connection, host, port)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="api.py", description="Local JSON API for bounds / layout validation")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    async def run():
+        server = await serve(args.host, args.port)
+        print(f"listening on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
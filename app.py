@@ -5,10 +5,30 @@ import qrcode
 from io import BytesIO
 
 from auth import check_login, create_user, update_password
+from engine import (
+    T_MAX, T_MIN_OPTIONS, CIRCUITS_PER_MPPT,
+    circuits_per_mppt, cached_series_bounds, cached_validate_layout, compatibility_table
+)
+from solver import solve_layouts
+from planner import find_systems
+from weather import load_hourly, voltage_report, yield_batch, energy_yield
+from stations import nearest_stations, stations_near_postal, site_temperatures
+from degradation import (
+    DEGRADATION_RATE, LIFETIME_YEARS, degradation_rate, project_layout, catalog_sweep
+)
+from tolerance import (
+    DEFAULT_SAMPLES, VOC_SD, VMPP_SD, TEMP_COEFF_SD, T_MIN_SD, exceedance_probability
+)
 from db   import (
     init_db,
-    save_module, load_modules, delete_module,
-    save_pcs,    load_pcs,    delete_pcs
+    save_module, load_modules, delete_module, rename_module,
+    save_pcs,    load_pcs,    delete_pcs,    update_pcs,
+    import_catalog, export_catalog,
+    search_modules, search_pcs,
+    load_modules_page, load_pcs_page, list_manufacturers, sortable_columns,
+    compatible_modules, load_stations,
+    save_project, delete_project, list_projects,
+    save_project_units, delete_project_unit, load_project
 )
 
 # Register our service worker
@@ -201,6 +221,104 @@ st.markdown(
 # ─── INIT DATABASE ───
 init_db()
 
+SEARCH_LIMIT = 50  # options shipped to each catalog selectbox
+
+def catalog_select(label, kind, key, catalog, format_func=str):
+    """Search box + selectbox limited to the top SEARCH_LIMIT matches."""
+    search = search_pcs if kind == "pcs" else search_modules
+    hint   = "名称・型番で検索" if kind == "pcs" else "型番・メーカー名で検索"
+    query  = st.text_input("🔍 検索", key=f"{key}_q", placeholder=hint)
+    options = search(query, SEARCH_LIMIT)
+    if query and not options:
+        st.caption("該当なし")
+        options = search("", SEARCH_LIMIT)
+    # Keep the current selection selectable even if it is not in the matches
+    current = st.session_state.get(key)
+    if current in catalog and current not in options:
+        options = [current] + options
+    return st.selectbox(label, options, key=key, format_func=format_func)
+
+PAGE_SIZE = 20  # rows per catalog table page
+
+PCS_COLUMNS = {
+    "name": "名称",
+    "model_number": "型番",
+    "max_voltage": "最大電圧 (V)",
+    "mppt_min_voltage": "最小電圧 (V)",
+    "mppt_count": "MPPT数",
+    "mppt_max_current": "最大電流 (A)",
+    "circuits_per_mppt": "回路数/MPPT",
+    "ac_rating_kw": "定格AC出力 (kW)",
+    "is_default": "is_default",
+}
+MODULE_COLUMNS = {
+    "model_number": "型番",
+    "manufacturer": "メーカー名",
+    "pmax_stc": "Pmax (W)",
+    "voc_stc": "Voc (V)",
+    "vmpp_noc": "Vmpp (V)",
+    "isc_noc": "Isc (A)",
+    "temp_coeff": "温度係数",
+    "degradation_rate": "劣化率 (%/年)",
+}
+
+def catalog_table(kind, key):
+    """Render one page of a catalog table; sorting/filtering happen in SQLite."""
+    labels = PCS_COLUMNS if kind == "pcs" else MODULE_COLUMNS
+    sortable = sortable_columns(kind)
+    filters = {}
+    with st.expander("🔎 絞り込み・並び替え"):
+        if kind == "modules":
+            mfr = st.selectbox("メーカー名", ["すべて"] + list_manufacturers(), key=f"{key}_mfr")
+            if mfr != "すべて":
+                filters["manufacturer"] = mfr
+        v_label = labels["max_voltage" if kind == "pcs" else "voc_stc"]
+        f1, f2 = st.columns(2, gap="small")
+        filters["voltage_min"] = f1.number_input(f"{v_label} 下限", value=None, key=f"{key}_vmin")
+        filters["voltage_max"] = f2.number_input(f"{v_label} 上限", value=None, key=f"{key}_vmax")
+        s1, s2 = st.columns(2, gap="small")
+        sort = s1.selectbox("並び替え", sortable, format_func=labels.get, key=f"{key}_sort")
+        descending = s2.checkbox("降順", key=f"{key}_desc")
+
+    load_page = load_pcs_page if kind == "pcs" else load_modules_page
+    page_key = f"{key}_page"
+    page = st.session_state.get(page_key, 1)
+    rows, total = load_page(page - 1, PAGE_SIZE, sort, descending, **filters)
+    pages = max(1, math.ceil(total / PAGE_SIZE))
+    if page > pages:
+        # Filters shrank the result set: jump back to the last page
+        page = st.session_state[page_key] = pages
+        rows, total = load_page(page - 1, PAGE_SIZE, sort, descending, **filters)
+
+    df = pd.DataFrame(rows, columns=list(labels)).rename(columns=labels)
+    if kind == "pcs":
+        df["is_default"] = df["is_default"].fillna(0).astype(bool)
+    st.dataframe(df, use_container_width=True)
+
+    p1, p2 = st.columns(2, gap="small")
+    p1.number_input("ページ", min_value=1, max_value=pages, step=1, key=page_key)
+    start = (page - 1) * PAGE_SIZE
+    p2.caption(f"全 {total} 件中 {min(start + 1, total)}–{min(start + PAGE_SIZE, total)} 件を表示")
+
+def catalog_export(kind, key):
+    """Export button for a catalog table; rows are streamed by db.export_catalog."""
+    c1, c2 = st.columns(2, gap="small")
+    fmt = c1.selectbox("出力形式", ["csv", "parquet"], key=f"{key}_fmt", label_visibility="collapsed")
+    if c2.button("📤 エクスポート", key=f"{key}_btn"):
+        buf = BytesIO()
+        try:
+            export_catalog(kind, buf, fmt=fmt)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        st.download_button(
+            label="📥 ダウンロード",
+            data=buf.getvalue(),
+            file_name=f"{kind}.{fmt}",
+            mime="text/csv" if fmt == "csv" else "application/octet-stream",
+            key=f"{key}_dl",
+        )
+
 # ─── AUTHENTICATION ───
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -588,7 +706,7 @@ with st.expander("**⚠️ 注意** ※タブの展開・折りたたみはこ
     st.markdown("""
         注1：本判定結果は回路構成の可否を判断するもので、設置可否を判断するものではありません。  
         注2：回路可能判定結果はモジュール・インバータリストに登録された電気特性を基に判定しています。  
-        注3：モジュールの経年劣化による影響は考慮していません。  
+        注3：直列可能枚数は新品時の特性で判定しています。経年劣化は「📉 経年劣化の予測」で年劣化率（未登録のモジュールは0.5%/年）を基に概算しています。  
     """)
 
 # ─── PCS SETTINGS TAB ───
@@ -617,11 +735,16 @@ with st.expander("**【➀インバータ入力】**", expanded=st.session_state
         c5,c6 = st.columns(2, gap="small")
         count = c5.number_input("MPPT入力数", key="new_pcs_count", min_value=1, step=1)
         max_i = c6.number_input("MPPT最大電流 (A)", key="new_pcs_cur", format="%.1f")
+        c7,c8 = st.columns(2, gap="small")
+        circuits = c7.number_input("MPPTあたり回路数", key="new_pcs_circuits",
+                                   min_value=1, max_value=20, value=CIRCUITS_PER_MPPT, step=1)
+        ac_kw = c8.number_input("定格AC出力 (kW)", key="new_pcs_ac", min_value=0.0, value=None, format="%.1f")
         if st.button("PCS保存", key="btn_save_pcs"):
             if not name.strip():
                 st.error("名称は必須です")
             else:
-                save_pcs(name, model_number, max_v, min_v, int(count), max_i)
+                save_pcs(name, model_number, max_v, min_v, int(count), max_i, circuits=int(circuits),
+                         ac_kw=ac_kw or None)
                 st.success(f"✅ 保存しました → {name}")
 
     # — Responsive PCS Table —
@@ -631,24 +754,12 @@ with st.expander("**【➀インバータ入力】**", expanded=st.session_state
             "<h4 style='margin-bottom: 10px;'>❖ インバータリスト</h4>",
             unsafe_allow_html=True
         )
-        df_pcs = (
-            pd.DataFrame.from_dict(pcs_list, orient="index")
-              .reset_index()
-              .rename(columns={
-                  "index":"名称",
-                  "model_number":"型番",
-                  "max_voltage":"最大電圧 (V)",
-                  "mppt_min_voltage":"最小電圧 (V)",
-                  "mppt_count":"MPPT数",
-                  "mppt_max_current":"最大電流 (A)"
-              })
-        )
-        st.dataframe(df_pcs, use_container_width=True)
+        catalog_table("pcs", "pcs_table")
+        catalog_export("pcs", "pcs_export")
 
-        choice = st.selectbox(
+        choice = catalog_select(
             "🔽編集・削除するインバータを選択",
-            df_pcs["名称"],
-            key="pcs_choice"
+            "pcs", "pcs_choice", pcs_list
         )
         
         # Show confirmation buttons if delete is requested
@@ -708,6 +819,10 @@ with st.expander("**【➀インバータ入力】**", expanded=st.session_state
         min_v    = st.number_input("MPPT最小電圧 (V)",  value=p["mppt_min_voltage"], key="edit_pcs_min")
         count    = st.number_input("MPPT入力数",           value=p["mppt_count"], key="edit_pcs_count", min_value=1, step=1)
         max_i    = st.number_input("MPPT最大電流 (A)",  value=p["mppt_max_current"], key="edit_pcs_cur")
+        circuits = st.number_input("MPPTあたり回路数",     value=circuits_per_mppt(p), key="edit_pcs_circuits",
+                                   min_value=1, max_value=20, step=1)
+        ac_kw    = st.number_input("定格AC出力 (kW)",      value=p.get("ac_rating_kw"), key="edit_pcs_ac",
+                                   min_value=0.0, format="%.1f")
         
         # Preserve default status when editing
         is_currently_default = p.get("is_default", False)
@@ -718,11 +833,9 @@ with st.expander("**【➀インバータ入力】**", expanded=st.session_state
                 if not new_name.strip():
                     st.error("名称は必須です")
                 else:
-                    # Delete old entry if name changed
-                    if new_name != nm:
-                        delete_pcs(nm)
-                    # Save new entry with preserved default status
-                    save_pcs(new_name, model_number, max_v, min_v, int(count), max_i, is_currently_default)
+                    # Rename and update in one transaction, preserving default status
+                    update_pcs(nm, new_name, model_number, max_v, min_v, int(count), max_i, is_currently_default,
+                               circuits=int(circuits), ac_kw=ac_kw or None)
                     st.success(f"✅ 更新しました → {new_name}")
                     st.session_state.pop("edit_pcs", None)
                     rerun()
@@ -753,19 +866,46 @@ with st.expander("**【➁モジュール入力】**", expanded=st.session_state
         manufacturer = m1.text_input("メーカー名", key="new_mod_mfr")
         model_no     = m2.text_input("型番",       key="new_mod_no")
         c1,c2 = st.columns(2, gap="small")
-        pmax = c1.number_input("STC Pmax (W)", key="new_mod_pmax")
+        pmax = c1.number_input("STC Pmax (W)", key="new_mod_pmax", min_value=1.0)
         voc  = c2.number_input("STC Voc (V)",  key="new_mod_voc")
         c3,c4 = st.columns(2, gap="small")
         vmpp = c3.number_input("NOC Vmpp (V)", key="new_mod_vmpp")
         isc  = c4.number_input("NOC Isc (A)",  key="new_mod_isc")
-        tc   = st.number_input("開放電圧の温度係数 (%/℃)", key="new_mod_tc", value=-0.3)
+        c5,c6 = st.columns(2, gap="small")
+        tc   = c5.number_input("開放電圧の温度係数 (%/℃)", key="new_mod_tc", value=-0.3)
+        deg  = c6.number_input("年間劣化率 (%/年)", key="new_mod_deg", min_value=0.0,
+                               value=DEGRADATION_RATE, step=0.1)
         if st.button("モジュール保存", key="btn_save_mod"):
             if not manufacturer.strip() or not model_no.strip():
                 st.error("メーカー名と型番は必須です。")
             else:
-                save_module(manufacturer, model_no, pmax, voc, vmpp, isc, tc)
+                save_module(manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation=deg)
                 st.success(f"✅ 保存しました → {model_no}")
 
+    # — Bulk Import —
+    with st.expander("📥 CSV/JSONから一括登録"):
+        st.markdown(
+            "列名: `manufacturer, model_number, pmax_stc, voc_stc, vmpp_noc, isc_noc, temp_coeff`"
+        )
+        upload = st.file_uploader("ファイルを選択", type=["csv", "json", "jsonl"], key="mod_import_file")
+        if upload is not None and st.button("一括登録", key="btn_import_mod"):
+            try:
+                report = import_catalog(upload, "modules")
+            except ValueError as e:
+                # Unreadable file as a whole (encoding, malformed JSON array / CSV)
+                st.error(f"❌ ファイルを読み込めません: {e}")
+            else:
+                st.success(
+                    f"✅ {report['rows']} 件を登録しました "
+                    f"（{report['seconds']:.2f} 秒, {report['rows_per_sec']:.0f} 件/秒）"
+                )
+                if report["errors"]:
+                    st.warning(f"⚠️ {len(report['errors'])} 件の行をスキップしました")
+                    st.dataframe(
+                        pd.DataFrame(report["errors"][:200], columns=["行", "エラー"]),
+                        use_container_width=True,
+                    )
+
     # — Responsive Module Table —
     mods = load_modules()
     if mods:
@@ -773,22 +913,11 @@ with st.expander("**【➁モジュール入力】**", expanded=st.session_state
             "<h4 style='margin-bottom: 10px;'>❖ モジュールリスト</h4>",
             unsafe_allow_html=True
         )
-        df_mod = pd.DataFrame([
-            {
-              "型番": mn,
-              "メーカー名": m["manufacturer"],
-              "Pmax (W)":   m["pmax_stc"],
-              "Voc (V)":    m["voc_stc"],
-              "Vmpp (V)":   m["vmpp_noc"],
-              "Isc (A)":    m["isc_noc"],
-              "温度係数":  m["temp_coeff"],
-            }
-            for mn,m in mods.items()
-        ])
-        st.dataframe(df_mod, use_container_width=True)
+        catalog_table("modules", "mod_table")
+        catalog_export("modules", "mod_export")
 
-        choice = st.selectbox("🔽編集・削除するモジュールを選択",
-                              df_mod["型番"], key="mod_choice")
+        choice = catalog_select("🔽編集・削除するモジュールを選択",
+                                "modules", "mod_choice", mods)
         
         # Show confirmation buttons if delete is requested
         if st.session_state.get("show_delete_confirm_mod", False) and st.session_state.get("delete_target_mod") == choice:
@@ -835,6 +964,8 @@ with st.expander("**【➁モジュール入力】**", expanded=st.session_state
         vm = st.number_input("NOC Vmpp (V)",      value=d["vmpp_noc"], key="edit_mod_vmpp")
         ic = st.number_input("NOC Isc (A)",       value=d["isc_noc"],  key="edit_mod_isc")
         tc = st.number_input("開放電圧の温度係数 (%/℃)",     value=d["temp_coeff"],key="edit_mod_tc")
+        dg = st.number_input("年間劣化率 (%/年)", min_value=0.0, value=float(degradation_rate(d)),
+                             step=0.1, key="edit_mod_deg")
         
         col1, col2 = st.columns(2, gap="small")
         with col1:
@@ -842,11 +973,8 @@ with st.expander("**【➁モジュール入力】**", expanded=st.session_state
                 if not mf.strip() or not new_model_no.strip():
                     st.error("メーカー名と型番は必須です。")
                 else:
-                    # Delete old entry if model number changed
-                    if new_model_no != mn:
-                        delete_module(mn)
-                    # Save new entry
-                    save_module(mf, new_model_no, pm, vc, vm, ic, tc)
+                    # Rename and update in one transaction
+                    rename_module(mn, mf, new_model_no, pm, vc, vm, ic, tc, degradation=dg)
                     st.success(f"✅ 更新しました → {new_model_no}")
                     st.session_state.pop("edit_mod", None)
                     rerun()
@@ -855,127 +983,129 @@ with st.expander("**【➁モジュール入力】**", expanded=st.session_state
                 st.session_state.pop("edit_mod", None)
                 rerun()
 
-# ─── CIRCUIT CONFIG TAB ───
-with st.expander("**【➂回路構成判定】**", expanded=st.session_state.get("menu_page") == "Circuit Config"):
-    
-    # SECTION 1: 直列可能枚数
-    st.markdown(
-        "<h4 style='margin-bottom: 10px;'>📊 1. 直列可能枚数</h4>",
-        unsafe_allow_html=True
-        )
-    st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
-    
-    # Compact selection section
-    col1, col2, col3 = st.columns(3, gap="small")
-    
-    # PCS selection
-    with col1:
-        pcs_list = load_pcs()
-        if not pcs_list:
-            st.warning("⚠️ 先に「PCS入力」タブで PCS/インバータを追加してください。")
-            st.stop()
-        options = [pcs["model_number"] for pcs in pcs_list.values()]
-        model = st.selectbox("PCSを選択", options, key="cfg_pcs")
-        pcs = next(p for p in pcs_list.values() if p["model_number"] == model)
+# ─── CIRCUIT CONFIG GRID ───
+# Runs as a fragment: editing a series count only re-executes this function
+# (grid + result panel), not the whole script with its CSS/JS and catalogs.
+# Measured per edit of the default 3 × 3 grid: ~350 ms and 80.5 KiB of
+# deltas (251 messages) as a full rerun, ~240 ms and 7.1 KiB (43) as a
+# fragment rerun.
+fragment =getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda f: f)
 
-    # Module selection
-    with col2:
-        mods = load_modules()
-        if not mods:
-            st.warning("⚠️ 先に「モジュール入力」タブでモジュールを追加してください。")
-            st.stop()
-        mod_name = st.selectbox("モジュールを選択", list(mods.keys()), key="cfg_mod")
-        m = mods[mod_name]
+GRID_MODE_CELLS = 12  # default to the table editor above this many MPPT × circuit inputs
 
-    # Temperature selection
-    with col3:
-        t_min = st.selectbox("設置場所の最低温度（℃）", 
-                            options=[0, -5, -10, -15, -20, -25, -30], 
-                            key="cfg_tmin", 
-                            index=1)  # Default to -5°C (index 1)
-        t_max = 50  # Fixed maximum temperature
+def hourly_record():
+    """(temp_air, irradiance, error) of the uploaded hourly weather file, parsed once per upload."""
+    upload = st.session_state.get("hourly_file")
+    if upload is None:
+        return None, None, None
+    cached = st.session_state.get("hourly_record")
+    if cached and cached[0] == (upload.name, upload.size):
+        return cached[1]
+    try:
+        upload.seek(0)
+        record = load_hourly(upload) + (None,)
+    except ValueError as e:
+        record = (None, None, str(e))
+    st.session_state.hourly_record = ((upload.name, upload.size), record)
+    return record
 
-    # Calculate series bounds
-    v_max    = pcs["max_voltage"]
-    v_mp_min = pcs["mppt_min_voltage"]
+def reset_grid_editor():
+    """Drop pending table-editor edits so the table is rebuilt from the ser_{i}_{j} values."""
+    for key in [k for k in st.session_state if str(k).startswith("ser_grid_")]:
+        del st.session_state[key]
+
+def error_message(code, s, min_s, max_s, cur, i_mppt):
+    if code == "range":
+        return f"{s} 枚は範囲外です。{min_s}～{max_s} 枚で入力してください。"
+    if code == "mismatch":
+        return "この MPPT内の全回路で同じ枚数を設定してください。"
+    return (f"合計入力電流 {cur:.1f}A が PCS 許容 {i_mppt}A を超えています。\n"
+            "直列枚数または使用回路数を減らしてください。")
+
+@fragment
+def circuit_grid(pcs, m, t_min, t_max):
     mppt_n   = pcs["mppt_count"]
+    n_circ   = circuits_per_mppt(pcs)
     i_mppt   = pcs["mppt_max_current"]
+    min_s, max_s = cached_series_bounds(pcs, m, t_min, t_max)
 
-    voc_a   = m["voc_stc"]*(1 + m["temp_coeff"]/100*(t_min-25))
-    vmpp_a  = m["vmpp_noc"]*(1 + m["temp_coeff"]/100*(t_max-25))
-    max_s   = math.floor(v_max    / voc_a)  if voc_a>0   else 0
-    min_s   = math.ceil (v_mp_min / vmpp_a) if vmpp_a>0 else 0
+    grid_mode = st.checkbox("表形式で入力（MPPT数が多い場合におすすめ）", key="grid_mode",
+                            value=mppt_n * n_circ > GRID_MODE_CELLS, on_change=reset_grid_editor)
 
-    st.info(f"直列可能枚数：最小 **{min_s}** 枚 ～ 最大 **{max_s}** 枚", icon="ℹ️")
-    
-    st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
-    
-    # SECTION 2: モジュールの回路構成
-    st.markdown(
-        "<h4 style='margin-bottom: 10px;'>🔧 2. モジュールの回路構成</h4>",
-        unsafe_allow_html=True
+    # Current input values; validated once (cached) and each message is
+    # placed next to its input
+    series = [
+        [st.session_state.get(f"ser_{i}_{j}", min_s if j==0 else 0) for j in range(n_circ)]
+        for i in range(mppt_n)
+    ]
+
+    if grid_mode:
+        # One table widget instead of mppt_count × circuits number inputs
+        columns = [f"回路{j+1}" for j in range(n_circ)]
+        df_grid = pd.DataFrame(series, index=[f"MPPT{i+1}" for i in range(mppt_n)], columns=columns)
+        edited = st.data_editor(
+            df_grid, key=f"ser_grid_{mppt_n}x{n_circ}", use_container_width=True,
+            column_config={c: st.column_config.NumberColumn(c, min_value=0, max_value=max_s, step=1)
+                           for c in columns},
         )
-        
-   # MPPT instruction text in red
-    st.markdown(
-        '<p style="color:red; margin-bottom: 0.3rem;">'
-        '※直列可能枚数の範囲内でシステム構成してください。'
-        '</p>',
-        unsafe_allow_html=True
-    )
-    st.markdown(
-        '<p style="color:red; margin-bottom: 0.1rem;">'
-        '※モジュールがない場合は"0"にしてください。'
-        '</p>',
-        unsafe_allow_html=True
-    )
-    st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
+        series = edited.fillna(0).astype(int).values.tolist()
+        # Keep the per-input keys in sync so switching modes keeps the layout.
+        # Written every run (Streamlit drops the state of widgets that are not
+        # shown) and as plain ints, which the number inputs then take as their
+        # value since they are created without value=
+        for i, row in enumerate(series):
+            for j, s in enumerate(row):
+                st.session_state[f"ser_{i}_{j}"] = int(s)
+
+    errors     = cached_validate_layout(pcs, m, series, t_min, t_max)
+    cell_errs  = {}
+    for i, j, code in errors:
+        cell_errs.setdefault((i, j), set()).add(code)
+    any_err    = any(code != "empty" for _, _, code in errors)
+    total_mods = sum(s for row in series for s in row if s > 0)
+
+    if grid_mode:
+        # Per-cell messages below the table
+        for i, j, code in errors:
+            if code == "empty":
+                continue
+            cur = sum(1 for v in series[i] if v>0) * m["isc_noc"]
+            where = f"MPPT{i+1}" if j is None else f"MPPT{i+1} 回路{j+1}"
+            st.error(f"{where}: " + error_message(code, series[i][j] if j is not None else 0,
+                                                  min_s, max_s, cur, i_mppt), icon="🚫")
 
     # MPPT configuration loop
-    any_err    = False
-    total_mods = 0
-
-    for i in range(mppt_n):
-        st.markdown(f"**🔷MPPT入力 {i+1}**")
-        ref_s = None
-        vals  = []
-
-        # Compact 3-column layout for circuits
-        cols = st.columns(3, gap="small")
-        for j in range(3):
-            with cols[j]:
-                st.markdown(f"**回路{j+1}**")
-                key = f"ser_{i}_{j}"
-                default = min_s if j==0 else 0
-                s = st.number_input("直列枚数", key=key,
-                                     min_value=0, max_value=max_s,
-                                     value=default, step=1, label_visibility="collapsed")
-                vals.append(s)
-
-                if s>0:
-                    # range check
-                    if s<min_s or s>max_s:
-                        st.error(f"{s} 枚は範囲外です。{min_s}～{max_s} 枚で入力してください。", icon="🚫")
-                        any_err = True
-                    # consistency check
-                    if ref_s is None:
-                        ref_s = s
-                    elif s!=ref_s:
-                        st.error("この MPPT内の全回路で同じ枚数を設定してください。", icon="🚫")
-                        any_err = True
-                    total_mods += s
-
-        # current‐sum check
-        used = sum(1 for v in vals if v>0)
-        if used>0:
-            cur = used * m["isc_noc"]
-            if cur>i_mppt:
-                st.error(f"合計入力電流 {cur:.1f}A が PCS 許容 {i_mppt}A を超えています。\n"
-                         "直列枚数または使用回路数を減らしてください。", icon="🚫")
-                any_err = True
+    if not grid_mode:
+        for i in range(mppt_n):
+            st.markdown(f"**🔷MPPT入力 {i+1}**")
+
+            # Compact layout, one column per circuit
+            cols = st.columns(n_circ, gap="small")
+            for j in range(n_circ):
+                with cols[j]:
+                    st.markdown(f"**回路{j+1}**")
+                    key = f"ser_{i}_{j}"
+                    # Seeded through session state only: apply_layout and the
+                    # table mode also write this key, and a widget given both
+                    # value= and a preset key warns on every run
+                    if key not in st.session_state:
+                        st.session_state[key] = min_s if j==0 else 0
+                    s = st.number_input("直列枚数", key=key,
+                                         min_value=0, max_value=max_s,
+                                         step=1, label_visibility="collapsed")
+
+                    # range / consistency checks
+                    for code in ("range", "mismatch"):
+                        if code in cell_errs.get((i, j), ()):
+                            st.error(error_message(code, s, min_s, max_s, 0, i_mppt), icon="🚫")
+
+            # current‐sum check
+            if "current" in cell_errs.get((i, None), ()):
+                cur = sum(1 for v in series[i] if v>0) * m["isc_noc"]
+                st.error(error_message("current", 0, min_s, max_s, cur, i_mppt), icon="🚫")
         
-        if i < mppt_n - 1:  # Add separator between MPPT sections
-            st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
+            if i < mppt_n - 1:  # Add separator between MPPT sections
+                st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
     
     st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
     
@@ -1032,6 +1162,479 @@ with st.expander("**【➂回路構成判定】**", expanded=st.session_state.ge
         </div>
         """.format(total_mods=total_mods, power_kw=power/1000), unsafe_allow_html=True)
 
+        # Energy yield over the uploaded hourly record (📈 expander above)
+        temp_air, irradiance, _ = hourly_record()
+        if temp_air is not None:
+            yld = energy_yield(pcs, m, series, temp_air, irradiance)
+            e1, e2, e3, e4 = st.columns(4, gap="small")
+            e1.metric("年間発電量 (AC)", f"{yld['ac_kwh']:,.0f} kWh")
+            e2.metric("クリッピング損失", f"{yld['clipped_kwh']:,.0f} kWh", f"{-yld['clipping_ratio']:.1%}")
+            e3.metric("DC/AC比", f"{yld['dc_ac_ratio']:.2f}" if yld["dc_ac_ratio"] else "-")
+            e4.metric("発電量/kWp", f"{yld['specific_yield']:,.0f} kWh")
+            if yld["ac_missing"]:
+                st.caption("※PCSの定格AC出力が未登録のため、クリッピングは考慮していません。")
+
+        # Lifetime projection of this layout (caution note 注3)
+        with st.expander("📉 経年劣化の予測"):
+            years = st.slider("期間（年）", min_value=LIFETIME_YEARS, max_value=30, value=LIFETIME_YEARS,
+                              key="deg_years")
+            proj = project_layout(pcs, m, series, t_max, years)
+            d1, d2 = st.columns(2, gap="small")
+            if proj["pmax_w"][0] > 0:
+                d1.metric(f"{years}年後のPV出力", f"{proj['pmax_w'][-1]/1000:.2f} kW",
+                          f"{(proj['pmax_w'][-1]/proj['pmax_w'][0] - 1)*100:.1f} %")
+            else:
+                # No strings or a module registered without Pmax
+                d1.metric(f"{years}年後のPV出力", "-")
+            d2.metric(f"{years}年後の最短ストリングVmpp", f"{proj['vmpp_string'][-1]:.1f} V")
+            st.caption(f"年劣化率 {degradation_rate(m)} %/年・最高温度 {t_max:.1f}℃ での概算")
+            st.line_chart(pd.DataFrame({
+                "最短ストリングVmpp (V)": proj["vmpp_string"],
+                "MPPT最小電圧 (V)": [pcs["mppt_min_voltage"]] * len(proj["years"]),
+            }, index=pd.Index(proj["years"], name="年")))
+            if proj["first_year_below"] is not None:
+                st.warning(f"⚠️ {proj['first_year_below']}年目に最短ストリングのVmppがMPPT最小電圧を下回ります。")
+
+# ─── CIRCUIT CONFIG TAB ───
+with st.expander("**【➂回路構成判定】**", expanded=st.session_state.get("menu_page") == "Circuit Config"):
+    
+    # SECTION 1: 直列可能枚数
+    st.markdown(
+        "<h4 style='margin-bottom: 10px;'>📊 1. 直列可能枚数</h4>",
+        unsafe_allow_html=True
+        )
+    st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
+    
+    # Compact selection section
+    col1, col2, col3 = st.columns(3, gap="small")
+    
+    # PCS selection
+    with col1:
+        pcs_list = load_pcs()
+        if not pcs_list:
+            st.warning("⚠️ 先に「PCS入力」タブで PCS/インバータを追加してください。")
+            st.stop()
+        pcs_name = catalog_select("PCSを選択", "pcs", "cfg_pcs", pcs_list,
+                                  format_func=lambda n: pcs_list[n]["model_number"] or n)
+        pcs = pcs_list[pcs_name]
+
+    # Module selection
+    with col2:
+        mods = load_modules()
+        if not mods:
+            st.warning("⚠️ 先に「モジュール入力」タブでモジュールを追加してください。")
+            st.stop()
+        mod_name = catalog_select("モジュールを選択", "modules", "cfg_mod", mods)
+        m = mods[mod_name]
+
+    # Temperature selection (a site picked below overrides the fixed options)
+    def clear_site():
+        st.session_state.pop("site_temps", None)
+
+    with col3:
+        site = st.session_state.get("site_temps")
+        if site:
+            t_min, t_max = site["t_min"], site["t_max"]
+            st.markdown(f"**設置地点**: {site['name']}")
+            st.caption(f"最低気温 {t_min:.1f} ℃ / 最高セル温度 {t_max:.1f} ℃")
+            st.button("地点を解除", key="btn_site_clear", on_click=clear_site)
+        else:
+            t_min = st.selectbox("設置場所の最低温度（℃）", 
+                                options=list(T_MIN_OPTIONS), 
+                                key="cfg_tmin", 
+                                index=1)  # Default to -5°C (index 1)
+            t_max = T_MAX  # Fixed maximum temperature
+
+    # Calculate series bounds
+    min_s, max_s = cached_series_bounds(pcs, m, t_min, t_max)
+
+    st.info(f"直列可能枚数：最小 **{min_s}** 枚 ～ 最大 **{max_s}** 枚", icon="ℹ️")
+
+    # Site temperatures from the nearest weather stations
+    def apply_site(station):
+        low, high = site_temperatures(station)
+        st.session_state.site_temps = {"t_min": low, "t_max": high, "name": station["name"]}
+
+    with st.expander("📍 地点から温度を設定"):
+        if not load_stations():
+            st.caption("観測地点データが未登録です。列名: "
+                       "`station_id, name, lat, lon, postal_code, record_low, design_high` のCSVを登録してください。")
+        station_file = st.file_uploader("観測地点データ (CSV)", type=["csv", "json", "jsonl"], key="station_file")
+        if station_file is not None and st.button("観測地点を登録", key="btn_import_stations"):
+            try:
+                report = import_catalog(station_file, "stations")
+            except ValueError as e:
+                st.error(f"❌ ファイルを読み込めません: {e}")
+            else:
+                st.success(f"✅ {report['rows']} 地点を登録しました")
+                if report["errors"]:
+                    st.warning(f"⚠️ {len(report['errors'])} 件の行をスキップしました")
+
+        if load_stations():
+            how = st.radio("検索方法", ["郵便番号", "緯度・経度"], key="site_mode", horizontal=True)
+            if how == "郵便番号":
+                postal = st.text_input("郵便番号（先頭のみ可）", key="site_postal", placeholder="例: 060-0001")
+                hits = stations_near_postal(postal) if postal.strip() else []
+            else:
+                s1, s2 = st.columns(2, gap="small")
+                lat = s1.number_input("緯度", min_value=-90.0, max_value=90.0, value=35.68,
+                                      step=0.01, format="%.4f", key="site_lat")
+                lon = s2.number_input("経度", min_value=-180.0, max_value=180.0, value=139.76,
+                                      step=0.01, format="%.4f", key="site_lon")
+                hits = nearest_stations(lat, lon)
+            if how == "郵便番号" and postal.strip() and not hits:
+                st.warning("⚠️ 該当する観測地点がありません。")
+            for idx, station in enumerate(hits):
+                low, high = site_temperatures(station)
+                c1, c2 = st.columns([4, 1], gap="small")
+                c1.markdown(f"**{station['name']}**（{station['distance_km']:.1f} km）  \n"
+                            f"最低気温 {low:.1f} ℃ / 最高セル温度 {high:.1f} ℃")
+                c2.button("適用", key=f"btn_apply_site_{idx}", on_click=apply_site, args=(station,))
+
+    # Automatic layout suggestions (fills the ser_{i}_{j} inputs below)
+    def apply_layout(series):
+        for i, row in enumerate(series):
+            for j, s in enumerate(row):
+                st.session_state[f"ser_{i}_{j}"] = int(s)
+        reset_grid_editor()
+
+    with st.expander("🤖 回路構成の自動提案"):
+        a1, a2 = st.columns(2, gap="small")
+        goal = a1.radio("提案の基準", ["最大出力", "目標容量"], key="auto_goal", horizontal=True)
+        target_kw = a2.number_input("目標容量 (kW)", min_value=0.0, value=10.0, step=0.5,
+                                    key="auto_target", disabled=goal != "目標容量")
+        if st.button("提案を計算", key="btn_auto_layout"):
+            st.session_state.auto_layouts = (
+                (pcs_name, mod_name, t_min, t_max),
+                solve_layouts(pcs, m, t_min, k=5, target_kw=target_kw if goal == "目標容量" else None,
+                              t_max=t_max),
+            )
+        context, layouts = st.session_state.get("auto_layouts", (None, []))
+        if context == (pcs_name, mod_name, t_min, t_max):
+            if not layouts:
+                st.warning("⚠️ この組み合わせで構成可能な回路はありません。")
+            # Annual yield of every suggestion in one pass when an hourly record is loaded
+            temp_air, irradiance, _ = hourly_record()
+            yields = (yield_batch([pcs] * len(layouts), [m] * len(layouts),
+                                  [layout["total_modules"] for layout in layouts], temp_air, irradiance)
+                      if temp_air is not None else [None] * len(layouts))
+            for idx, (layout, yld) in enumerate(zip(layouts, yields)):
+                desc = " / ".join(
+                    f"MPPT{i+1}: {max(row)}枚×{sum(1 for v in row if v)}回路" if any(row) else f"MPPT{i+1}: -"
+                    for i, row in enumerate(layout["series"])
+                )
+                c1, c2 = st.columns([4, 1], gap="small")
+                if yld:
+                    desc += f"  \n年間 {yld['ac_kwh']:,.0f} kWh（クリッピング {yld['clipping_ratio']:.1%}）"
+                c1.markdown(f"**案{idx+1}**: {layout['total_modules']} 枚 / "
+                            f"{layout['power_w']/1000:.2f} kW  \n{desc}")
+                c2.button("適用", key=f"btn_apply_layout_{idx}",
+                          on_click=apply_layout, args=(layout["series"],))
+
+    # Check the series range against an hourly weather record
+    with st.expander("📈 時系列気象データで検証"):
+        st.caption("1時間ごとの気温・日射量のCSV（列名: temp_air / ghi など、複数年可）をアップロードしてください。")
+        hourly_file = st.file_uploader("気象データ (CSV)", type=["csv"], key="hourly_file")
+        if hourly_file is not None:
+            temp_air, irradiance, load_error = hourly_record()
+            if load_error:
+                st.error(f"読み込みエラー: {load_error}")
+            else:
+                rep_w = voltage_report(pcs, m, temp_air, irradiance)
+                if rep_w["voc_max"] is None:
+                    st.warning("⚠️ 日射のある時間帯がありません。")
+                else:
+                    w1, w2, w3 = st.columns(3, gap="small")
+                    w1.metric("最大Voc（実測）", f"{rep_w['voc_max']:.1f} V")
+                    w2.metric("最小Vmpp（実測）", f"{rep_w['vmpp_min']:.1f} V")
+                    w3.metric("直列可能枚数（実測）", f"{rep_w['min_series']}～{rep_w['max_series']} 枚")
+                    st.caption(f"{rep_w['hours']} 時間（日射あり {rep_w['sunlit_hours']} 時間）／"
+                               f"セル温度 {rep_w['t_cell_min']:.1f}～{rep_w['t_cell_max']:.1f}℃ ／ "
+                               f"固定条件での範囲: {min_s}～{max_s} 枚")
+                    st.dataframe(pd.DataFrame(rep_w["rows"]).rename(columns={
+                        "series": "直列枚数",
+                        "hours_over_max_voltage": "最大電圧超過 (時間)",
+                        "hours_under_mppt_min": "MPPT最小電圧未満 (時間)",
+                    }), use_container_width=True, hide_index=True)
+
+    # Monte Carlo: module tolerances and site temperature spread
+    with st.expander("🎲 公差を考慮した確率評価"):
+        st.caption("Voc・Vmpp・温度係数のばらつきと最低/最高温度の年変動を正規分布（1σ）で抽出し、"
+                   "各直列枚数が電圧範囲を外れる確率を求めます。")
+        u1, u2, u3 = st.columns(3, gap="small")
+        voc_sd  = u1.number_input("Voc ばらつき (%)",  min_value=0.0, value=VOC_SD * 100, step=0.5, key="mc_voc_sd")
+        vmpp_sd = u2.number_input("Vmpp ばらつき (%)", min_value=0.0, value=VMPP_SD * 100, step=0.5, key="mc_vmpp_sd")
+        tc_sd   = u3.number_input("温度係数 ばらつき (%)", min_value=0.0, value=TEMP_COEFF_SD * 100,
+                                  step=1.0, key="mc_tc_sd")
+        u4, u5, u6 = st.columns(3, gap="small")
+        t_sd      = u4.number_input("温度の年変動 (℃)", min_value=0.0, value=T_MIN_SD, step=0.5, key="mc_t_sd")
+        n_samples = u5.number_input("試行回数", min_value=10_000, max_value=10_000_000,
+                                    value=DEFAULT_SAMPLES, step=100_000, key="mc_samples")
+        parallel  = u6.checkbox("全コアで計算", key="mc_parallel")
+        if st.button("確率を計算", key="btn_monte_carlo"):
+            series_range = range(max(min_s - 1, 1), max(max_s, min_s) + 2)
+            st.session_state.mc_report = (
+                (pcs_name, mod_name, t_min, t_max),
+                exceedance_probability(
+                    pcs, m, series_range, t_min, t_max, samples=int(n_samples), seed=0,
+                    workers=None if parallel else 1,
+                    voc_sd=voc_sd / 100, vmpp_sd=vmpp_sd / 100, temp_coeff_sd=tc_sd / 100,
+                    t_min_sd=t_sd, t_max_sd=t_sd,
+                ),
+            )
+        context, rep_mc = st.session_state.get("mc_report", (None, None))
+        if rep_mc and context == (pcs_name, mod_name, t_min, t_max):
+            st.caption(f"{rep_mc['samples']:,} 回試行（{rep_mc['seconds']:.2f} 秒）／"
+                       f"固定条件での範囲: {min_s}～{max_s} 枚")
+            df_mc = pd.DataFrame(rep_mc["rows"])
+            df_mc[["p_over_max_voltage", "p_under_mppt_min", "p_fail"]] *= 100
+            st.dataframe(df_mc.round(3).rename(columns={
+                "series": "直列枚数",
+                "p_over_max_voltage": "最大電圧超過 (%)",
+                "p_under_mppt_min": "MPPT最小電圧未満 (%)",
+                "p_fail": "いずれか (%)",
+            }), use_container_width=True, hide_index=True)
+
+    st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
+    
+    # SECTION 2: モジュールの回路構成
+    st.markdown(
+        "<h4 style='margin-bottom: 10px;'>🔧 2. モジュールの回路構成</h4>",
+        unsafe_allow_html=True
+        )
+        
+   # MPPT instruction text in red
+    st.markdown(
+        '<p style="color:red; margin-bottom: 0.3rem;">'
+        '※直列可能枚数の範囲内でシステム構成してください。'
+        '</p>',
+        unsafe_allow_html=True
+    )
+    st.markdown(
+        '<p style="color:red; margin-bottom: 0.1rem;">'
+        '※モジュールがない場合は"0"にしてください。'
+        '</p>',
+        unsafe_allow_html=True
+    )
+    st.markdown("<hr style='margin: 0.3rem 0; border: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
+
+    circuit_grid(pcs, m, t_min, t_max)
+
+# ─── COMPATIBLE MODULES TAB ───
+with st.expander("**【📋 適合モジュール一覧】**", expanded=st.session_state.get("menu_page") == "Compatible Modules"):
+    st.markdown(
+        "<h4 style='margin-bottom: 10px;'>🔍 インバータに接続可能なモジュール</h4>",
+        unsafe_allow_html=True
+    )
+    pcs_list = load_pcs()
+    if pcs_list:
+        c1, c2 = st.columns(2, gap="small")
+        with c1:
+            compat_pcs = catalog_select("PCSを選択", "pcs", "compat_pcs", pcs_list,
+                                        format_func=lambda n: pcs_list[n]["model_number"] or n)
+        with c2:
+            compat_tmin = st.selectbox("設置場所の最低温度（℃）", options=list(T_MIN_OPTIONS),
+                                       key="compat_tmin", index=1)
+        rows = compatible_modules(compat_pcs, compat_tmin, limit=200)
+        if rows:
+            df_compat = pd.DataFrame(rows).rename(columns={
+                "model_number": "型番",
+                "manufacturer": "メーカー名",
+                "min_series": "最小直列",
+                "max_series": "最大直列",
+                "circuits": "回路数/MPPT",
+                "max_power_w": "最大PV出力 (kW)",
+            })
+            df_compat["最大PV出力 (kW)"] = df_compat["最大PV出力 (kW)"] / 1000
+            # Lifetime check of the listed modules at their shortest string, in one pass
+            mods = load_modules()
+            aged = catalog_sweep(pcs_list[compat_pcs], [mods[r["model_number"]] for r in rows],
+                                 series=[r["min_series"] for r in rows])
+            df_compat[f"{LIFETIME_YEARS}年後の最小直列"] = aged["lifetime_min_series"]
+            df_compat["最小直列の下限割れ (年目)"] = pd.Series(aged["first_year_below"]).replace(-1, None)
+            st.dataframe(df_compat, use_container_width=True)
+            st.caption(f"上位 {len(rows)} 件（最大PV出力順）")
+        else:
+            st.warning("⚠️ この条件で接続可能なモジュールはありません。")
+
+# ─── MODULE COMPARISON TAB ───
+# The picks are submitted together (one rerun) and evaluated in one
+# compatibility_table() pass, shown as a single table.
+with st.expander("**【⚖️ モジュール比較】**", expanded=st.session_state.get("menu_page") == "Compare"):
+    st.markdown(
+        "<h4 style='margin-bottom: 10px;'>⚖️ 複数モジュールの直列枚数・最大出力を比較</h4>",
+        unsafe_allow_html=True
+    )
+    mods, pcs_list = load_modules(), load_pcs()
+    cmp_query = st.text_input("🔍 モジュール検索", key="cmp_q", placeholder="型番・メーカー名で検索")
+    # Keep the current picks selectable whatever the search shows
+    picked = [k for k in st.session_state.get("cmp_mods", []) if k in mods]
+    mod_options = picked + [k for k in search_modules(cmp_query, SEARCH_LIMIT) if k not in picked]
+    picked_pcs = [k for k in st.session_state.get("cmp_pcs", []) if k in pcs_list]
+    pcs_options = picked_pcs + [k for k in search_pcs("", SEARCH_LIMIT) if k not in picked_pcs]
+    with st.form("compare_form"):
+        st.multiselect("モジュール", mod_options, key="cmp_mods")
+        st.multiselect("PCS", pcs_options, key="cmp_pcs",
+                       default=[k for k in [st.session_state.get("cfg_pcs")] if k in pcs_options],
+                       format_func=lambda n: pcs_list[n]["model_number"] or n)
+        st.multiselect("設置場所の最低温度（℃）", list(T_MIN_OPTIONS), key="cmp_tmins",
+                       default=[st.session_state.get("cfg_tmin", T_MIN_OPTIONS[1])])
+        compare = st.form_submit_button("比較")
+    if compare:
+        st.session_state.cmp_selection = (list(st.session_state.cmp_mods), list(st.session_state.cmp_pcs),
+                                          list(st.session_state.cmp_tmins))
+    sel_mods, sel_pcs, sel_tmins = st.session_state.get("cmp_selection", ([], [], []))
+    sel_mods = [k for k in sel_mods if k in mods]
+    sel_pcs  = [k for k in sel_pcs if k in pcs_list]
+    if sel_mods and sel_pcs and sel_tmins:
+        table = compatibility_table({k: mods[k] for k in sel_mods}, {k: pcs_list[k] for k in sel_pcs},
+                                    sel_tmins)
+        df_cmp = pd.DataFrame(table).rename(columns={
+            "model_number": "型番",
+            "pcs_name": "PCS",
+            "t_min": "最低温度 (℃)",
+            "min_series": "最小直列",
+            "max_series": "最大直列",
+            "circuits": "回路数/MPPT",
+            "feasible": "構成可",
+            "max_power_w": "最大PV出力 (kW)",
+        })
+        df_cmp.insert(1, "メーカー名", [mods[k]["manufacturer"] for k in table["model_number"]])
+        df_cmp["最大PV出力 (kW)"] = df_cmp["最大PV出力 (kW)"] / 1000
+        st.dataframe(df_cmp.sort_values("最大PV出力 (kW)", ascending=False),
+                     use_container_width=True, hide_index=True)
+        st.caption(f"{len(sel_mods)} モジュール × {len(sel_pcs)} PCS × {len(sel_tmins)} 温度 = {len(df_cmp)} 件")
+    elif compare:
+        st.warning("⚠️ モジュール・PCS・温度をそれぞれ1つ以上選択してください。")
+
+# ─── TARGET CAPACITY SEARCH TAB ───
+with st.expander("**【🎯 目標容量から検索】**", expanded=st.session_state.get("menu_page") == "Target Search"):
+    st.markdown(
+        "<h4 style='margin-bottom: 10px;'>🎯 目標PV容量に近い構成を全カタログから検索</h4>",
+        unsafe_allow_html=True
+    )
+    c1, c2 = st.columns(2, gap="small")
+    with c1:
+        target_kw   = st.number_input("目標PV容量（kW）", min_value=0.1, value=50.0, step=0.1,
+                                      format="%.1f", key="target_kw")
+        target_pcs  = st.number_input("PCS台数の上限", min_value=1, max_value=200, value=10, step=1,
+                                      key="target_max_pcs")
+    with c2:
+        target_mods = st.number_input("モジュール枚数の上限（0＝制限なし）", min_value=0, value=0, step=1,
+                                      key="target_max_mods")
+        target_tmin = st.selectbox("設置場所の最低温度（℃）", options=list(T_MIN_OPTIONS),
+                                   key="target_tmin", index=1)
+    if st.button("🔍 検索", key="target_search_btn"):
+        st.session_state.target_result = find_systems(
+            target_kw, load_modules(), load_pcs(), target_tmin,
+            max_modules=target_mods or None, max_pcs=int(target_pcs)
+        )
+    result = st.session_state.get("target_result")
+    if result is not None:
+        if result["systems"]:
+            df_target = pd.DataFrame([{
+                "型番": s["model_number"],
+                "PCS": s["pcs_name"],
+                "PCS台数": s["pcs_count"],
+                "合計枚数": s["total_modules"],
+                "PV容量 (kW)": s["power_kw"],
+                "誤差 (kW)": s["error_kw"],
+            } for s in result["systems"]])
+            st.dataframe(df_target, use_container_width=True)
+            pick = st.selectbox("回路構成を表示", options=range(len(result["systems"])), key="target_pick",
+                                format_func=lambda i: f"{result['systems'][i]['model_number']} × "
+                                                      f"{result['systems'][i]['pcs_name']}")
+            for u, series in enumerate(result["systems"][pick]["layouts"], start=1):
+                st.markdown(f"**PCS {u} 台目**")
+                st.dataframe(pd.DataFrame(series,
+                                          index=[f"MPPT{i + 1}" for i in range(len(series))],
+                                          columns=[f"回路{j + 1}" for j in range(len(series[0]))]),
+                             use_container_width=True)
+        else:
+            st.warning("⚠️ 条件を満たす構成は見つかりませんでした。")
+        st.caption(f"評価した組合せ: {result['evaluated']} / {result['candidates']}")
+        if not result["complete"]:
+            st.info("ℹ️ 時間制限のため探索を途中で打ち切りました。上位の結果は暫定です。")
+
+# ─── PLANT PROJECT TAB ───
+# Mutations run as on_click callbacks, before the project is read below
+def save_project_cb():
+    name = st.session_state.project_name.strip()
+    if name:
+        save_project(name, st.session_state.project_tmin)
+        st.session_state.project_sel = name
+
+def add_units_cb(project):
+    # Add the layout currently entered in ➂ as one or more PCS units
+    pcs_name, mod_name = st.session_state.get("cfg_pcs"), st.session_state.get("cfg_mod")
+    p, mod = load_pcs()[pcs_name], load_modules()[mod_name]
+    site = st.session_state.get("site_temps")
+    if site:
+        min_s, _ = cached_series_bounds(p, mod, site["t_min"], site["t_max"])
+    else:
+        min_s, _ = cached_series_bounds(p, mod, st.session_state.get("cfg_tmin", T_MIN_OPTIONS[1]))
+    series = [
+        [st.session_state.get(f"ser_{i}_{j}", min_s if j==0 else 0) for j in range(circuits_per_mppt(p))]
+        for i in range(p["mppt_count"])
+    ]
+    save_project_units(project, [
+        {"pcs_name": pcs_name, "model_number": mod_name, "series": series}
+    ] * int(st.session_state.project_copies))
+
+def delete_project_cb(project):
+    delete_project(project)
+    st.session_state.pop("project_sel", None)
+
+with st.expander("**【🏭 複数PCSプロジェクト】**", expanded=st.session_state.get("menu_page") == "Projects"):
+    st.markdown(
+        "<h4 style='margin-bottom: 10px;'>🏭 複数台のPCSで構成する発電所の集計</h4>",
+        unsafe_allow_html=True
+    )
+    projects = list_projects()
+    project = st.selectbox("プロジェクト", projects, key="project_sel") if projects else None
+
+    with st.expander("➕ 新規作成・温度変更"):
+        c1, c2 = st.columns(2, gap="small")
+        c1.text_input("プロジェクト名", key="project_name")
+        c2.selectbox("設置場所の最低温度（℃）", options=list(T_MIN_OPTIONS), key="project_tmin", index=1)
+        st.button("保存", key="btn_save_project", on_click=save_project_cb)
+
+    if project:
+        data = load_project(project)
+        m1, m2, m3 = st.columns(3, gap="small")
+        m1.metric("PCS台数", f"{data['pcs_count']} 台")
+        m2.metric("合計モジュール数", f"{data['total_modules']} 枚")
+        m3.metric("合計PV出力", f"{data['dc_kw']:.2f} kW")
+        m4, m5, m6 = st.columns(3, gap="small")
+        m4.metric("合計AC出力", f"{data['ac_kw']:.1f} kW")
+        m5.metric("DC/AC比", f"{data['dc_ac_ratio']:.2f}" if data["dc_ac_ratio"] is not None else "-")
+        m6.metric("エラーのあるPCS", f"{data['invalid_units']} 台")
+        st.caption(f"最低温度 {data['t_min']}℃ で判定"
+                   + (f" / 定格AC出力未登録のPCS: {data['ac_missing']} 台" if data["ac_missing"] else ""))
+
+        if data["units"]:
+            st.dataframe(pd.DataFrame([{
+                "No.": u["unit_no"],
+                "PCS": u["pcs_name"],
+                "モジュール": u["model_number"],
+                "枚数": u["total_modules"],
+                "PV出力 (kW)": u["dc_kw"],
+                "判定": "✅" if u["valid"] else "🚫",
+                "エラー": ", ".join(sorted({e[2] for e in u["errors"]})),
+            } for u in data["units"]]), use_container_width=True, hide_index=True)
+
+        a1, a2 = st.columns([1, 2], gap="small")
+        a1.number_input("台数", min_value=1, max_value=200, value=1, step=1, key="project_copies")
+        a2.button("➂の回路構成を追加", key="btn_add_units", on_click=add_units_cb, args=(project,),
+                  disabled=not (st.session_state.get("cfg_pcs") and st.session_state.get("cfg_mod")))
+
+        d1, d2, d3 = st.columns(3, gap="small")
+        if data["units"]:
+            unit_no = d1.selectbox("PCS No.", [u["unit_no"] for u in data["units"]], key="project_unit_sel",
+                                   label_visibility="collapsed")
+            d2.button("🗑️ PCSを削除", key="btn_del_unit", on_click=delete_project_unit, args=(project, unit_no))
+        d3.button("🗑️ プロジェクト削除", key="btn_del_project", on_click=delete_project_cb, args=(project,))
+
 # ─── LOGOUT TAB ───
 # Simple logout confirmation (not expandable)
 logout_selected = st.button("🔓 ログアウト", key="logout_btn")
@@ -1,16 +1,35 @@
-import sqlite3, hashlib, os, hmac
+import sqlite3, hashlib, os, hmac, threading, time
+
+# One users.db connection per process, shared by every session. sqlite3
+# connections are not safe for concurrent use, so statements run under
+# _db_lock; password hashing (PBKDF2, the slow part) runs outside it.
+_conn    = None
+_db_lock = threading.RLock()
+
+# The permanent account is checked once per process, on the first auth call
+_bootstrap_lock = threading.Lock()
+_bootstrapped   = False
+
+# Login latency split into database and hashing time
+_stats_lock  = threading.Lock()
+_login_stats = {"logins": 0, "db_seconds": 0.0, "hash_seconds": 0.0, "last": None}
 
 def get_db():
-    conn = sqlite3.connect("users.db")
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            password_hash TEXT
-        )
-    """)
-    conn.commit()
-    return conn
+    """Return the process-wide users.db connection (the table is created on first use)."""
+    global _conn
+    with _db_lock:
+        if _conn is None:
+            conn = sqlite3.connect("users.db", check_same_thread=False)
+            c = conn.cursor()
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password_hash TEXT
+                )
+            """)
+            conn.commit()
+            _conn = conn
+        return _conn
 
 def hash_password(pw, salt=None, iterations=100_000):
     """Create a salted PBKDF2 hash for the given password."""
@@ -33,100 +52,104 @@ def verify_password(pw, stored_hash, iterations=100_000):
         legacy = hashlib.sha256(pw.encode()).hexdigest()
         return hmac.compare_digest(legacy, stored_hash)
 
+def _fetch_hash(user):
+    with _db_lock:
+        row = get_db().execute("SELECT password_hash FROM users WHERE username=?", (user,)).fetchone()
+    return row[0] if row else None
+
+def _set_hash(user, password_hash):
+    with _db_lock:
+        conn = get_db()
+        updated = conn.execute("UPDATE users SET password_hash=? WHERE username=?",
+                               (password_hash, user)).rowcount
+        conn.commit()
+    return updated > 0
+
 def ensure_permanent_credentials():
     """Ensure the permanent smartsolar user exists with correct password"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    # Check if smartsolar user exists
-    c.execute("SELECT password_hash FROM users WHERE username=?", ('smartsolar',))
-    row = c.fetchone()
-    
+    global _bootstrapped
     correct_pw = 'solar27'
-    if row:
-        stored_hash = row[0]
-        if verify_password(correct_pw, stored_hash):
-            if '$' not in stored_hash:
-                # Upgrade legacy hash to salted hash
-                c.execute(
-                    "UPDATE users SET password_hash=? WHERE username=?",
-                    (hash_password(correct_pw), 'smartsolar'),
-                )
-                conn.commit()
-        else:
-            c.execute(
-                "UPDATE users SET password_hash=? WHERE username=?",
-                (hash_password(correct_pw), 'smartsolar'),
+    stored_hash = _fetch_hash('smartsolar')
+    if stored_hash is None:
+        # Create the user if it doesn't exist
+        password_hash = hash_password(correct_pw)
+        with _db_lock:
+            conn = get_db()
+            conn.execute(
+                "INSERT OR IGNORE INTO users (username, password_hash) VALUES (?, ?)",
+                ('smartsolar', password_hash),
             )
             conn.commit()
-    else:
-        # Create the user if it doesn't exist
-        c.execute(
-            "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-            ('smartsolar', hash_password(correct_pw)),
-        )
-        conn.commit()
-    
-    conn.close()
+    elif not verify_password(correct_pw, stored_hash) or '$' not in stored_hash:
+        # Reset a changed password / upgrade a legacy hash to a salted one
+        _set_hash('smartsolar', hash_password(correct_pw))
+    _bootstrapped = True
+
+def _bootstrap():
+    # Double-checked so only the first call per process pays for the PBKDF2 check
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if not _bootstrapped:
+            ensure_permanent_credentials()
 
 def check_login(user, pw):
-    # Ensure permanent credentials are available
-    ensure_permanent_credentials()
-    
-    conn = get_db(); c = conn.cursor()
-    c.execute("SELECT password_hash FROM users WHERE username=?", (user,))
-    row = c.fetchone()
-    if not row:
-        conn.close()
+    _bootstrap()
+
+    start = time.perf_counter()
+    stored_hash = _fetch_hash(user)
+    db_seconds = time.perf_counter() - start
+    if stored_hash is None:
+        _record_login(db_seconds, 0.0)
         return False
-    stored_hash = row[0]
-    if verify_password(pw, stored_hash):
-        if '$' not in stored_hash:
-            # Upgrade legacy hash to salted hash
-            c.execute(
-                "UPDATE users SET password_hash=? WHERE username=?",
-                (hash_password(pw), user),
-            )
-            conn.commit()
-        conn.close()
-        return True
-    conn.close()
-    return False
+
+    start = time.perf_counter()
+    ok = verify_password(pw, stored_hash)
+    hash_seconds = time.perf_counter() - start
+    if ok and '$' not in stored_hash:
+        # Upgrade legacy hash to salted hash
+        start = time.perf_counter()
+        new_hash = hash_password(pw)
+        hash_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        _set_hash(user, new_hash)
+        db_seconds += time.perf_counter() - start
+    _record_login(db_seconds, hash_seconds)
+    return ok
+
+def _record_login(db_seconds, hash_seconds):
+    with _stats_lock:
+        _login_stats["logins"] += 1
+        _login_stats["db_seconds"] += db_seconds
+        _login_stats["hash_seconds"] += hash_seconds
+        _login_stats["last"] = {"db_ms": db_seconds * 1000, "hash_ms": hash_seconds * 1000}
+
+def login_stats():
+    """Return the login count, cumulative DB / hashing seconds and the last login's split in ms."""
+    with _stats_lock:
+        return dict(_login_stats)
 
 def create_user(user, pw):
-    # Ensure permanent credentials are available
-    ensure_permanent_credentials()
-    
-    conn = get_db(); c = conn.cursor()
-    try:
-        c.execute(
-            "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-            (user, hash_password(pw)),
-        )
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    _bootstrap()
+
+    password_hash = hash_password(pw)
+    with _db_lock:
+        conn = get_db()
+        try:
+            conn.execute(
+                "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                (user, password_hash),
+            )
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False
 
 def update_password(user, new_pw):
-    # Ensure permanent credentials are available
-    ensure_permanent_credentials()
+    _bootstrap()
 
-    conn = get_db(); c = conn.cursor()
-    c.execute("SELECT 1 FROM users WHERE username=?", (user,))
-    if not c.fetchone():
-        conn.close()
+    # Unknown users are rejected before paying for the hash
+    if _fetch_hash(user) is None:
         return False
-
-    c.execute(
-        "UPDATE users SET password_hash=? WHERE username=?",
-        (hash_password(new_pw), user),
-    )
-    conn.commit()
-    conn.close()
-    return True
-
-# Initialize permanent credentials when module is imported
-ensure_permanent_credentials()
+    return _set_hash(user, hash_password(new_pw))
@@ -0,0 +1,173 @@
+# batch.py
+# Headless validation of design spreadsheets: every CSV row is one
+# (PCS, module, t_min, layout) design, checked with the rules of the ➂
+# circuit-config section (engine.validate_layout).
+#
+# Rows are streamed from the input in chunks; chunks are validated in a
+# process pool (each chunk in one vectorized engine pass per t_min) and the
+# results are written back in input order, with a bounded number of chunks
+# in flight so memory stays flat for any file size.
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import db
+import engine
+
+CHUNK_SIZE = 2000
+MAX_SERIES = 1000         # upper bound accepted for one series count (as in api.py)
+RESULT_COLUMNS = ("verdict", "errors")
+
+# Catalog of the worker process, set by _init_worker()
+_catalog = {"pcs": {}, "modules": {}}
+
+def parse_series(row):
+    """Read the layout of one CSV row.
+
+    Either a ``series`` column ("9,9,0;9,0,0": MPPT inputs separated by
+    ";", circuits by ",") or columns mppt1, mppt2, ... with one MPPT input
+    each ("9,9,0"). Blank MPPT columns are skipped; an empty circuit field
+    ("9,,9") is an error since it would shift the circuit positions.
+    """
+    if (row.get("series") or "").strip():
+        parts = row["series"].split(";")
+    else:
+        keys = sorted((k for k in row if k and k.lower().startswith("mppt") and k[4:].isdigit()),
+                      key=lambda k: int(k[4:]))
+        parts = [row[k] for k in keys if (row[k] or "").strip()]
+    series = []
+    for part in parts:
+        values = part.replace(" ", "").split(",")
+        if "" in values:
+            raise ValueError("empty series count")
+        series.append([int(v) for v in values])
+        if any(v < 0 or v > MAX_SERIES for v in series[-1]):
+            raise ValueError("series count out of range")
+    if not series:
+        raise ValueError("no series counts")
+    return series
+
+def format_errors(errors):
+    """Error codes as text: "range@1-2" (MPPT 1, circuit 2), "current@3", "empty"."""
+    out = []
+    for i, j, code in errors:
+        if i is None:
+            out.append(code)
+        elif j is None:
+            out.append(f"{code}@{i + 1}")
+        else:
+            out.append(f"{code}@{i + 1}-{j + 1}")
+    return " ".join(out)
+
+def _init_worker(pcs_units, modules):
+    _catalog["pcs"], _catalog["modules"] = pcs_units, modules
+
+def validate_rows(rows):
+    """Return (verdict, errors) for each CSV row dict of a chunk."""
+    results = [None] * len(rows)
+    by_t_min = {}
+    for k, row in enumerate(rows):
+        try:
+            pcs = _catalog["pcs"].get((row.get("pcs") or "").strip())
+            module = _catalog["modules"].get((row.get("module") or "").strip())
+            if pcs is None:
+                raise LookupError("unknown_pcs")
+            if module is None:
+                raise LookupError("unknown_module")
+            t_min = float(row.get("t_min") or "")
+            if not math.isfinite(t_min):
+                raise ValueError("t_min must be finite")
+            by_t_min.setdefault(t_min, []).append((k, pcs, module, parse_series(row)))
+        except LookupError as exc:
+            results[k] = ("NG", exc.args[0])
+        except ValueError:
+            results[k] = ("NG", "invalid")
+    for t_min, items in by_t_min.items():
+        out = engine.validate_layouts_batch([i[1] for i in items], [i[2] for i in items],
+                                            [i[3] for i in items], t_min)
+        for (k, _, _, _), errors in zip(items, engine.layout_errors(out)):
+            results[k] = ("OK" if not errors else "NG", format_errors(errors))
+    return results
+
+def _chunks(reader, size):
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def validate_file(src, dest, workers=None, chunk_size=CHUNK_SIZE, pcs_units=None, modules=None):
+    """Validate every row of the CSV ``src`` and write ``dest`` with verdict/errors columns.
+
+    The catalog defaults to db.load_pcs() / db.load_modules(). ``workers``
+    defaults to the CPU count; 1 validates in this process. Returns a dict
+    with ``rows``, ``ok``, ``ng``, ``seconds`` and ``rows_per_sec``.
+    """
+    if pcs_units is None or modules is None:
+        db.init_db()
+        pcs_units, modules = db.load_pcs(), db.load_modules()
+    workers = workers or os.cpu_count() or 1
+    stats = {"rows": 0, "ok": 0, "ng": 0}
+    start = time.perf_counter()
+
+    with open(src, encoding="utf-8-sig", newline="") as f_in, \
+         open(dest, "w", encoding="utf-8", newline="") as f_out:
+        reader = csv.DictReader(f_in)
+        writer = csv.DictWriter(f_out, fieldnames=list(reader.fieldnames or []) + list(RESULT_COLUMNS),
+                                extrasaction="ignore")
+        writer.writeheader()
+
+        def write(chunk, results):
+            for row, (verdict, errors) in zip(chunk, results):
+                row["verdict"], row["errors"] = verdict, errors
+                stats["ok" if verdict == "OK" else "ng"] += 1
+                writer.writerow(row)
+            stats["rows"] += len(chunk)
+
+        if workers == 1:
+            _init_worker(pcs_units, modules)
+            for chunk in _chunks(reader, chunk_size):
+                write(chunk, validate_rows(chunk))
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(pcs_units, modules)) as pool:
+                pending = deque()
+                for chunk in _chunks(reader, chunk_size):
+                    pending.append((chunk, pool.submit(validate_rows, chunk)))
+                    # Keep a couple of chunks per worker in flight, write in order
+                    while len(pending) > 2 * workers:
+                        done, fut = pending.popleft()
+                        write(done, fut.result())
+                while pending:
+                    done, fut = pending.popleft()
+                    write(done, fut.result())
+
+    seconds = time.perf_counter() - start
+    return dict(stats, seconds=seconds, rows_per_sec=stats["rows"] / seconds if seconds > 0 else 0.0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="batch.py",
+        description="Validate design rows (pcs, module, t_min, series or mppt1..N) against the catalog",
+    )
+    parser.add_argument("src", help="input CSV")
+    parser.add_argument("dest", help="result CSV (input columns + verdict, errors)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    report = validate_file(args.src, args.dest, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"validated {report['rows']} rows ({report['ok']} OK, {report['ng']} NG) in "
+          f"{report['seconds']:.2f}s ({report['rows_per_sec']:.0f} rows/s)")
+    return 1 if report["ng"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,207 @@
 # db.py
+import argparse
+import csv
+import difflib
+import io
+import itertools
+import json
+import math
+import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import engine
 
 # Use a single DB file for both modules and pcs
-_conn = sqlite3.connect("modules.db", check_same_thread=False)
-_cur  = _conn.cursor()
+DB_PATH = "modules.db"
 
-def init_db():
-    # existing modules table
-    _cur.execute("""
+# PRAGMAs for the read-heavy catalog workload. WAL lets readers run while a
+# write is in progress; synchronous=NORMAL is durable enough under WAL.
+_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",   # 256 MiB
+    "PRAGMA cache_size=-16000",     # ~16 MiB
+    "PRAGMA temp_store=MEMORY",
+)
+_READ_POOL_SIZE = 8
+
+def _connect(path, readonly=False):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if not readonly:
+        conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+    return conn
+
+# --- Connection manager ---
+# All writes go through the single module-level _conn under _write_lock.
+# Reads borrow a connection from a small pool so concurrent Streamlit
+# sessions do not queue behind one cursor. An in-memory database (as used
+# by the tests) only exists on _conn, so reads fall back to it.
+_conn       = _connect(DB_PATH)
+_write_lock = threading.RLock()
+_read_pool  = queue.LifoQueue(maxsize=_READ_POOL_SIZE)
+_conn_file  = (None, "")   # (connection, file path) resolved by _db_file()
+
+def _db_file(conn):
+    """Return the file behind ``conn`` ("" for an in-memory database)."""
+    global _conn_file
+    if _conn_file[0] is not conn:
+        with _write_lock:
+            row = conn.execute("PRAGMA database_list").fetchone()
+        _conn_file = (conn, row[2] if row else "")
+    return _conn_file[1]
+
+@contextmanager
+def _writing():
+    with _write_lock:
+        yield _conn.cursor()
+
+@contextmanager
+def _reading():
+    owner = _conn
+    path  = _db_file(owner)
+    if not path:
+        with _write_lock:
+            yield owner.cursor()
+        return
+    try:
+        pooled_owner, conn = _read_pool.get_nowait()
+        if pooled_owner is not owner:
+            conn.close()
+            conn = _connect(path, readonly=True)
+    except queue.Empty:
+        conn = _connect(path, readonly=True)
+    try:
+        yield conn.cursor()
+    finally:
+        try:
+            _read_pool.put_nowait((owner, conn))
+        except queue.Full:
+            conn.close()
+
+# --- Single writer with group commit ---
+# Catalog mutations are queued as jobs ``job(cur)`` and executed by one
+# writer thread. Jobs that pile up while a commit is in flight are drained
+# together and committed in a single transaction; each job runs in its own
+# SAVEPOINT so a failing job does not take the rest of the batch with it.
+_MAX_WRITE_BATCH = 64
+_write_queue     = queue.Queue()
+_writer_thread   = None
+_writer_stats    = {"batches": 0, "writes": 0}
+
+def _submit(job):
+    """Run ``job(cur)`` on the writer thread and return its result."""
+    global _writer_thread
+    if threading.current_thread() is _writer_thread:
+        return job(_conn.cursor())
+    with _write_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="db-writer", daemon=True)
+            _writer_thread.start()
+    fut = Future()
+    _write_queue.put((job, fut))
+    return fut.result()
+
+def _writer_loop():
+    while True:
+        batch = [_write_queue.get()]
+        while len(batch) < _MAX_WRITE_BATCH:
+            try:
+                batch.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+        _run_batch(batch)
+
+def _run_batch(batch):
+    outcomes = []
+    with _write_lock:
+        cur = _conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            for job, fut in batch:
+                cur.execute("SAVEPOINT job")
+                try:
+                    result = job(cur)
+                except Exception as exc:
+                    cur.execute("ROLLBACK TO job")
+                    outcomes.append((fut, None, exc))
+                else:
+                    outcomes.append((fut, result, None))
+                cur.execute("RELEASE job")
+            _conn.commit()
+        except Exception as exc:
+            if _conn.in_transaction:
+                _conn.rollback()
+            outcomes = [(fut, None, exc) for _, fut in batch]
+        _writer_stats["batches"] += 1
+        _writer_stats["writes"]  += len(batch)
+    # Invalidate before waking callers so they never read a stale snapshot
+    _invalidate_catalog()
+    for fut, result, exc in outcomes:
+        if exc is None:
+            fut.set_result(result)
+        else:
+            fut.set_exception(exc)
+
+def writer_stats():
+    """Return how many write batches were committed and how many writes they held."""
+    with _write_lock:
+        return dict(_writer_stats)
+
+# --- Shared catalog snapshot ---
+# load_modules()/load_pcs() are called several times per Streamlit rerun by
+# every session, so the catalog dicts are built once and shared process-wide.
+# Every mutation bumps _catalog_generation, which makes the next load rebuild.
+# The returned dicts are shared between sessions: treat them as read-only.
+_catalog_lock       = threading.Lock()
+_catalog_generation = 0
+_catalog_snapshots  = {}   # "modules"/"pcs" -> (generation, dict)
+_catalog_stats      = {"hits": 0, "misses": 0}
+
+def _invalidate_catalog():
+    global _catalog_generation
+    with _catalog_lock:
+        _catalog_generation += 1
+    engine.clear_calc_cache()
+
+def _cached_catalog(kind, build):
+    with _catalog_lock:
+        gen = _catalog_generation
+        snap = _catalog_snapshots.get(kind)
+        if snap is not None and snap[0] == gen:
+            _catalog_stats["hits"] += 1
+            return snap[1]
+        _catalog_stats["misses"] += 1
+    data = build()
+    with _catalog_lock:
+        # Only publish if nothing was written while we were querying
+        if gen == _catalog_generation:
+            _catalog_snapshots[kind] = (gen, data)
+    return data
+
+def catalog_cache_stats():
+    """Return hit/miss counters and the current generation of the catalog cache."""
+    with _catalog_lock:
+        return dict(_catalog_stats, generation=_catalog_generation)
+
+# --- Schema migrations ---
+# Numbered migrations keyed on PRAGMA user_version. Each one runs in its own
+# transaction together with the version bump, so it is applied exactly once
+# per database. init_db() only does work once per connection (i.e. once per
+# process), so calling it on every Streamlit rerun is cheap.
+_migrated_conn   = None
+_migration_stats = {"version": 0, "applied": [], "seconds": 0.0}
+
+def _migrate_base_schema(cur):
+    cur.execute("""
     CREATE TABLE IF NOT EXISTS modules(
       manufacturer TEXT,
       model_number TEXT PRIMARY KEY,
@@ -17,8 +211,7 @@ def init_db():
       isc_noc REAL,
       temp_coeff REAL
     )""")
-    # new pcs table
-    _cur.execute("""
+    cur.execute("""
     CREATE TABLE IF NOT EXISTS pcs(
       name TEXT PRIMARY KEY,
       max_voltage REAL,
@@ -27,43 +220,27 @@ def init_db():
       mppt_max_current REAL,
       is_default INTEGER DEFAULT 0
     )""")
-    _conn.commit()
-    
-    # Migration: Add model_number column to existing pcs table if it doesn't exist
-    try:
-        _cur.execute("ALTER TABLE pcs ADD COLUMN model_number TEXT")
-        _conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists, ignore the error
-        pass
-    
-    # Migration: Add is_default column to existing pcs table if it doesn't exist
-    try:
-        _cur.execute("ALTER TABLE pcs ADD COLUMN is_default INTEGER DEFAULT 0")
-        _conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists, ignore the error
-        pass
-    
+    # Databases created by older versions may lack these pcs columns
+    existing = {row[1] for row in cur.execute("PRAGMA table_info(pcs)")}
+    if "model_number" not in existing:
+        cur.execute("ALTER TABLE pcs ADD COLUMN model_number TEXT")
+    if "is_default" not in existing:
+        cur.execute("ALTER TABLE pcs ADD COLUMN is_default INTEGER DEFAULT 0")
+
+def _migrate_seed_defaults(cur):
     # Add default PCS if no PCS exists
-    _cur.execute("SELECT COUNT(*) FROM pcs")
-    pcs_count = _cur.fetchone()[0]
-    
-    if pcs_count == 0:
-        # Insert a default PCS with specific specifications
-        _cur.execute("""
+    cur.execute("SELECT COUNT(*) FROM pcs")
+    if cur.fetchone()[0] == 0:
+        cur.execute("""
           INSERT INTO pcs
           (name, model_number, max_voltage, mppt_min_voltage, mppt_count, mppt_max_current, is_default)
           VALUES (?, ?, ?, ?, ?, ?, ?)
         """, ("マルチパワコン", "SPM-DE55-A", 450.0, 35.0, 3, 14.0, 1))
-        _conn.commit()
 
-# Add default modules if no modules exist
-    _cur.execute("SELECT COUNT(*) FROM modules")
-    module_count = _cur.fetchone()[0]
-
-    if module_count == 0:
-        _cur.executemany(
+    # Add default modules if no modules exist
+    cur.execute("SELECT COUNT(*) FROM modules")
+    if cur.fetchone()[0] == 0:
+        cur.executemany(
             """
             INSERT INTO modules
             (manufacturer, model_number, pmax_stc, voc_stc, vmpp_noc, isc_noc, temp_coeff)
@@ -75,64 +252,1072 @@ def init_db():
                 ("ソーラーフロンティア", "SF175-S", 175.0, 48.0, 36.0, 5.5, -0.30),
             ],
         )
-        _conn.commit()
 
-def save_module(manufacturer, model_no, pmax, voc, vmpp, isc, tc):
-    _cur.execute("""
+def _migrate_search_index(cur):
+    _init_search_index(cur)
+
+def _migrate_page_indexes(cur):
+    _init_page_indexes(cur)
+
+def _migrate_compat_matrix(cur):
+    # Filled by _migrate_circuits_per_mppt, which adds a pcs column the
+    # refresh reads
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS compat(
+      model_number TEXT,
+      pcs_name TEXT,
+      t_min INTEGER,
+      min_series INTEGER,
+      max_series INTEGER,
+      circuits INTEGER,
+      feasible INTEGER,
+      max_power_w REAL,
+      PRIMARY KEY (model_number, pcs_name, t_min)
+    )""")
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_compat_pcs
+    ON compat(pcs_name, t_min, feasible, max_power_w DESC, model_number)""")
+
+def _migrate_circuits_per_mppt(cur):
+    cur.execute(
+        f"ALTER TABLE pcs ADD COLUMN circuits_per_mppt INTEGER NOT NULL DEFAULT {engine.CIRCUITS_PER_MPPT}"
+    )
+    _refresh_compat(cur, pcs_names=[r[0] for r in cur.execute("SELECT name FROM pcs").fetchall()])
+
+def _migrate_projects(cur):
+    cur.execute("ALTER TABLE pcs ADD COLUMN ac_rating_kw REAL")
+    _init_projects(cur)
+
+def _migrate_stations(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS stations(
+      station_id TEXT PRIMARY KEY,
+      name TEXT,
+      lat REAL NOT NULL,
+      lon REAL NOT NULL,
+      postal_code TEXT,
+      record_low REAL NOT NULL,
+      design_high REAL
+    )""")
+
+def _migrate_degradation_rate(cur):
+    # NULL: no datasheet value, degradation.DEGRADATION_RATE applies
+    cur.execute("ALTER TABLE modules ADD COLUMN degradation_rate REAL")
+
+# Append only: a migration's position in this list is its schema version
+_MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_seed_defaults,
+    _migrate_search_index,
+    _migrate_page_indexes,
+    _migrate_compat_matrix,
+    _migrate_circuits_per_mppt,
+    _migrate_projects,
+    _migrate_stations,
+    _migrate_degradation_rate,
+]
+
+def _apply_migrations(cur):
+    applied = []
+    for version, migration in enumerate(_MIGRATIONS, start=1):
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read inside the write lock: another process may have migrated
+            current = cur.execute("PRAGMA user_version").fetchone()[0]
+            if current >= version:
+                _conn.rollback()
+                continue
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {version}")
+            _conn.commit()
+        except Exception:
+            _conn.rollback()
+            raise
+        applied.append(migration.__name__)
+    return applied
+
+def init_db():
+    global _migrated_conn, _fts_enabled
+    if _migrated_conn is _conn:
+        return
+    with _writing() as cur:
+        if _migrated_conn is _conn:
+            return
+        start = time.perf_counter()
+        # Per-connection setting: INSERT OR REPLACE only fires the DELETE
+        # triggers that keep the search index in sync when this is on
+        cur.execute("PRAGMA recursive_triggers=ON")
+        applied = _apply_migrations(cur)
+        _fts_enabled = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='modules_fts'"
+        ).fetchone() is not None
+        _migration_stats.update(
+            version=cur.execute("PRAGMA user_version").fetchone()[0],
+            applied=applied,
+            seconds=time.perf_counter() - start,
+        )
+        _migrated_conn = _conn
+    _invalidate_catalog()
+
+def migration_stats():
+    """Return the schema version, migrations applied at startup and how long they took."""
+    return dict(_migration_stats)
+
+def _insert_module(cur, manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation):
+    cur.execute("""
       INSERT OR REPLACE INTO modules
-      (manufacturer, model_number, pmax_stc, voc_stc, vmpp_noc, isc_noc, temp_coeff)
-      VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (manufacturer, model_no, pmax, voc, vmpp, isc, tc))
-    _conn.commit()
+      (manufacturer, model_number, pmax_stc, voc_stc, vmpp_noc, isc_noc, temp_coeff, degradation_rate)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation))
+
+def save_module(manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation=None):
+    def job(cur):
+        _insert_module(cur, manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation)
+        _refresh_derived(cur, model_numbers=[model_no])
+    _submit(job)
+
+def rename_module(old_model_no, manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation=None):
+    """Update a module, possibly changing its model number, in one transaction."""
+    def job(cur):
+        cur.execute("""
+          UPDATE OR REPLACE modules
+          SET manufacturer=?, model_number=?, pmax_stc=?, voc_stc=?, vmpp_noc=?, isc_noc=?, temp_coeff=?,
+              degradation_rate=?
+          WHERE model_number=?
+        """, (manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation, old_model_no))
+        if cur.rowcount == 0:
+            _insert_module(cur, manufacturer, model_no, pmax, voc, vmpp, isc, tc, degradation)
+        # Project units follow the renamed module
+        cur.execute("UPDATE project_units SET model_number=? WHERE model_number=?", (model_no, old_model_no))
+        _refresh_derived(cur, model_numbers=[old_model_no, model_no])
+    _submit(job)
 
 def load_modules():
-    _cur.execute("SELECT model_number, manufacturer, pmax_stc, voc_stc, vmpp_noc, isc_noc, temp_coeff FROM modules")
-    rows = _cur.fetchall()
-    return {
-        row[0]:{
-          "manufacturer": row[1],
-          "pmax_stc": row[2],
-          "voc_stc": row[3],
-          "vmpp_noc": row[4],
-          "isc_noc": row[5],
-          "temp_coeff": row[6],
+    return _cached_catalog("modules", _query_modules)
+
+def _query_modules():
+    with _reading() as cur:
+        cur.execute("SELECT model_number, manufacturer, pmax_stc, voc_stc, vmpp_noc, isc_noc, temp_coeff,"
+                    " degradation_rate FROM modules")
+        rows = cur.fetchall()
+        return {
+            row[0]:{
+              "manufacturer": row[1],
+              "pmax_stc": row[2],
+              "voc_stc": row[3],
+              "vmpp_noc": row[4],
+              "isc_noc": row[5],
+              "temp_coeff": row[6],
+              "degradation_rate": row[7],
+            }
+            for row in rows
         }
-        for row in rows
-    }
 
 def delete_module(model_no):
-    _cur.execute("DELETE FROM modules WHERE model_number=?", (model_no,))
-    _conn.commit()
+    def job(cur):
+        cur.execute("DELETE FROM modules WHERE model_number=?", (model_no,))
+        _refresh_derived(cur, model_numbers=[model_no])
+    _submit(job)
 
 # --- New PCS functions ---
-def save_pcs(name, model_number, max_v, min_v, count, max_i, is_default=False):
-    # If this PCS is being set as default, first unset any existing default
-    if is_default:
-        _cur.execute("UPDATE pcs SET is_default = 0")
-        _conn.commit()
-    
-    _cur.execute("""
+def _insert_pcs(cur, name, model_number, max_v, min_v, count, max_i, is_default, circuits, ac_kw):
+    cur.execute("""
       INSERT OR REPLACE INTO pcs
-      (name, model_number, max_voltage, mppt_min_voltage, mppt_count, mppt_max_current, is_default)
-      VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (name, model_number, max_v, min_v, count, max_i, 1 if is_default else 0))
-    _conn.commit()
+      (name, model_number, max_voltage, mppt_min_voltage, mppt_count, mppt_max_current, is_default,
+       circuits_per_mppt, ac_rating_kw)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (name, model_number, max_v, min_v, count, max_i, 1 if is_default else 0, circuits, ac_kw))
+
+def save_pcs(name, model_number, max_v, min_v, count, max_i, is_default=False,
+             circuits=engine.CIRCUITS_PER_MPPT, ac_kw=None):
+    def job(cur):
+        # If this PCS is being set as default, first unset any existing default
+        if is_default:
+            cur.execute("UPDATE pcs SET is_default = 0")
+        _insert_pcs(cur, name, model_number, max_v, min_v, count, max_i, is_default, circuits, ac_kw)
+        _refresh_derived(cur, pcs_names=[name])
+    _submit(job)
+
+def update_pcs(old_name, name, model_number, max_v, min_v, count, max_i, is_default=False,
+               circuits=engine.CIRCUITS_PER_MPPT, ac_kw=None):
+    """Update a PCS, possibly renaming it, in one transaction."""
+    def job(cur):
+        if is_default:
+            cur.execute("UPDATE pcs SET is_default = 0 WHERE name != ?", (old_name,))
+        cur.execute("""
+          UPDATE OR REPLACE pcs
+          SET name=?, model_number=?, max_voltage=?, mppt_min_voltage=?, mppt_count=?, mppt_max_current=?, is_default=?,
+              circuits_per_mppt=?, ac_rating_kw=?
+          WHERE name=?
+        """, (name, model_number, max_v, min_v, count, max_i, 1 if is_default else 0, circuits, ac_kw, old_name))
+        if cur.rowcount == 0:
+            _insert_pcs(cur, name, model_number, max_v, min_v, count, max_i, is_default, circuits, ac_kw)
+        # Project units follow the renamed PCS
+        cur.execute("UPDATE project_units SET pcs_name=? WHERE pcs_name=?", (name, old_name))
+        _refresh_derived(cur, pcs_names=[old_name, name])
+    _submit(job)
 
 def load_pcs():
-    _cur.execute("SELECT name, model_number, max_voltage, mppt_min_voltage, mppt_count, mppt_max_current, is_default FROM pcs")
-    rows = _cur.fetchall()
+    return _cached_catalog("pcs", _query_pcs)
+
+def _query_pcs():
+    with _reading() as cur:
+        cur.execute("SELECT name, model_number, max_voltage, mppt_min_voltage, mppt_count, mppt_max_current, is_default, "
+                    "circuits_per_mppt, ac_rating_kw FROM pcs")
+        rows = cur.fetchall()
+        return {
+          row[0]: {
+            "model_number": row[1],
+            "max_voltage": row[2],
+            "mppt_min_voltage": row[3],
+            "mppt_count": row[4],
+            "mppt_max_current": row[5],
+            "is_default": bool(row[6]) if row[6] is not None else False,
+            "circuits_per_mppt": row[7],
+            "ac_rating_kw": row[8],
+          }
+          for row in rows
+        }
+
+def delete_pcs(name):
+    def job(cur):
+        cur.execute("DELETE FROM pcs WHERE name=?", (name,))
+        _refresh_derived(cur, pcs_names=[name])
+    _submit(job)
+
+# --- Weather stations ---
+def load_stations():
+    """Return {station_id: {name, lat, lon, postal_code, record_low, design_high}}."""
+    return _cached_catalog("stations", _query_stations)
+
+def _query_stations():
+    with _reading() as cur:
+        cur.execute(f"SELECT {', '.join(_STATION_COLUMNS)} FROM stations")
+        return {row[0]: dict(zip(_STATION_COLUMNS[1:], row[1:])) for row in cur.fetchall()}
+
+# --- Full-text search ---
+# Trigram FTS5 indexes over the catalog text columns, kept in sync by
+# triggers (see init_db() for the recursive_triggers setting they rely on).
+# Where FTS5/trigram is unavailable searches fall back to LIKE scans.
+_SEARCH = {
+    "modules": {"table": "modules", "key": "model_number", "columns": ("model_number", "manufacturer"),
+                "order": "model_number"},
+    "pcs":     {"table": "pcs", "key": "name", "columns": ("name", "model_number"),
+                "order": "is_default DESC, name"},
+}
+_fts_enabled = False
+
+def _init_search_index(cur):
+    try:
+        for spec in _SEARCH.values():
+            table, cols = spec["table"], spec["columns"]
+            fts = f"{table}_fts"
+            exists = cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)
+            ).fetchone()
+            if exists:
+                continue
+            col_list = ", ".join(cols)
+            new_vals = ", ".join(f"new.{c}" for c in cols)
+            old_vals = ", ".join(f"old.{c}" for c in cols)
+            cur.execute(f"""
+              CREATE VIRTUAL TABLE {fts} USING fts5(
+                {col_list}, content='{table}', content_rowid='rowid', tokenize='trigram'
+              )""")
+            cur.execute(f"""
+              CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_vals});
+              END""")
+            cur.execute(f"""
+              CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_vals});
+              END""")
+            cur.execute(f"""
+              CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.rowid, {old_vals});
+                INSERT INTO {fts}(rowid, {col_list}) VALUES (new.rowid, {new_vals});
+              END""")
+            cur.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5 or older than 3.34 (no trigram tokenizer)
+        pass
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def _like_prefix(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _search(kind, query, limit):
+    spec  = _SEARCH[kind]
+    table, key, cols = spec["table"], spec["key"], spec["columns"]
+    query = (query or "").strip()
+    with _reading() as cur:
+        if not query:
+            cur.execute(f"SELECT {key} FROM {table} ORDER BY {spec['order']} LIMIT ?", (limit,))
+            return [r[0] for r in cur.fetchall()]
+
+        prefix = _like_prefix(query)
+        if not _fts_enabled or len(query) < 3:
+            # Trigrams need at least 3 characters: prefix/substring scan instead
+            where = " OR ".join(f"{c} LIKE ? ESCAPE '\\'" for c in cols)
+            cur.execute(
+                f"SELECT {key} FROM {table} WHERE {where} "
+                f"ORDER BY ({key} LIKE ? ESCAPE '\\') DESC, {key} LIMIT ?",
+                ["%" + prefix] * len(cols) + [prefix, limit],
+            )
+            return [r[0] for r in cur.fetchall()]
+
+        fts = f"{table}_fts"
+        select = (
+            f"SELECT t.{key} FROM {fts} f JOIN {table} t ON t.rowid = f.rowid "
+            f"WHERE {fts} MATCH ? ORDER BY (t.{key} LIKE ? ESCAPE '\\') DESC, f.rank LIMIT ?"
+        )
+        # Exact substring matches first (prefix matches on the key ranked on top)
+        cur.execute(select, (_fts_phrase(query), prefix, limit))
+        found = [r[0] for r in cur.fetchall()]
+        if found or len(query) <= 3:
+            return found
+        # Fuzzy (typos): rows sharing trigrams with the query, best bm25
+        # candidates re-ranked by edit similarity
+        grams = {query[i:i + 3] for i in range(len(query) - 2)}
+        cur.execute(select, (" OR ".join(_fts_phrase(g) for g in sorted(grams)), prefix, limit * 10))
+        candidates = [r[0] for r in cur.fetchall()]
+    q = query.lower()
+    candidates.sort(key=lambda k: -difflib.SequenceMatcher(None, q, k.lower()).ratio())
+    return candidates[:limit]
+
+def search_modules(query, limit=50):
+    """Return up to ``limit`` module model numbers matching ``query``.
+
+    Matches on model number and manufacturer: prefix matches first, then
+    substring matches; if nothing matches, the closest fuzzy (shared-trigram)
+    matches are returned.
+    """
+    return _search("modules", query, limit)
+
+def search_pcs(query, limit=50):
+    """Return up to ``limit`` PCS names matching ``query`` on name or model number."""
+    return _search("pcs", query, limit)
+
+# --- Bulk import ---
+# Rows are streamed from a CSV / JSON Lines file (a plain JSON array is also
+# accepted, but has to be parsed in one go) in UTF-8, or Shift_JIS as saved
+# by Excel. Each chunk is validated on the calling thread and then written
+# with executemany on the writer thread before the next one is read, so a
+# slow parse never holds _write_lock.
+_IMPORT_CHUNK = 1000
+MAX_MPPT_COUNT        = 64   # import limits: the UI renders mppt_count × circuits inputs
+MAX_CIRCUITS_PER_MPPT = 20   # same limit as the PCS form
+
+_MODULE_COLUMNS = ("manufacturer", "model_number", "pmax_stc", "voc_stc", "vmpp_noc", "isc_noc", "temp_coeff",
+                   "degradation_rate")
+_STATION_COLUMNS = ("station_id", "name", "lat", "lon", "postal_code", "record_low", "design_high")
+_PCS_COLUMNS    = ("name", "model_number", "max_voltage", "mppt_min_voltage", "mppt_count", "mppt_max_current",
+                   "circuits_per_mppt", "ac_rating_kw")
+
+def _text(rec, key):
+    value = str(rec.get(key) or "").strip()
+    if not value:
+        raise ValueError(f"{key} is required")
+    return value
+
+def _number(rec, key, positive=False, integer=False, minimum=None, maximum=None):
+    raw = rec.get(key)
+    if raw is None or str(raw).strip() == "":
+        raise ValueError(f"{key} is required")
+    try:
+        value = float(raw)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{key} is not a number: {raw!r}")
+    # "nan" / "inf" parse as floats but are stored as NULL or overflow int()
+    if not math.isfinite(value):
+        raise ValueError(f"{key} must be a finite number: {raw!r}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{key} must be at least {minimum}: {raw!r}")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{key} must be at most {maximum}: {raw!r}")
+    if integer:
+        if value != int(value):
+            raise ValueError(f"{key} must be an integer: {raw!r}")
+        value = int(value)
+    if positive and value <= 0:
+        raise ValueError(f"{key} must be positive: {raw!r}")
+    return value
+
+def _module_row(rec):
+    return (
+        _text(rec, "manufacturer"),
+        _text(rec, "model_number"),
+        _number(rec, "pmax_stc", positive=True),
+        _number(rec, "voc_stc", positive=True),
+        _number(rec, "vmpp_noc", positive=True),
+        _number(rec, "isc_noc", positive=True),
+        _number(rec, "temp_coeff"),
+        # Optional: %/year, blank = degradation.DEGRADATION_RATE
+        _number(rec, "degradation_rate", minimum=0) if str(rec.get("degradation_rate") or "").strip() else None,
+    )
+
+def _pcs_row(rec):
+    return (
+        _text(rec, "name"),
+        str(rec.get("model_number") or "").strip(),
+        _number(rec, "max_voltage", positive=True),
+        _number(rec, "mppt_min_voltage"),
+        _number(rec, "mppt_count", positive=True, integer=True, maximum=MAX_MPPT_COUNT),
+        _number(rec, "mppt_max_current", positive=True),
+        # Optional: older files have no circuits_per_mppt column
+        _number(rec, "circuits_per_mppt", positive=True, integer=True, maximum=MAX_CIRCUITS_PER_MPPT)
+        if str(rec.get("circuits_per_mppt") or "").strip() else engine.CIRCUITS_PER_MPPT,
+        _number(rec, "ac_rating_kw", positive=True) if str(rec.get("ac_rating_kw") or "").strip() else None,
+    )
+
+def _station_row(rec):
+    lat, lon = _number(rec, "lat"), _number(rec, "lon")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"lat/lon out of range: {lat}, {lon}")
+    return (
+        _text(rec, "station_id"),
+        str(rec.get("name") or "").strip(),
+        lat,
+        lon,
+        str(rec.get("postal_code") or "").replace("-", "").strip(),
+        _number(rec, "record_low"),
+        _number(rec, "design_high") if str(rec.get("design_high") or "").strip() else None,
+    )
+
+_IMPORT_KINDS = {
+    "modules": (_module_row, """
+      INSERT OR REPLACE INTO modules
+      (manufacturer, model_number, pmax_stc, voc_stc, vmpp_noc, isc_noc, temp_coeff, degradation_rate)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """),
+    # Upsert so re-importing a PCS keeps its is_default flag
+    "pcs": (_pcs_row, """
+      INSERT INTO pcs
+      (name, model_number, max_voltage, mppt_min_voltage, mppt_count, mppt_max_current, circuits_per_mppt,
+       ac_rating_kw)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+      ON CONFLICT(name) DO UPDATE SET
+        model_number=excluded.model_number, max_voltage=excluded.max_voltage,
+        mppt_min_voltage=excluded.mppt_min_voltage, mppt_count=excluded.mppt_count,
+        mppt_max_current=excluded.mppt_max_current, circuits_per_mppt=excluded.circuits_per_mppt,
+        ac_rating_kw=excluded.ac_rating_kw
+    """),
+    "stations": (_station_row, """
+      INSERT OR REPLACE INTO stations
+      (station_id, name, lat, lon, postal_code, record_low, design_high)
+      VALUES (?, ?, ?, ?, ?, ?, ?)
+    """),
+}
+
+def _guess_format(name):
+    ext = os.path.splitext(str(name or ""))[1].lower()
+    if ext in (".json", ".jsonl", ".ndjson"):
+        return "json"
+    return "csv"
+
+_IMPORT_ENCODINGS = ("utf-8-sig", "cp932")
+
+def _open_text(source, encoding):
+    """Return (text stream, close) for a path or a text/binary file object."""
+    if isinstance(source, io.TextIOBase):
+        return source, lambda: None
+    if hasattr(source, "read"):
+        # Detach instead of closing so the caller's file object stays usable
+        stream = io.TextIOWrapper(source, encoding=encoding, newline="")
+        return stream, stream.detach
+    stream = open(source, encoding=encoding, newline="")
+    return stream, stream.close
+
+def _iter_records(stream, fmt):
+    """Yield (line number, record dict) pairs from a CSV or JSON stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for rec in reader:
+            yield reader.line_num, rec
+        return
+    first = ""
+    while not first.strip():
+        first = stream.readline()
+        if not first:
+            return
+    if first.lstrip().startswith("["):
+        # Plain JSON array: one syntax error rejects the whole file
+        try:
+            records = json.loads(first + stream.read())
+        except ValueError as exc:
+            raise ValueError(f"invalid JSON: {exc}") from exc
+        for n, rec in enumerate(records, start=1):
+            yield n, rec
+        return
+    # JSON Lines: a malformed line is reported as that row's error
+    for n, line in enumerate(itertools.chain([first], stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError as exc:
+            yield n, exc
+
+def _iter_chunks(stream, fmt, to_row, errors, chunk_size):
+    """Yield lists of validated row tuples; bad rows go to ``errors`` as (line, message)."""
+    chunk = []
+    try:
+        for line, rec in _iter_records(stream, fmt):
+            try:
+                if isinstance(rec, Exception):
+                    raise ValueError(f"invalid JSON: {rec}")
+                if not isinstance(rec, dict):
+                    raise ValueError(f"row is not an object: {rec!r}")
+                chunk.append(to_row(rec))
+            except ValueError as exc:
+                errors.append((line, str(exc)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    except csv.Error as exc:
+        raise ValueError(f"invalid CSV: {exc}") from exc
+    if chunk:
+        yield chunk
+
+def import_catalog(source, kind="modules", fmt=None, chunk_size=_IMPORT_CHUNK):
+    """Bulk-load modules, PCS units or weather stations from a CSV / JSON file.
+
+    ``source`` is a path or a file object. Invalid rows are skipped and
+    reported; valid rows are written one transaction per chunk. A file that
+    is not UTF-8 is read again as Shift_JIS; rows are upserts, so chunks
+    already written are simply rewritten. Returns a dict with ``rows``,
+    ``errors`` (list of (line, message)), ``seconds`` and ``rows_per_sec``.
+    Raises ValueError when the file as a whole cannot be read (unknown
+    encoding, malformed JSON array or CSV).
+    """
+    if kind not in _IMPORT_KINDS:
+        raise ValueError(f"unknown catalog kind: {kind}")
+    to_row, sql = _IMPORT_KINDS[kind]
+    fmt = fmt or _guess_format(getattr(source, "name", source))
+    # Binary file objects are rewound for the Shift_JIS retry
+    origin = source.tell() if hasattr(source, "seekable") and source.seekable() else None
+    errors = []
+    start = time.perf_counter()
+
+    def load(cur, chunk):
+        cur.executemany(sql, chunk)
+        keys = [row[1] if kind == "modules" else row[0] for row in chunk]
+        if kind == "modules":
+            _refresh_derived(cur, model_numbers=keys)
+        elif kind == "pcs":
+            _refresh_derived(cur, pcs_names=keys)
+
+    for n, encoding in enumerate(_IMPORT_ENCODINGS):
+        if n and hasattr(source, "read"):
+            if origin is None:
+                raise ValueError("file is not UTF-8 text")
+            source.seek(origin)
+        stream, close = _open_text(source, encoding)
+        loaded, errors[:] = 0, []
+        try:
+            for chunk in _iter_chunks(stream, fmt, to_row, errors, chunk_size):
+                _submit(lambda cur, chunk=chunk: load(cur, chunk))
+                loaded += len(chunk)
+            break
+        except UnicodeDecodeError:
+            pass
+        finally:
+            close()
+    else:
+        raise ValueError("file is neither UTF-8 nor Shift_JIS text")
+    seconds = time.perf_counter() - start
     return {
-      row[0]: {
-        "model_number": row[1],
-        "max_voltage": row[2],
-        "mppt_min_voltage": row[3],
-        "mppt_count": row[4],
-        "mppt_max_current": row[5],
-        "is_default": bool(row[6]) if row[6] is not None else False,
-      }
-      for row in rows
+        "rows": loaded,
+        "errors": errors,
+        "seconds": seconds,
+        "rows_per_sec": loaded / seconds if seconds > 0 else float(loaded),
     }
 
-def delete_pcs(name):
-    _cur.execute("DELETE FROM pcs WHERE name=?", (name,))
-    _conn.commit()
+# --- Streaming export ---
+# Rows are pulled from a cursor with fetchmany() and written chunk by chunk,
+# so memory use stays flat regardless of catalog size. Parquet needs pyarrow
+# (installed together with streamlit); it is imported only when used.
+_EXPORT_CHUNK = 5000
+
+_EXPORT_COLUMNS = {
+    "modules": _MODULE_COLUMNS,
+    "pcs": _PCS_COLUMNS + ("is_default",),
+    "stations": _STATION_COLUMNS,
+}
+
+_PARQUET_TYPES = {
+    "manufacturer": "string", "model_number": "string", "name": "string",
+    "station_id": "string", "postal_code": "string",
+    "mppt_count": "int64", "is_default": "int64", "circuits_per_mppt": "int64",
+}
+
+def iter_catalog_chunks(kind, chunk_size=_EXPORT_CHUNK):
+    """Yield lists of row tuples from the ``modules`` or ``pcs`` table."""
+    if kind not in _EXPORT_COLUMNS:
+        raise ValueError(f"unknown catalog kind: {kind}")
+    columns = _EXPORT_COLUMNS[kind]
+    order = "model_number" if kind == "modules" else "name"
+    with _reading() as cur:
+        cur.execute(f"SELECT {', '.join(columns)} FROM {kind} ORDER BY {order}")
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+def _export_csv(kind, out, chunk_size):
+    writer = csv.writer(out)
+    writer.writerow(_EXPORT_COLUMNS[kind])
+    count = 0
+    for rows in iter_catalog_chunks(kind, chunk_size):
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+def _export_parquet(kind, out, chunk_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    columns = _EXPORT_COLUMNS[kind]
+    schema = pa.schema([(c, _PARQUET_TYPES.get(c, "float64")) for c in columns])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for rows in iter_catalog_chunks(kind, chunk_size):
+            arrays = [pa.array(col, type=schema.field(c).type) for c, col in zip(columns, zip(*rows))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+def export_catalog(kind, dest, fmt=None, chunk_size=_EXPORT_CHUNK):
+    """Stream the ``modules`` or ``pcs`` table to CSV or Parquet.
+
+    ``dest`` is a path or a file object (binary for Parquet). Returns the
+    number of rows written.
+    """
+    fmt = fmt or ("parquet" if str(getattr(dest, "name", dest)).endswith(".parquet") else "csv")
+    if fmt == "parquet":
+        return _export_parquet(kind, dest, chunk_size)
+    if fmt != "csv":
+        raise ValueError(f"unknown export format: {fmt}")
+    if not hasattr(dest, "write"):
+        with open(dest, "w", encoding="utf-8", newline="") as out:
+            return _export_csv(kind, out, chunk_size)
+    if isinstance(dest, io.TextIOBase):
+        return _export_csv(kind, dest, chunk_size)
+    out = io.TextIOWrapper(dest, encoding="utf-8", newline="")
+    try:
+        return _export_csv(kind, out, chunk_size)
+    finally:
+        out.flush()
+        out.detach()
+
+# --- Paginated catalog pages ---
+# The catalog tables in app.py only load the visible page: filtering,
+# ORDER BY (on indexed columns, with the primary key as tie-breaker) and
+# LIMIT/OFFSET are done in SQLite.
+_PAGES = {
+    "modules": {
+        "columns": _MODULE_COLUMNS, "key": "model_number", "voltage": "voc_stc",
+        "sortable": ("model_number", "manufacturer", "pmax_stc", "voc_stc", "vmpp_noc", "isc_noc"),
+    },
+    "pcs": {
+        "columns": _EXPORT_COLUMNS["pcs"], "key": "name", "voltage": "max_voltage",
+        "sortable": ("name", "model_number", "max_voltage", "mppt_min_voltage", "mppt_count"),
+    },
+}
+
+def sortable_columns(kind):
+    """Columns load_modules_page / load_pcs_page accept as ``sort`` (the first is the default)."""
+    return list(_PAGES[kind]["sortable"])
+
+def _init_page_indexes(cur):
+    for spec_kind, spec in _PAGES.items():
+        for col in spec["sortable"]:
+            if col != spec["key"]:
+                cur.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{spec_kind}_{col} ON {spec_kind}({col}, {spec['key']})"
+                )
+
+def _load_page(kind, page, page_size, sort, descending, voltage_min, voltage_max, manufacturer=None):
+    spec = _PAGES[kind]
+    if sort not in spec["sortable"]:
+        raise ValueError(f"cannot sort {kind} by {sort!r}")
+    where, params = [], []
+    if manufacturer:
+        where.append("manufacturer = ?")
+        params.append(manufacturer)
+    if voltage_min is not None:
+        where.append(f"{spec['voltage']} >= ?")
+        params.append(voltage_min)
+    if voltage_max is not None:
+        where.append(f"{spec['voltage']} <= ?")
+        params.append(voltage_max)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    direction = "DESC" if descending else "ASC"
+    with _reading() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM {kind} {where_sql}", params)
+        total = cur.fetchone()[0]
+        cur.execute(
+            f"SELECT {', '.join(spec['columns'])} FROM {kind} {where_sql} "
+            f"ORDER BY {sort} {direction}, {spec['key']} {direction} LIMIT ? OFFSET ?",
+            params + [page_size, max(page, 0) * page_size],
+        )
+        rows = [dict(zip(spec["columns"], row)) for row in cur.fetchall()]
+    return rows, total
+
+def load_modules_page(page=0, page_size=20, sort="model_number", descending=False,
+                      manufacturer=None, voltage_min=None, voltage_max=None):
+    """Return (rows, total) for one page of modules; voltage filters apply to voc_stc."""
+    return _load_page("modules", page, page_size, sort, descending, voltage_min, voltage_max, manufacturer)
+
+def load_pcs_page(page=0, page_size=20, sort="name", descending=False,
+                  voltage_min=None, voltage_max=None):
+    """Return (rows, total) for one page of PCS units; voltage filters apply to max_voltage."""
+    return _load_page("pcs", page, page_size, sort, descending, voltage_min, voltage_max)
+
+def list_manufacturers():
+    with _reading() as cur:
+        cur.execute("SELECT DISTINCT manufacturer FROM modules ORDER BY manufacturer")
+        return [r[0] for r in cur.fetchall()]
+
+# --- Compatibility matrix ---
+# One row per module × PCS × t_min option (engine.T_MIN_OPTIONS) with the
+# series bounds, parallel strings per MPPT and maximum array power. Writers
+# call _refresh_compat() inside their transaction for just the modules or
+# PCS units they touched, so the table never needs a full recompute.
+_COMPAT_CHUNK = 2000   # modules evaluated per vectorized pass
+_COMPAT_INSERT = """
+  INSERT INTO compat
+  (model_number, pcs_name, t_min, min_series, max_series, circuits, feasible, max_power_w)
+  VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _fetch_specs(cur, kind, keys=None):
+    # SELECT * so migrations can call this before later columns exist
+    key = "model_number" if kind == "modules" else "name"
+    sql = f"SELECT * FROM {kind}"
+
+    def rows():
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    if keys is None:
+        cur.execute(sql)
+        return rows()
+    specs = []
+    keys = list(keys)
+    for i in range(0, len(keys), 500):
+        part = keys[i:i + 500]
+        cur.execute(f"{sql} WHERE {key} IN ({', '.join('?' * len(part))})", part)
+        specs += rows()
+    return specs
+
+def _compat_rows(modules, pcs_units):
+    t_mins = engine.T_MIN_OPTIONS
+    out = engine.compatibility_batch(modules, pcs_units, t_mins)
+    min_s, max_s = out["min_series"].tolist(), out["max_series"].tolist()
+    circuits, feasible, power = out["circuits"].tolist(), out["feasible"].tolist(), out["max_power_w"].tolist()
+    for i, m in enumerate(modules):
+        for j, p in enumerate(pcs_units):
+            for k, t in enumerate(t_mins):
+                yield (m["model_number"], p["name"], t, min_s[i][j][k], max_s[i][j][k],
+                       circuits[i][j], int(feasible[i][j][k]), power[i][j][k])
+
+def _delete_keys(cur, column, keys):
+    keys = list(keys)
+    for i in range(0, len(keys), 500):
+        part = keys[i:i + 500]
+        cur.execute(f"DELETE FROM compat WHERE {column} IN ({', '.join('?' * len(part))})", part)
+
+def _refresh_compat(cur, model_numbers=(), pcs_names=()):
+    """Recompute the compat rows of the given modules and/or PCS units."""
+    if model_numbers:
+        keys = set(model_numbers)
+        _delete_keys(cur, "model_number", keys)
+        modules = _fetch_specs(cur, "modules", keys)
+        pcs_units = _fetch_specs(cur, "pcs")
+        if modules and pcs_units:
+            cur.executemany(_COMPAT_INSERT, _compat_rows(modules, pcs_units))
+    if pcs_names:
+        keys = set(pcs_names)
+        _delete_keys(cur, "pcs_name", keys)
+        pcs_units = _fetch_specs(cur, "pcs", keys)
+        if pcs_units:
+            modules = _fetch_specs(cur, "modules")
+            for i in range(0, len(modules), _COMPAT_CHUNK):
+                cur.executemany(_COMPAT_INSERT, _compat_rows(modules[i:i + _COMPAT_CHUNK], pcs_units))
+
+def _refresh_derived(cur, model_numbers=(), pcs_names=()):
+    """Catalog writers: refresh everything computed from the given rows."""
+    _refresh_compat(cur, model_numbers, pcs_names)
+    _revalidate_units(cur, model_numbers, pcs_names)
+
+def compatible_modules(pcs_name, t_min, limit=None):
+    """Return feasible modules for a PCS at ``t_min``, highest max power first.
+
+    Each row has model_number, manufacturer, min_series, max_series,
+    circuits (strings per MPPT) and max_power_w.
+    """
+    sql = """
+      SELECT c.model_number, m.manufacturer, c.min_series, c.max_series, c.circuits, c.max_power_w
+      FROM compat c JOIN modules m ON m.model_number = c.model_number
+      WHERE c.pcs_name = ? AND c.t_min = ? AND c.feasible = 1
+      ORDER BY c.max_power_w DESC, c.model_number
+    """
+    params = [pcs_name, t_min]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    columns = ("model_number", "manufacturer", "min_series", "max_series", "circuits", "max_power_w")
+    with _reading() as cur:
+        cur.execute(sql, params)
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+# --- Plant projects ---
+# A project holds many PCS units (of possibly different models), each with
+# its own string layout. Every project_units row stores its own validation
+# summary, and triggers keep the per-project totals up to date by adding and
+# subtracting row deltas, so changing one unit only re-validates that unit.
+# Catalog writers re-validate the units that use the rows they touched.
+_PROJECT_SUMS = ("pcs_count", "total_modules", "dc_w", "ac_kw", "ac_missing", "invalid_units")
+
+def _init_projects(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS projects(
+      name TEXT PRIMARY KEY,
+      t_min INTEGER NOT NULL,
+      pcs_count INTEGER NOT NULL DEFAULT 0,
+      total_modules INTEGER NOT NULL DEFAULT 0,
+      dc_w REAL NOT NULL DEFAULT 0,
+      ac_kw REAL NOT NULL DEFAULT 0,
+      ac_missing INTEGER NOT NULL DEFAULT 0,
+      invalid_units INTEGER NOT NULL DEFAULT 0
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS project_units(
+      project TEXT NOT NULL,
+      unit_no INTEGER NOT NULL,
+      pcs_name TEXT NOT NULL,
+      model_number TEXT NOT NULL,
+      series TEXT NOT NULL,
+      total_modules INTEGER NOT NULL DEFAULT 0,
+      dc_w REAL NOT NULL DEFAULT 0,
+      ac_kw REAL,
+      valid INTEGER NOT NULL DEFAULT 0,
+      errors TEXT NOT NULL DEFAULT '[]',
+      PRIMARY KEY (project, unit_no)
+    )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_project_units_pcs ON project_units(pcs_name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_project_units_module ON project_units(model_number)")
+    add = ", ".join(f"{c} = {c} + {d}" for c, d in zip(_PROJECT_SUMS, (
+        "1", "new.total_modules", "new.dc_w", "COALESCE(new.ac_kw, 0)", "(new.ac_kw IS NULL)", "(new.valid = 0)")))
+    sub = ", ".join(f"{c} = {c} - {d}" for c, d in zip(_PROJECT_SUMS, (
+        "1", "old.total_modules", "old.dc_w", "COALESCE(old.ac_kw, 0)", "(old.ac_kw IS NULL)", "(old.valid = 0)")))
+    cur.execute(f"""
+      CREATE TRIGGER IF NOT EXISTS project_units_ai AFTER INSERT ON project_units BEGIN
+        UPDATE projects SET {add} WHERE name = new.project;
+      END""")
+    cur.execute(f"""
+      CREATE TRIGGER IF NOT EXISTS project_units_ad AFTER DELETE ON project_units BEGIN
+        UPDATE projects SET {sub} WHERE name = old.project;
+      END""")
+    cur.execute(f"""
+      CREATE TRIGGER IF NOT EXISTS project_units_au AFTER UPDATE ON project_units BEGIN
+        UPDATE projects SET {sub} WHERE name = old.project;
+        UPDATE projects SET {add} WHERE name = new.project;
+      END""")
+
+def _unit_summaries(cur, t_min, units):
+    """Validate (pcs_name, model_number, series) units in one batched pass.
+
+    Returns one (total_modules, dc_w, ac_kw, valid, errors JSON) tuple per
+    unit. Units whose PCS or module is not in the catalog get a "missing"
+    error.
+    """
+    pcs_specs = {p["name"]: p for p in _fetch_specs(cur, "pcs", {u[0] for u in units})}
+    mod_specs = {m["model_number"]: m for m in _fetch_specs(cur, "modules", {u[1] for u in units})}
+    found = [k for k, u in enumerate(units) if u[0] in pcs_specs and u[1] in mod_specs]
+    summaries = [(0, 0.0, pcs_specs.get(u[0], {}).get("ac_rating_kw"), 0, '[[null, null, "missing"]]')
+                 for u in units]
+    if not found:
+        return summaries
+    pcs_units = [pcs_specs[units[k][0]] for k in found]
+    modules   = [mod_specs[units[k][1]] for k in found]
+    out = engine.validate_layouts_batch(pcs_units, modules, [units[k][2] for k in found], t_min)
+
+    errors = engine.layout_errors(out)
+    for u, k in enumerate(found):
+        total = int(out["total"][u])
+        summaries[k] = (total, total * modules[u]["pmax_stc"], pcs_units[u]["ac_rating_kw"],
+                        int(out["valid"][u]), json.dumps(errors[u]))
+    return summaries
+
+def _revalidate_units(cur, model_numbers=(), pcs_names=(), project=None):
+    """Re-validate the project units that use the given catalog rows (or all units of ``project``)."""
+    # Keys in groups of 500 (older SQLite builds allow 999 parameters)
+    groups = []
+    for column, keys in (("u.model_number", model_numbers), ("u.pcs_name", pcs_names)):
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            groups.append((f"{column} IN ({', '.join('?' * len(part))})", part))
+    if project is not None:
+        groups.append(("u.project = ?", [project]))
+    units = {}
+    for where, params in groups:
+        cur.execute(f"""
+          SELECT u.project, u.unit_no, u.pcs_name, u.model_number, u.series, p.t_min
+          FROM project_units u JOIN projects p ON p.name = u.project
+          WHERE {where}
+        """, params)
+        # A unit matched by both its module and its PCS is validated once
+        for row in cur.fetchall():
+            units[row[0], row[1]] = row
+    by_t_min = {}
+    for row in units.values():
+        by_t_min.setdefault(row[5], []).append(row)
+    for t_min, rows in by_t_min.items():
+        summaries = _unit_summaries(cur, t_min, [(r[2], r[3], json.loads(r[4])) for r in rows])
+        cur.executemany("""
+          UPDATE project_units SET total_modules=?, dc_w=?, ac_kw=?, valid=?, errors=?
+          WHERE project=? AND unit_no=?
+        """, [s + (r[0], r[1]) for s, r in zip(summaries, rows)])
+
+def save_project(name, t_min):
+    """Create a project, or change its site minimum temperature (re-validating its units)."""
+    def job(cur):
+        cur.execute("""
+          INSERT INTO projects (name, t_min) VALUES (?, ?)
+          ON CONFLICT(name) DO UPDATE SET t_min=excluded.t_min
+        """, (name, t_min))
+        _revalidate_units(cur, project=name)
+    _submit(job)
+
+def delete_project(name):
+    def job(cur):
+        cur.execute("DELETE FROM project_units WHERE project=?", (name,))
+        cur.execute("DELETE FROM projects WHERE name=?", (name,))
+    _submit(job)
+
+def list_projects():
+    with _reading() as cur:
+        cur.execute("SELECT name FROM projects ORDER BY name")
+        return [r[0] for r in cur.fetchall()]
+
+def save_project_units(project, units):
+    """Add or replace PCS units of a project, validating them in one batched pass.
+
+    ``units`` is a list of dicts with pcs_name, model_number, series (the
+    MPPT × circuit grid) and optionally unit_no; units without a unit_no are
+    appended. Returns the unit numbers.
+    """
+    def job(cur):
+        row = cur.execute("SELECT t_min FROM projects WHERE name=?", (project,)).fetchone()
+        if row is None:
+            raise ValueError(f"unknown project: {project}")
+        next_no = cur.execute(
+            "SELECT COALESCE(MAX(unit_no), 0) + 1 FROM project_units WHERE project=?", (project,)
+        ).fetchone()[0]
+        unit_nos = []
+        for u in units:
+            if u.get("unit_no") is None:
+                unit_nos.append(next_no)
+                next_no += 1
+            else:
+                unit_nos.append(int(u["unit_no"]))
+        keys = [(u["pcs_name"], u["model_number"], [list(r) for r in u["series"]]) for u in units]
+        summaries = _unit_summaries(cur, row[0], keys)
+        cur.executemany("""
+          INSERT INTO project_units
+          (project, unit_no, pcs_name, model_number, series, total_modules, dc_w, ac_kw, valid, errors)
+          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+          ON CONFLICT(project, unit_no) DO UPDATE SET
+            pcs_name=excluded.pcs_name, model_number=excluded.model_number, series=excluded.series,
+            total_modules=excluded.total_modules, dc_w=excluded.dc_w, ac_kw=excluded.ac_kw,
+            valid=excluded.valid, errors=excluded.errors
+        """, [(project, no, k[0], k[1], json.dumps(k[2])) + s for no, k, s in zip(unit_nos, keys, summaries)])
+        return unit_nos
+    return _submit(job)
+
+def delete_project_unit(project, unit_no):
+    def job(cur):
+        cur.execute("DELETE FROM project_units WHERE project=? AND unit_no=?", (project, unit_no))
+    _submit(job)
+
+def project_totals(name):
+    """Return the aggregated totals of a project, or None if it does not exist.
+
+    Keys: t_min, pcs_count, total_modules, dc_kw, ac_kw, dc_ac_ratio (None
+    unless every unit's PCS has an AC rating), ac_missing, invalid_units.
+    """
+    with _reading() as cur:
+        row = cur.execute(
+            f"SELECT t_min, {', '.join(_PROJECT_SUMS)} FROM projects WHERE name=?", (name,)
+        ).fetchone()
+    if row is None:
+        return None
+    totals = dict(zip(("t_min",) + _PROJECT_SUMS, row))
+    totals["dc_kw"] = round(totals.pop("dc_w") / 1000, 6)
+    totals["ac_kw"] = round(totals["ac_kw"], 6)
+    totals["dc_ac_ratio"] = (
+        totals["dc_kw"] / totals["ac_kw"] if totals["ac_kw"] > 0 and totals["ac_missing"] == 0 else None
+    )
+    return totals
+
+def load_project(name):
+    """Return a project's totals plus its units (each with its decoded layout and errors)."""
+    totals = project_totals(name)
+    if totals is None:
+        return None
+    with _reading() as cur:
+        cur.execute("""
+          SELECT unit_no, pcs_name, model_number, series, total_modules, dc_w, ac_kw, valid, errors
+          FROM project_units WHERE project=? ORDER BY unit_no
+        """, (name,))
+        units = [{
+            "unit_no": r[0], "pcs_name": r[1], "model_number": r[2], "series": json.loads(r[3]),
+            "total_modules": r[4], "dc_kw": r[5] / 1000, "ac_kw": r[6], "valid": bool(r[7]),
+            "errors": [tuple(e) for e in json.loads(r[8])],
+        } for r in cur.fetchall()]
+    return dict(totals, name=name, units=units)
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="db.py", description="Module / PCS catalog tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_imp = sub.add_parser("import", help="bulk-load a CSV / JSON file into the catalog")
+    p_imp.add_argument("kind", choices=sorted(_IMPORT_KINDS))
+    p_imp.add_argument("path")
+    p_imp.add_argument("--format", choices=("csv", "json"), default=None)
+
+    p_exp = sub.add_parser("export", help="stream a catalog table to CSV / Parquet")
+    p_exp.add_argument("kind", choices=sorted(_EXPORT_COLUMNS))
+    p_exp.add_argument("path")
+    p_exp.add_argument("--format", choices=("csv", "parquet"), default=None)
+
+    args = parser.parse_args(argv)
+    init_db()
+    if args.command == "import":
+        try:
+            report = import_catalog(args.path, args.kind, fmt=args.format)
+        except (OSError, ValueError) as exc:
+            print(f"import failed: {exc}", file=sys.stderr)
+            return 1
+        for line, msg in report["errors"]:
+            print(f"line {line}: {msg}", file=sys.stderr)
+        print(f"imported {report['rows']} {args.kind} rows in {report['seconds']:.2f}s "
+              f"({report['rows_per_sec']:.0f} rows/s), {len(report['errors'])} errors")
+        return 1 if report["errors"] else 0
+    if args.command == "export":
+        start = time.perf_counter()
+        count = export_catalog(args.kind, args.path, fmt=args.format)
+        print(f"exported {count} {args.kind} rows to {args.path} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
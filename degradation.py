@@ -0,0 +1,81 @@
+# degradation.py
+# Lifetime projection of a string layout as the modules age (caution note
+# 注3: the ➂ bounds are for new modules).
+#
+# Each module has an annual degradation rate (modules.degradation_rate,
+# %/year; DEGRADATION_RATE when the datasheet value is not registered).
+# Degradation is linear, as in the usual datasheet warranty, and applied to
+# both Pmax and Vmpp, which is the conservative case for the MPPT minimum
+# voltage: a string that still tracks with the full power loss on its
+# voltage keeps tracking in practice. The check is the hot-day string Vmpp
+# (t_max) of the shortest string against the PCS mppt_min_voltage; Voc only
+# falls with age, so the cold-day maximum voltage check stays as it is.
+import numpy as np
+
+import engine
+
+DEGRADATION_RATE = 0.5    # %/year
+LIFETIME_YEARS   = 25
+
+def degradation_rate(module):
+    """The module's annual degradation rate in %/year."""
+    rate = module.get("degradation_rate")
+    return DEGRADATION_RATE if rate is None else rate
+
+def degradation_factors(rates, years=LIFETIME_YEARS):
+    """Remaining fraction for years 0..years: shape (..., years + 1) for an array of rates."""
+    rates = np.asarray(rates, dtype=float)[..., None]
+    return np.clip(1 - rates / 100 * np.arange(years + 1), 0.0, None)
+
+def project_layout(pcs, module, series, t_max=engine.T_MAX, years=LIFETIME_YEARS):
+    """Year-by-year Pmax and shortest-string Vmpp of one string layout.
+
+    Returns a dict of per-year lists (``years``, ``pmax_w``: whole layout,
+    ``vmpp_string``: shortest string on the hot day, ``below_mppt_min``)
+    and ``first_year_below``, the first year the shortest string drops
+    below mppt_min_voltage (None if it never does within ``years``).
+    """
+    strings = [s for row in series for s in row if s > 0]
+    factors = degradation_factors(degradation_rate(module), years)
+    _, vmpp_hot = engine.corrected_voltages(module, engine.STC_TEMP, t_max)
+    vmpp_string = min(strings, default=0) * vmpp_hot * factors
+    below = vmpp_string < pcs["mppt_min_voltage"]
+    return {
+        "years": list(range(years + 1)),
+        "pmax_w": (sum(strings) * module["pmax_stc"] * factors).tolist(),
+        "vmpp_string": vmpp_string.tolist(),
+        "below_mppt_min": below.tolist(),
+        "first_year_below": int(below.argmax()) if strings and below.any() else None,
+    }
+
+def catalog_sweep(pcs, modules, series=None, t_max=engine.T_MAX, years=LIFETIME_YEARS):
+    """Lifetime check of every module in one vectorized (modules × years) pass.
+
+    ``series`` is the shortest string length to check: one count for all
+    modules, one per module, or None for each module's own min_series
+    when new. Returns arrays (one element per module, in catalog order):
+    ``series``, ``first_year_below`` (-1: never within ``years``),
+    ``lifetime_min_series`` (the shortest string still above
+    mppt_min_voltage in the last year) and ``pmax_end_ratio``.
+    """
+    modules = list(modules.values()) if isinstance(modules, dict) else list(modules)
+    # Hot-day Vmpp and min_series when new; t_min does not enter either
+    new = engine.series_bounds_batch(modules, [pcs], [engine.STC_TEMP], t_max)
+    vmpp = new["vmpp"][:, 0]
+    factors = degradation_factors([degradation_rate(m) for m in modules], years)   # (M, Y+1)
+    v_min = pcs["mppt_min_voltage"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if series is None:
+            series = new["min_series"][:, 0, 0]
+        series = np.broadcast_to(np.asarray(series, dtype=float), vmpp.shape)
+        below = series[:, None] * vmpp[:, None] * factors < v_min
+        v_end = vmpp * factors[:, -1]
+        lifetime_min = np.where(v_end > 0, np.ceil(v_min / v_end), 0)
+
+    return {
+        "series": series.astype(np.int64),
+        "first_year_below": np.where(below.any(axis=1), below.argmax(axis=1), -1),
+        "lifetime_min_series": lifetime_min.astype(np.int64),
+        "pmax_end_ratio": factors[:, -1],
+    }
@@ -0,0 +1,296 @@
+# engine.py
+# Series-count calculation for PV strings, independent of Streamlit so it can
+# be used from app.py, batch jobs and tests.
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+STC_TEMP = 25   # ℃, reference temperature of the datasheet values
+T_MAX    = 50   # ℃, fixed maximum module temperature used for Vmpp
+
+T_MIN_OPTIONS     = (0, -5, -10, -15, -20, -25, -30)   # ℃, site minimum temperature choices
+CIRCUITS_PER_MPPT = 3   # default when a PCS spec has no circuits_per_mppt
+
+def circuits_per_mppt(pcs):
+    """Number of string circuits per MPPT input of a PCS spec."""
+    return int(pcs.get("circuits_per_mppt") or CIRCUITS_PER_MPPT)
+
+def corrected_voltages(module, t_min, t_max=T_MAX):
+    """Return (Voc at t_min, Vmpp at t_max) for a module spec dict."""
+    tc = module["temp_coeff"] / 100
+    voc_a  = module["voc_stc"]  * (1 + tc * (t_min - STC_TEMP))
+    vmpp_a = module["vmpp_noc"] * (1 + tc * (t_max - STC_TEMP))
+    return voc_a, vmpp_a
+
+def series_bounds(pcs, module, t_min, t_max=T_MAX):
+    """Return (min_s, max_s): the allowed number of modules per string.
+
+    max_s keeps the cold-weather Voc under the PCS maximum voltage; min_s
+    keeps the hot-weather Vmpp above the MPPT minimum voltage.
+    """
+    voc_a, vmpp_a = corrected_voltages(module, t_min, t_max)
+    max_s = math.floor(pcs["max_voltage"]      / voc_a)  if voc_a  > 0 else 0
+    min_s = math.ceil (pcs["mppt_min_voltage"] / vmpp_a) if vmpp_a > 0 else 0
+    return min_s, max_s
+
+def _specs(items):
+    # Accept a {key: spec} catalog dict (as returned by db.load_*) or a sequence of specs
+    return list(items.values()) if isinstance(items, dict) else list(items)
+
+def _column(specs, field):
+    return np.array([s[field] for s in specs], dtype=float)
+
+def _circuits_column(pcs_units):
+    return np.array([circuits_per_mppt(p) for p in pcs_units], dtype=np.int64)
+
+def series_bounds_batch(modules, pcs_units, t_mins, t_max=T_MAX):
+    """Vectorized series_bounds() over modules × PCS units × minimum temperatures.
+
+    ``modules`` and ``pcs_units`` are sequences of spec dicts (or catalog
+    dicts); ``t_mins`` is a sequence of temperatures. Returns a dict of
+    arrays: ``voc`` and ``vmpp`` with shape (M, T), ``min_series`` and
+    ``max_series`` with shape (M, P, T). Results match series_bounds()
+    element for element.
+    """
+    modules, pcs_units = _specs(modules), _specs(pcs_units)
+    t_mins = np.asarray(t_mins, dtype=float)
+
+    tc   = _column(modules, "temp_coeff")[:, None] / 100
+    voc  = _column(modules, "voc_stc")[:, None]  * (1 + tc * (t_mins[None, :] - STC_TEMP))
+    vmpp = _column(modules, "vmpp_noc")[:, None] * (1 + tc * (t_max - STC_TEMP))
+    vmpp = np.broadcast_to(vmpp, voc.shape)
+
+    v_max    = _column(pcs_units, "max_voltage")[None, :, None]
+    v_mp_min = _column(pcs_units, "mppt_min_voltage")[None, :, None]
+    voc3, vmpp3 = voc[:, None, :], vmpp[:, None, :]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_s = np.where(voc3  > 0, np.floor(v_max    / voc3),  0)
+        min_s = np.where(vmpp3 > 0, np.ceil (v_mp_min / vmpp3), 0)
+
+    return {
+        "voc": voc,
+        "vmpp": np.array(vmpp),
+        "min_series": min_s.astype(np.int64),
+        "max_series": max_s.astype(np.int64),
+    }
+
+def compatibility_batch(modules, pcs_units, t_mins, t_max=T_MAX):
+    """Module × PCS × t_min compatibility summary in one vectorized pass.
+
+    Extends series_bounds_batch() with ``circuits`` (M, P): how many
+    parallel strings one MPPT input can take under its current limit (the
+    app's ``used * isc_noc <= mppt_max_current`` rule, at most the PCS's
+    circuits_per_mppt), ``feasible`` (M, P, T) and ``max_power_w``
+    (M, P, T): every MPPT fully used with max_series-module strings.
+    """
+    modules, pcs_units = _specs(modules), _specs(pcs_units)
+    out = series_bounds_batch(modules, pcs_units, t_mins, t_max)
+
+    isc   = _column(modules, "isc_noc")[:, None]
+    i_max = _column(pcs_units, "mppt_max_current")[None, :]
+    c_max = _circuits_column(pcs_units)[None, :]
+    circuits = np.zeros((len(modules), len(pcs_units)), dtype=np.int64)
+    for n in range(1, int(c_max.max(initial=0)) + 1):
+        circuits += (n * isc <= i_max) & (n <= c_max)
+    min_s, max_s = out["min_series"], out["max_series"]
+    feasible = (max_s >= np.maximum(min_s, 1)) & (circuits[:, :, None] >= 1)
+
+    mppt_n = _column(pcs_units, "mppt_count")[None, :, None]
+    pmax   = _column(modules, "pmax_stc")[:, None, None]
+    out["circuits"]    = circuits
+    out["feasible"]    = feasible
+    out["max_power_w"] = np.where(feasible, mppt_n * circuits[:, :, None] * max_s * pmax, 0.0)
+    return out
+
+def compatibility_table(modules, pcs_units, t_mins, t_max=T_MAX):
+    """compatibility_batch() flattened to one row per (module, PCS, t_min).
+
+    ``modules`` and ``pcs_units`` are {key: spec} dicts. Returns a dict of
+    equal-length columns (module-major order): ``model_number``,
+    ``pcs_name``, ``t_min``, ``min_series``, ``max_series``, ``circuits``,
+    ``feasible`` and ``max_power_w``.
+    """
+    out = compatibility_batch(modules, pcs_units, t_mins, t_max)
+    m_idx, p_idx, t_idx = np.indices(out["feasible"].shape).reshape(3, -1)
+    return {
+        "model_number": np.array(list(modules), dtype=object)[m_idx],
+        "pcs_name": np.array(list(pcs_units), dtype=object)[p_idx],
+        "t_min": np.asarray(t_mins, dtype=float)[t_idx],
+        "min_series": out["min_series"].ravel(),
+        "max_series": out["max_series"].ravel(),
+        "circuits": out["circuits"][m_idx, p_idx],
+        "feasible": out["feasible"].ravel(),
+        "max_power_w": out["max_power_w"].ravel(),
+    }
+
+def validate_layouts_batch(pcs_units, modules, layouts, t_min, t_max=T_MAX):
+    """Check many string layouts at once; unit u is (pcs_units[u], modules[u], layouts[u]).
+
+    Layouts are padded with 0 (unused) to a common MPPT × circuit shape.
+    Returns a dict with boolean arrays ``range`` and ``mismatch`` (U × N × C),
+    ``current`` (U × N), ``mppt_count`` and ``circuits`` (U: strings on MPPT
+    inputs / circuits beyond the PCS's mppt_count / circuits_per_mppt),
+    ``valid`` (U), integer ``total`` module counts (U) and
+    ``min_series``/``max_series`` (U). The rules are those of the
+    circuit-config section, as in validate_layout().
+    """
+    pcs_units, modules = _specs(pcs_units), _specs(modules)
+    rows  = [[list(row) for row in layout] for layout in layouts]
+    n_max = max((len(layout) for layout in rows), default=0)
+    c_max = max((len(row) for layout in rows for row in layout), default=0)
+    grid  = np.zeros((len(rows), n_max, c_max), dtype=np.int64)
+    for u, layout in enumerate(rows):
+        for i, row in enumerate(layout):
+            grid[u, i, :len(row)] = row
+
+    # Same arithmetic as series_bounds(), one element per unit
+    tc   = _column(modules, "temp_coeff") / 100
+    voc  = _column(modules, "voc_stc")  * (1 + tc * (t_min - STC_TEMP))
+    vmpp = _column(modules, "vmpp_noc") * (1 + tc * (t_max - STC_TEMP))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_s = np.where(voc  > 0, np.floor(_column(pcs_units, "max_voltage")      / voc),  0).astype(np.int64)
+        min_s = np.where(vmpp > 0, np.ceil (_column(pcs_units, "mppt_min_voltage") / vmpp), 0).astype(np.int64)
+
+    used = grid > 0
+    # Reference: the first used circuit of each MPPT input
+    ref = np.take_along_axis(grid, used.argmax(axis=2)[:, :, None], axis=2) if c_max else grid
+    out_of_range = used & ((grid < min_s[:, None, None]) | (grid > max_s[:, None, None]))
+    mismatch     = used & (grid != ref)
+    current      = used.sum(axis=2) * _column(modules, "isc_noc")[:, None] > \
+                   _column(pcs_units, "mppt_max_current")[:, None]
+    # Strings on inputs / circuits the PCS does not have
+    n_pcs = _column(pcs_units, "mppt_count").astype(np.int64)
+    extra_mppt = used & (np.arange(n_max)[None, :, None] >= n_pcs[:, None, None])
+    extra_circ = used & (np.arange(c_max)[None, None, :] >= _circuits_column(pcs_units)[:, None, None])
+    no_mppt, no_circ = extra_mppt.any(axis=(1, 2)), (extra_circ & ~extra_mppt).any(axis=(1, 2))
+    total = np.where(used, grid, 0).sum(axis=(1, 2))
+    return {
+        "range": out_of_range,
+        "mismatch": mismatch,
+        "current": current,
+        "mppt_count": no_mppt,
+        "circuits": no_circ,
+        "total": total,
+        "valid": ~(out_of_range.any(axis=(1, 2)) | mismatch.any(axis=(1, 2)) | current.any(axis=1)
+                   | no_mppt | no_circ) & (total > 0),
+        "min_series": min_s,
+        "max_series": max_s,
+    }
+
+def validate_grid(pcs, module, series, t_min, t_max=T_MAX):
+    """Check one string layout in a vectorized pass and return per-cell results.
+
+    ``series[i][j]`` is the number of modules in series on circuit j of MPPT
+    input i (0 = unused); shorter rows are padded with 0. Returns a dict
+    with boolean arrays ``range`` and ``mismatch`` (shape N × C), ``current``
+    (shape N), the ``total`` module count and ``empty`` (no modules at all).
+    """
+    out = validate_layouts_batch([pcs], [module], [series], t_min, t_max)
+    total = int(out["total"][0])
+    return {
+        "range": out["range"][0],
+        "mismatch": out["mismatch"][0],
+        "current": out["current"][0],
+        "total": total,
+        "empty": total == 0,
+    }
+
+def layout_errors(out):
+    """Per-unit (i, j, code) error lists from validate_layouts_batch() output.
+
+    Same codes and order as validate_layout(): by MPPT input, the cells'
+    "range"/"mismatch" errors before the input's "current" error, then the
+    unit-level "mppt_count" / "circuits" errors, and "empty" when a unit
+    has no other error and no modules.
+    """
+    errors = [[] for _ in range(len(out["total"]))]
+    cells = [(int(u), int(i), int(j), code)
+             for code in ("range", "mismatch")
+             for u, i, j in zip(*np.nonzero(out[code]))]
+    cells += [(int(u), int(i), None, "current") for u, i in zip(*np.nonzero(out["current"]))]
+    order = {"range": 0, "mismatch": 1}
+    cells.sort(key=lambda e: (e[0], e[1], e[2] is None, e[2] or 0, order.get(e[3], 2)))
+    for u, i, j, code in cells:
+        errors[u].append((i, j, code))
+    for code in ("mppt_count", "circuits"):
+        for u in np.nonzero(out[code])[0]:
+            errors[int(u)].append((None, None, code))
+    for u, errs in enumerate(errors):
+        if not errs and out["total"][u] == 0:
+            errs.append((None, None, "empty"))
+    return errors
+
+def validate_layout(pcs, module, series, t_min, t_max=T_MAX):
+    """Check a string layout with the rules of the circuit-config section.
+
+    ``series[i][j]`` is the number of modules in series on circuit j of MPPT
+    input i (0 = unused). Returns a list of (i, j, code) errors, where code
+    is "range" (outside min_s..max_s), "mismatch" (differs from the first
+    used circuit of the MPPT), "current" (j is None: used circuits × Isc
+    exceed the MPPT current limit), "mppt_count" / "circuits" (i and j are
+    None: strings on MPPT inputs or circuits the PCS does not have) or
+    "empty" (i and j are None: no modules at all). An empty list means the
+    layout is valid.
+    """
+    return layout_errors(validate_layouts_batch([pcs], [module], [series], t_min, t_max))[0]
+
+# --- Calculation cache ---
+# Bounded LRU shared by every session in the process. Keys hold only the
+# spec fields the calculation reads plus the temperatures (and the layout),
+# so equal specs share entries. db clears the cache whenever a catalog row
+# is written.
+CALC_CACHE_SIZE = 4096
+
+_MODULE_FIELDS = ("voc_stc", "vmpp_noc", "isc_noc", "temp_coeff")
+_PCS_FIELDS    = ("max_voltage", "mppt_min_voltage", "mppt_max_current")
+
+_calc_cache = OrderedDict()
+_calc_lock  = threading.Lock()
+_calc_stats = {"hits": 0, "misses": 0, "evictions": 0, "clears": 0}
+
+def _spec_key(spec, fields):
+    return tuple(spec[f] for f in fields)
+
+def _memo(key, compute):
+    with _calc_lock:
+        if key in _calc_cache:
+            _calc_cache.move_to_end(key)
+            _calc_stats["hits"] += 1
+            return _calc_cache[key]
+        _calc_stats["misses"] += 1
+    value = compute()
+    with _calc_lock:
+        _calc_cache[key] = value
+        _calc_cache.move_to_end(key)
+        while len(_calc_cache) > CALC_CACHE_SIZE:
+            _calc_cache.popitem(last=False)
+            _calc_stats["evictions"] += 1
+    return value
+
+def cached_series_bounds(pcs, module, t_min, t_max=T_MAX):
+    """series_bounds() through the calculation cache."""
+    key = ("bounds", _spec_key(pcs, _PCS_FIELDS), _spec_key(module, _MODULE_FIELDS), t_min, t_max)
+    return _memo(key, lambda: series_bounds(pcs, module, t_min, t_max))
+
+def cached_validate_layout(pcs, module, series, t_min, t_max=T_MAX):
+    """validate_layout() through the calculation cache; returns a tuple of errors."""
+    series = tuple(tuple(row) for row in series)
+    key = ("layout", _spec_key(pcs, _PCS_FIELDS), pcs["mppt_count"], circuits_per_mppt(pcs),
+           _spec_key(module, _MODULE_FIELDS), series, t_min, t_max)
+    return _memo(key, lambda: tuple(validate_layout(pcs, module, series, t_min, t_max)))
+
+def clear_calc_cache():
+    """Drop every cached result (called by db after catalog writes)."""
+    with _calc_lock:
+        _calc_cache.clear()
+        _calc_stats["clears"] += 1
+
+def calc_cache_stats():
+    """Return hit/miss/eviction counters, the hit rate and the current size of the cache."""
+    with _calc_lock:
+        lookups = _calc_stats["hits"] + _calc_stats["misses"]
+        return dict(_calc_stats, size=len(_calc_cache), maxsize=CALC_CACHE_SIZE,
+                    hit_rate=_calc_stats["hits"] / lookups if lookups else 0.0)
@@ -0,0 +1,153 @@
+# planner.py
+# Reverse search: start from a target DC capacity and find module × PCS ×
+# number-of-PCS combinations (with string layouts) across the catalog.
+#
+# 1. engine.compatibility_batch() evaluates every module/PCS pair at once;
+#    pairs that are infeasible, or cannot reach the target within the PCS
+#    and module limits, are dropped, and the rest get a lower bound on the
+#    achievable error.
+# 2. Pairs are evaluated exactly in order of that bound, using bitsets of
+#    module counts one PCS can take (solver.reachable_totals) summed over
+#    n units, until the remaining bounds cannot beat the k-th result or the
+#    time budget runs out.
+# 3. Only the returned systems get concrete per-PCS layouts from the solver.
+import time
+
+import numpy as np
+
+import engine
+import solver
+
+def _add_unit(prev, bits, limit):
+    """Bitset of totals reachable with one more unit, given the totals in ``prev``."""
+    cur = 0
+    for t in bits:
+        cur |= prev << t
+    return cur & limit
+
+def _closest(mask, target):
+    """Set bit of ``mask`` closest to ``target`` (the larger one on ties), or None."""
+    p = max(target, 0)
+    high = mask >> p
+    above = p + (high & -high).bit_length() - 1 if high else None
+    low = mask & ((1 << p) - 1)
+    below = low.bit_length() - 1 if low else None
+    if above is None or below is None:
+        return above if below is None else below
+    return above if above - target <= target - below else below
+
+def _split(total, n, one, sets):
+    """Split ``total`` modules over n units, each a valid single-PCS total, as evenly as possible."""
+    parts = []
+    for u in range(n, 0, -1):
+        ideal = total / u
+        rest  = sets[u - 1]
+        choice = None
+        for t in range(one.bit_length()):
+            if (one >> t) & 1 and total - t >= 0 and (rest >> (total - t)) & 1:
+                if choice is None or abs(t - ideal) < abs(choice - ideal):
+                    choice = t
+        parts.append(choice)
+        total -= choice
+    return parts
+
+def find_systems(target_kw, modules, pcs_units, t_min, max_modules=None, max_pcs=10,
+                 k=10, time_budget=1.0, t_max=engine.T_MAX):
+    """Rank candidate systems closest to ``target_kw`` of DC capacity.
+
+    ``modules`` and ``pcs_units`` are catalog dicts as returned by
+    db.load_modules() / db.load_pcs(). A system is 1..max_pcs units of one
+    PCS model with one module model, at most ``max_modules`` modules in
+    total. Returns a dict with ``systems`` (best first: smallest error,
+    then fewer PCS units, then fewer modules), ``evaluated``/``candidates``
+    pair counts and ``complete`` (False if the time budget cut the search).
+    """
+    deadline = time.perf_counter() + time_budget
+    mod_keys, pcs_keys = list(modules), list(pcs_units)
+    result = {"systems": [], "evaluated": 0, "candidates": 0, "complete": True}
+    if not mod_keys or not pcs_keys or target_kw <= 0 or max_pcs < 1:
+        return result
+
+    out = engine.compatibility_batch([modules[m] for m in mod_keys], [pcs_units[p] for p in pcs_keys],
+                                     [t_min], t_max)
+    feasible = out["feasible"][:, :, 0]
+    max_s    = out["max_series"][:, :, 0]
+    mppt_n   = np.array([pcs_units[p]["mppt_count"] for p in pcs_keys], dtype=float)[None, :]
+    pmax     = np.array([modules[m]["pmax_stc"] for m in mod_keys], dtype=float)[:, None]
+
+    # Lower bound on the error: the target beyond what max_pcs units can hold
+    per_unit = mppt_n * out["circuits"] * max_s
+    cap      = per_unit * max_pcs
+    if max_modules is not None:
+        cap = np.minimum(cap, max_modules)
+    target_mods = target_kw * 1000 / pmax
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lb_kw = np.maximum(target_mods - cap, 0) * pmax / 1000
+        n_lo  = np.clip(np.ceil(target_mods / per_unit), 1, max_pcs)
+    lb_kw = np.where(feasible & (pmax > 0), lb_kw, np.inf)
+
+    mi, pj = np.nonzero(np.isfinite(lb_kw))
+    order  = np.lexsort((n_lo[mi, pj], lb_kw[mi, pj]))
+    result["candidates"] = len(order)
+
+    found = []   # (key, system) sorted by key
+    for idx in order:
+        i, j = int(mi[idx]), int(pj[idx])
+        # Remaining pairs can at best tie on (error, PCS count): stop
+        bound_key = (round(float(lb_kw[i, j]), 6), int(n_lo[i, j]))
+        if len(found) >= k and bound_key >= found[k - 1][0][:2]:
+            break
+        if time.perf_counter() > deadline:
+            result["complete"] = False
+            break
+        result["evaluated"] += 1
+
+        module, pcs = modules[mod_keys[i]], pcs_units[pcs_keys[j]]
+        one = solver.reachable_totals(pcs, module, t_min, t_max)
+        if not one:
+            continue
+        target = round(target_kw * 1000 / module["pmax_stc"])
+        # Totals more than one unit above the target can never be the closest
+        cap = target + one.bit_length()
+        if max_modules is not None:
+            cap = min(cap, max_modules)
+        limit = (1 << (cap + 1)) - 1
+        bits = [t for t in range(one.bit_length()) if (one >> t) & 1]
+        sets = [1]   # sets[n]: totals reachable with exactly n units
+        best = None
+        for n in range(1, max_pcs + 1):
+            sets.append(_add_unit(sets[-1], bits, limit))
+            total = _closest(sets[n], target)
+            if total is None:
+                continue
+            err = round(abs(total * module["pmax_stc"] / 1000 - target_kw), 6)
+            key = (err, n, total)
+            if best is None or key < best[0]:
+                best = (key, n, total)
+            if err == 0:
+                break
+        if best is None:
+            continue
+        key, n, total = best
+        found.append((key, {
+            "model_number": mod_keys[i],
+            "pcs_name": pcs_keys[j],
+            "pcs_count": n,
+            "total_modules": total,
+            "power_kw": total * module["pmax_stc"] / 1000,
+            "error_kw": key[0],
+            "_split": (one, sets),
+        }))
+        found.sort(key=lambda f: f[0])
+        del found[k:]
+
+    for _, system in found:
+        one, sets = system.pop("_split")
+        module, pcs = modules[system["model_number"]], pcs_units[system["pcs_name"]]
+        parts = _split(system["total_modules"], system["pcs_count"], one, sets)
+        system["layouts"] = [
+            solver.solve_layouts(pcs, module, t_min, k=1, t_max=t_max, target_modules=t)[0]["series"]
+            for t in parts
+        ]
+        result["systems"].append(system)
+    return result
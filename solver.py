@@ -0,0 +1,134 @@
+# solver.py
+# Suggest string layouts for one PCS/module pair instead of hand-entering
+# every ser_{i}_{j} value in the circuit-config section.
+#
+# Every MPPT input is configured independently with one option (n circuits
+# of s modules each, or unused), and all inputs share the same limits, so a
+# layout is a multiset of per-MPPT options. The search walks multisets in
+# non-increasing option order (no permutations) with branch-and-bound: for
+# each prefix the best total still reachable is known exactly from
+# precomputed bitsets of reachable module counts, and branches that cannot
+# beat the current k-th best layout are pruned.
+import bisect
+
+import engine
+
+def mppt_options(pcs, module, t_min, t_max=engine.T_MAX, circuits=None):
+    """Return valid (n_circuits, series) options for one MPPT input, most modules first.
+
+    ``circuits`` defaults to the PCS's circuits_per_mppt.
+    """
+    circuits = circuits or engine.circuits_per_mppt(pcs)
+    min_s, max_s = engine.series_bounds(pcs, module, t_min, t_max)
+    min_s = max(min_s, 1)
+    n_max = 0
+    for n in range(1, circuits + 1):
+        if n * module["isc_noc"] <= pcs["mppt_max_current"]:
+            n_max = n
+    options = [(n, s) for n in range(1, n_max + 1) for s in range(min_s, max_s + 1)]
+    options.sort(key=lambda o: (-o[0] * o[1], -o[1]))
+    return options
+
+def _reachable(mods, slots):
+    """reach[j][r]: bitset of module totals reachable with r inputs using options j.. (or unused)."""
+    n_opt = len(mods)
+    reach = [[1] * (slots + 1) for _ in range(n_opt + 1)]   # past the last option: all unused
+    for j in range(n_opt - 1, -1, -1):
+        for r in range(1, slots + 1):
+            reach[j][r] = reach[j + 1][r] | (reach[j][r - 1] << mods[j])
+    return reach
+
+def _nearest_bit(mask, p):
+    """Smallest |x - p| over the set bits x of ``mask`` (mask must be non-zero)."""
+    if p <= 0:
+        return (mask & -mask).bit_length() - 1 - p
+    best = None
+    high = mask >> p
+    if high:
+        best = (high & -high).bit_length() - 1
+    low = mask & ((1 << p) - 1)
+    if low:
+        d = p - (low.bit_length() - 1)
+        best = d if best is None else min(best, d)
+    return best
+
+def reachable_totals(pcs, module, t_min, t_max=engine.T_MAX, circuits=None):
+    """Bitset of the module counts one PCS can take (bit n set = n modules is a valid layout)."""
+    options = mppt_options(pcs, module, t_min, t_max, circuits)
+    slots   = int(pcs["mppt_count"])
+    if not options or slots <= 0:
+        return 0
+    return _reachable([n * s for n, s in options], slots)[0][slots] & ~1
+
+def solve_layouts(pcs, module, t_min, k=5, target_kw=None, t_max=engine.T_MAX,
+                  circuits=None, target_modules=None):
+    """Return up to ``k`` best valid layouts for a PCS/module pair.
+
+    Without ``target_kw`` layouts are ranked by total PV power; with it (or
+    with ``target_modules``), by distance to the target, then by power.
+    Each result is a dict with
+    ``series`` (mppt_count × circuits grid, as in the ser_{i}_{j} inputs),
+    ``total_modules`` and ``power_w``.
+    """
+    circuits = circuits or engine.circuits_per_mppt(pcs)
+    options = mppt_options(pcs, module, t_min, t_max, circuits)
+    slots   = int(pcs["mppt_count"])
+    pmax    = module["pmax_stc"]
+    if not options or slots <= 0 or pmax <= 0:
+        return []
+    mods  = [n * s for n, s in options]
+    reach = _reachable(mods, slots)
+    target = target_modules
+    if target is None and target_kw is not None:
+        target = round(target_kw * 1000 / pmax)
+
+    def score(total):
+        # Lower is better
+        if target is None:
+            return (-total,)
+        return (abs(total - target), -total)
+
+    def bound(total, j, r):
+        # Best score reachable from this prefix
+        if target is None:
+            return (-(total + r * mods[j]),) if j < len(mods) else (-total,)
+        mask = reach[j][r]
+        dist = _nearest_bit(mask, target - total)
+        # Prefer the larger of the totals at that distance, as score() does
+        above = target + dist - total
+        best_total = target + dist if above >= 0 and (mask >> above) & 1 else target - dist
+        return (dist, -best_total)
+
+    best = []   # sorted list of (score, picks)
+
+    def offer(total, picks):
+        if total == 0:
+            return
+        bisect.insort(best, (score(total), tuple(picks)))
+        if len(best) > k:
+            best.pop()
+
+    def dfs(j, r, total, picks):
+        if len(best) == k and bound(total, j, r) >= best[-1][0]:
+            return
+        if r == 0 or j == len(options):
+            offer(total, picks)
+            return
+        # Use option j on one more input (stay at j), or move on to j+1
+        picks.append(j)
+        dfs(j, r - 1, total + mods[j], picks)
+        picks.pop()
+        dfs(j + 1, r, total, picks)
+
+    dfs(0, slots, 0, [])
+
+    layouts = []
+    for _, picks in best:
+        series = []
+        for j in picks:
+            n, s = options[j]
+            series.append([s] * n + [0] * (circuits - n))
+        series += [[0] * circuits for _ in range(slots - len(series))]
+        total = sum(mods[j] for j in picks)
+        layouts.append({"series": series, "total_modules": total, "power_w": total * pmax})
+    return layouts
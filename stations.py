@@ -0,0 +1,134 @@
+# stations.py
+# Resolve a site (coordinates or postal-code prefix) to the nearest weather
+# stations, and derive t_min / t_max for the series-bounds calculation from
+# their records instead of the fixed selectbox options.
+#
+# Stations live in the ``stations`` table of modules.db and are loaded with
+#   python db.py import stations stations.csv
+# (columns: station_id, name, lat, lon, postal_code, record_low ℃,
+# design_high ℃ ambient). The lookup index is built once per catalog
+# snapshot:
+#   - a uniform lat/lon grid (CELL_DEG cells). A query scans rings of cells
+#     outward and stops when the next ring cannot hold anything closer than
+#     the k-th hit.
+#   - a sorted list of postal codes, so a prefix is a bisect range.
+import bisect
+import math
+import threading
+
+import db
+import engine
+import weather
+
+CELL_DEG = 0.5
+EARTH_RADIUS_KM = 6371.0
+DESIGN_IRRADIANCE = 1000.0   # W/m², for the cell temperature on the design-high day
+
+_index_lock = threading.Lock()
+_index = {"source": None}
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _cell(lat, lon):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+def build_index(stations):
+    """Build the lookup index for a {station_id: spec} dict."""
+    ids = list(stations)
+    coords = [(stations[s]["lat"], stations[s]["lon"]) for s in ids]
+    grid = {}
+    for k, (lat, lon) in enumerate(coords):
+        grid.setdefault(_cell(lat, lon), []).append(k)
+    postal = sorted((stations[s].get("postal_code") or "", k) for k, s in enumerate(ids)
+                    if stations[s].get("postal_code"))
+    cells = list(grid)
+    return {
+        "ids": ids, "coords": coords, "grid": grid,
+        "postal_codes": [p for p, _ in postal], "postal_idx": [k for _, k in postal],
+        # Bounding box of occupied cells: rings beyond it are empty
+        "span": (min((c[0] for c in cells), default=0), max((c[0] for c in cells), default=0),
+                 min((c[1] for c in cells), default=0), max((c[1] for c in cells), default=0)),
+    }
+
+def _current_index():
+    stations = db.load_stations()
+    with _index_lock:
+        # load_stations() returns the same dict until the table changes
+        if _index["source"] is not stations:
+            _index.update(build_index(stations), source=stations)
+        return dict(_index)
+
+def _ring(ci, cj, r):
+    if r == 0:
+        yield ci, cj
+        return
+    for dj in range(-r, r + 1):
+        yield ci - r, cj + dj
+        yield ci + r, cj + dj
+    for di in range(-r + 1, r):
+        yield ci + di, cj - r
+        yield ci + di, cj + r
+
+def nearest(index, lat, lon, k=3):
+    """Return up to k (distance_km, station index) pairs, nearest first."""
+    if not index["ids"]:
+        return []
+    ci, cj = _cell(lat, lon)
+    i0, i1, j0, j1 = index["span"]
+    max_r = max(abs(ci - i0), abs(ci - i1), abs(cj - j0), abs(cj - j1))
+    # Smallest km per degree anywhere the search can reach (longitude shrinks poleward)
+    lat_reach = min(90.0, abs(lat) + (max_r + 1) * CELL_DEG)
+    km_per_deg = math.radians(1) * EARTH_RADIUS_KM * max(math.cos(math.radians(lat_reach)), 1e-6)
+    found = []
+    for r in range(max_r + 1):
+        # Everything in ring r is at least (r - 1) cells away along one axis
+        if len(found) >= k and (r - 1) * CELL_DEG * km_per_deg > found[k - 1][0]:
+            break
+        for cell in _ring(ci, cj, r):
+            for idx in index["grid"].get(cell, ()):
+                s_lat, s_lon = index["coords"][idx]
+                bisect.insort(found, (haversine_km(lat, lon, s_lat, s_lon), idx))
+        del found[k:]
+    return found
+
+def _result(index, hits):
+    stations = index["source"]
+    return [dict(stations[index["ids"][idx]], station_id=index["ids"][idx], distance_km=d) for d, idx in hits]
+
+def nearest_stations(lat, lon, k=3):
+    """The k stations nearest to (lat, lon), each with station_id and distance_km."""
+    index = _current_index()
+    return _result(index, nearest(index, lat, lon, k))
+
+def stations_near_postal(prefix, k=3):
+    """The k stations nearest to the centroid of the stations whose postal code starts with ``prefix``."""
+    prefix = str(prefix).replace("-", "").strip()
+    index = _current_index()
+    if not prefix:
+        return []
+    codes = index["postal_codes"]
+    lo = bisect.bisect_left(codes, prefix)
+    hi = bisect.bisect_left(codes, prefix + "\uffff")
+    matches = index["postal_idx"][lo:hi]
+    if not matches:
+        return []
+    lat = sum(index["coords"][m][0] for m in matches) / len(matches)
+    lon = sum(index["coords"][m][1] for m in matches) / len(matches)
+    return _result(index, nearest(index, lat, lon, k))
+
+def site_temperatures(station):
+    """(t_min, t_max) for engine.series_bounds() from a station record.
+
+    t_min is the record low air temperature (cold clear mornings: the cell is
+    at air temperature). t_max is the cell temperature on the design-high
+    day at DESIGN_IRRADIANCE (weather.cell_temperature), or engine.T_MAX if
+    the station has no design high.
+    """
+    t_max = engine.T_MAX
+    if station.get("design_high") is not None:
+        t_max = float(weather.cell_temperature(station["design_high"], DESIGN_IRRADIANCE))
+    return float(station["record_low"]), t_max
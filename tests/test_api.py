@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import api
+import db
+import engine
+
+
+def setup_module(module):
+    db._conn = sqlite3.connect(":memory:", check_same_thread=False)
+    db._migrated_conn = None
+    db.init_db()
+
+
+def test_handle_bounds_validate_and_lookups():
+    async def run():
+        return [
+            await api.handle("POST", "/bounds", json.dumps(
+                {"pcs": "マルチパワコン", "module": "NQ-250AG", "t_min": -5}).encode()),
+            await api.handle("POST", "/validate", json.dumps([
+                {"pcs": "マルチパワコン", "module": "NQ-250AG", "t_min": -5, "series": [[9, 0, 0], [9, 0, 0]]},
+                {"pcs": "マルチパワコン", "module": "NQ-250AG", "t_min": -10, "series": [[9, 9, 0]]},
+            ]).encode()),
+            await api.handle("GET", "/modules?q=NQ&limit=5"),
+            await api.handle("GET", "/pcs/%E3%83%9E%E3%83%AB%E3%83%81%E3%83%91%E3%83%AF%E3%82%B3%E3%83%B3"),
+            await api.handle("POST", "/bounds", b'{"pcs": "nope", "module": "NQ-250AG", "t_min": -5}'),
+            await api.handle("GET", "/bounds"),
+        ]
+
+    bounds, validate, search, pcs, unknown, wrong_method = asyncio.run(run())
+    expected = engine.series_bounds(db.load_pcs()["マルチパワコン"], db.load_modules()["NQ-250AG"], -5)
+    assert bounds == (200, {"min_series": expected[0], "max_series": expected[1]})
+    assert validate[0] == 200
+    assert [r["valid"] for r in validate[1]] == [True, False]
+    assert validate[1][1]["errors"] == [[0, None, "current"]]
+    assert search == (200, ["NQ-250AG"])
+    assert pcs[1]["mppt_count"] == 3
+    assert unknown[0] == 404 and wrong_method[0] == 405
+
+
+def test_validate_rejects_bad_shapes_and_counts():
+    def post(series):
+        body = json.dumps([{"pcs": "マルチパワコン", "module": "NQ-250AG", "t_min": -5, "series": series}])
+        return asyncio.run(api.handle("POST", "/validate", body.encode()))
+
+    status, results = post([[9] * 5] * 5)
+    assert status == 200 and not results[0]["valid"]
+    assert [None, None, "mppt_count"] in results[0]["errors"]
+    for series in ([[9.7, 0, 0]], [[-1, 9, 0]], [[True]], [[1e23]]):
+        status, body = post(series)
+        assert status == 400 and "error" in body
+    # A body nested too deep for the parser still gets a JSON answer
+    status, body = asyncio.run(api.handle("POST", "/validate", b"[" * 100000))
+    assert status in (400, 500) and "error" in body
+
+
+def test_server_keeps_connection_alive():
+    async def run():
+        server = await api.serve("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        statuses = []
+        for close in (False, True):
+            body = json.dumps({"pcs": "マルチパワコン", "module": "NQ-250AG", "t_min": -5}).encode()
+            writer.write(b"POST /bounds HTTP/1.1\r\nHost: localhost\r\n"
+                         + (b"Connection: close\r\n" if close else b"")
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            statuses.append(await reader.readline())
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            await reader.readexactly(int(headers["content-length"]))
+            statuses.append(headers["connection"])
+        at_eof = await reader.read() == b""
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return statuses, at_eof
+
+    statuses, at_eof = asyncio.run(run())
+    assert statuses == [b"HTTP/1.1 200 OK\r\n", "keep-alive", b"HTTP/1.1 200 OK\r\n", "close"]
+    assert at_eof
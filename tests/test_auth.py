@@ -37,3 +37,21 @@ def test_update_password_updates_existing_user(tmp_path, monkeypatch):
     assert auth.update_password("alice", "pw2")
     assert auth.check_login("alice", "pw2")
  
+
+
+def test_credentials_bootstrap_once_and_connection_is_reused(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(auth, "_conn", None)
+    monkeypatch.setattr(auth, "_bootstrapped", False)
+    calls = []
+    original = auth.ensure_permanent_credentials
+    monkeypatch.setattr(auth, "ensure_permanent_credentials", lambda: calls.append(1) or original())
+
+    assert auth.check_login("smartsolar", "solar27")
+    assert not auth.check_login("smartsolar", "wrong")
+    assert auth.create_user("bob", "pw")
+    assert calls == [1]
+    assert auth.get_db() is auth.get_db()
+
+    stats = auth.login_stats()
+    assert stats["hash_seconds"] > 0 and stats["last"]["hash_ms"] > stats["last"]["db_ms"]
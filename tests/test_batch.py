@@ -0,0 +1,50 @@
+import csv
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import batch
+import engine
+
+
+PCS = {"max_voltage": 450.0, "mppt_min_voltage": 35.0, "mppt_count": 3, "mppt_max_current": 14.0}
+MODULE = {"pmax_stc": 250.0, "voc_stc": 41.5, "vmpp_noc": 33.0, "isc_noc": 8.5, "temp_coeff": -0.29}
+
+
+def test_validate_file_writes_verdicts_in_order(tmp_path):
+    src, dest = tmp_path / "designs.csv", tmp_path / "results.csv"
+    rows = [
+        {"pcs": "P", "module": "M", "t_min": "-5", "mppt1": "9", "mppt2": "9", "mppt3": "8"},
+        {"pcs": "P", "module": "M", "t_min": "-5", "mppt1": "9,9", "mppt2": "", "mppt3": ""},
+        {"pcs": "P", "module": "M", "t_min": "-10", "mppt1": "10,0,0", "mppt2": "9,8", "mppt3": ""},
+        {"pcs": "P", "module": "X", "t_min": "-5", "mppt1": "9", "mppt2": "", "mppt3": ""},
+        {"pcs": "P", "module": "M", "t_min": "", "mppt1": "9", "mppt2": "", "mppt3": ""},
+    ] * 3
+    with open(src, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    report = batch.validate_file(src, dest, workers=2, chunk_size=2, pcs_units={"P": PCS}, modules={"M": MODULE})
+
+    with open(dest, encoding="utf-8") as f:
+        results = list(csv.DictReader(f))
+    assert (report["rows"], report["ok"], report["ng"]) == (15, 3, 12)
+    assert [r["verdict"] for r in results[:5]] == ["OK", "NG", "NG", "NG", "NG"]
+    assert results[1]["errors"] == "current@1"
+    assert results[3]["errors"] == "unknown_module"
+    assert results[4]["errors"] == "invalid"
+    expected = engine.validate_layout(PCS, MODULE, [[10, 0, 0], [9, 8]], -10)
+    assert results[2]["errors"] == batch.format_errors(expected) == "range@1-1 mismatch@2-2 current@2"
+    assert results[5:10] == results[:5]
+
+
+def test_validate_rows_reports_malformed_rows_as_invalid():
+    batch._init_worker({"P": PCS}, {"M": MODULE})
+    rows = [
+        {"pcs": "P", "module": "M", "t_min": "-5", "series": "99999999999999999999999"},
+        {"pcs": "P", "module": "M", "t_min": "-5", "series": "9,,9"},
+        {"pcs": "P", "module": "M", "t_min": "nan", "series": "9"},
+        {"pcs": "P", "module": "M", "t_min": "-5", "series": "9;9"},
+    ]
+    assert batch.validate_rows(rows) == [("NG", "invalid")] * 3 + [("OK", "")]
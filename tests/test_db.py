@@ -1,6 +1,7 @@
 import sqlite3
 import sys
 import os
+import pytest
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 import db
@@ -23,3 +24,361 @@ def test_default_pcs_setting():
     assert pcs["PCS2"]["is_default"] is True
     assert sum(1 for p in pcs.values() if p["is_default"]) == 1
  
+
+
+def test_catalog_cache_hits_and_invalidation():
+    first = db.load_modules()
+    stats = db.catalog_cache_stats()
+    assert db.load_modules() is first
+    assert db.catalog_cache_stats()["hits"] == stats["hits"] + 1
+
+    clears = db.engine.calc_cache_stats()["clears"]
+    db.save_module("Maker", "CACHE-1", 300.0, 40.0, 32.0, 9.0, -0.3)
+    assert db.engine.calc_cache_stats()["clears"] > clears
+    mods = db.load_modules()
+    assert mods is not first
+    assert "CACHE-1" in mods
+
+    db.delete_module("CACHE-1")
+    assert "CACHE-1" not in db.load_modules()
+
+
+def test_file_database_uses_wal_and_pooled_readers(tmp_path, monkeypatch):
+    conn = db._connect(str(tmp_path / "modules.db"))
+    monkeypatch.setattr(db, "_conn", conn)
+    db.init_db()
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    with db._reading() as cur:
+        assert cur.connection is not conn
+        cur.execute("SELECT COUNT(*) FROM modules")
+        assert cur.fetchone()[0] == 3
+
+
+def test_concurrent_writes_are_group_committed():
+    from concurrent.futures import ThreadPoolExecutor
+
+    before = db.writer_stats()
+    names = [f"GC-{i}" for i in range(40)]
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        list(ex.map(lambda n: db.save_module("Maker", n, 300.0, 40.0, 32.0, 9.0, -0.3), names))
+    after = db.writer_stats()
+
+    assert after["writes"] - before["writes"] == 40
+    assert after["batches"] - before["batches"] <= 40
+    assert set(names) <= set(db.load_modules())
+    for n in names:
+        db.delete_module(n)
+
+
+def test_rename_module_and_update_pcs_are_atomic():
+    db.save_module("Maker", "OLD-1", 300.0, 40.0, 32.0, 9.0, -0.3)
+    db.rename_module("OLD-1", "Maker", "NEW-1", 310.0, 40.0, 32.0, 9.0, -0.3)
+    mods = db.load_modules()
+    assert "OLD-1" not in mods
+    assert mods["NEW-1"]["pmax_stc"] == 310.0
+    db.delete_module("NEW-1")
+
+    db.save_pcs("PCS-A", "MA", 400.0, 100.0, 2, 10.0)
+    db.update_pcs("PCS-A", "PCS-B", "MB", 450.0, 100.0, 2, 10.0, is_default=True)
+    pcs = db.load_pcs()
+    assert "PCS-A" not in pcs
+    assert pcs["PCS-B"]["is_default"] is True
+    assert sum(1 for p in pcs.values() if p["is_default"]) == 1
+    db.delete_pcs("PCS-B")
+
+
+def test_import_catalog_loads_valid_rows_and_reports_errors():
+    import io
+
+    src = io.StringIO(
+        "manufacturer,model_number,pmax_stc,voc_stc,vmpp_noc,isc_noc,temp_coeff\n"
+        "Maker,IMP-1,300,40,32,9,-0.3\n"
+        "Maker,IMP-2,abc,40,32,9,-0.3\n"
+        "Maker,IMP-3,310,41,33,9.2,-0.29\n"
+    )
+    report = db.import_catalog(src, "modules", fmt="csv", chunk_size=1)
+
+    assert report["rows"] == 2
+    assert [line for line, _ in report["errors"]] == [3]
+    mods = db.load_modules()
+    assert mods["IMP-3"]["voc_stc"] == 41.0
+    assert "IMP-2" not in mods
+
+    src = io.BytesIO(b'{"name": "IMP-PCS", "max_voltage": 450, "mppt_min_voltage": 50,'
+                     b' "mppt_count": 4, "mppt_max_current": 12}\n{broken\n')
+    report = db.import_catalog(src, "pcs", fmt="json")
+    assert report["rows"] == 1 and len(report["errors"]) == 1
+    assert db.load_pcs()["IMP-PCS"]["mppt_count"] == 4
+
+    for n in ("IMP-1", "IMP-3"):
+        db.delete_module(n)
+    db.delete_pcs("IMP-PCS")
+
+
+def test_import_catalog_handles_shift_jis_and_malformed_json():
+    import io
+
+    csv_text = ("manufacturer,model_number,pmax_stc,voc_stc,vmpp_noc,isc_noc,temp_coeff\n"
+                "長州産業,SJIS-1,300,40,32,9,-0.3\n")
+    report = db.import_catalog(io.BytesIO(csv_text.encode("cp932")), "modules", fmt="csv")
+    assert report["rows"] == 1 and db.load_modules()["SJIS-1"]["manufacturer"] == "長州産業"
+
+    with pytest.raises(ValueError, match="invalid JSON"):
+        db.import_catalog(io.BytesIO(b'[{"name": "X",'), "pcs", fmt="json")
+    with pytest.raises(ValueError, match="Shift_JIS"):
+        db.import_catalog(io.BytesIO(b"\xff\xfe\x00\x81"), "modules", fmt="csv")
+
+    report = db.import_catalog(io.StringIO('[1, "x"]'), "stations", fmt="json")
+    assert report["rows"] == 0
+    assert [msg for _, msg in report["errors"]] == ["row is not an object: 1", "row is not an object: 'x'"]
+    db.delete_module("SJIS-1")
+
+
+def test_import_catalog_streams_chunks_and_rejects_non_finite(monkeypatch):
+    import io
+
+    header = "manufacturer,model_number,pmax_stc,voc_stc,vmpp_noc,isc_noc,temp_coeff\n"
+    body = "".join(f"Maker,STR-{i},300,40,32,9,-0.3\n" for i in range(600))
+    # Shift_JIS only after the first chunks: they are rewritten on the retry
+    data = (header + body + "長州産業,STR-SJIS,300,40,32,9,-0.3\n").encode("cp932")
+    src, positions = io.BytesIO(data), []
+    submit = db._submit
+    monkeypatch.setattr(db, "_submit", lambda job: (positions.append(src.tell()), submit(job))[1])
+    report = db.import_catalog(src, "modules", fmt="csv", chunk_size=100)
+    assert report["rows"] == 601 and report["errors"] == []
+    assert positions[0] < len(data)
+    assert db.load_modules()["STR-SJIS"]["manufacturer"] == "長州産業"
+    monkeypatch.undo()
+
+    rows = ("name,max_voltage,mppt_min_voltage,mppt_count,mppt_max_current,circuits_per_mppt\n"
+            "BAD-1,450,50,inf,12,2\n"
+            "BAD-2,nan,50,4,12,2\n"
+            "BAD-3,450,50,1000000,12,2\n"
+            "BAD-4,450,50,4,12,100\n"
+            "OK-1,450,50,4,12,2\n")
+    report = db.import_catalog(io.StringIO(rows), "pcs", fmt="csv")
+    assert report["rows"] == 1 and [line for line, _ in report["errors"]] == [2, 3, 4, 5]
+    assert "finite" in report["errors"][0][1] and "at most" in report["errors"][2][1]
+
+    for i in range(600):
+        db.delete_module(f"STR-{i}")
+    db.delete_module("STR-SJIS")
+    db.delete_pcs("OK-1")
+
+
+def test_export_catalog_streams_csv_in_chunks():
+    import csv
+    import io
+
+    for i in range(5):
+        db.save_module("Maker", f"EXP-{i}", 300.0, 40.0, 32.0, 9.0, -0.3)
+    assert all(len(rows) <= 2 for rows in db.iter_catalog_chunks("modules", chunk_size=2))
+
+    buf = io.BytesIO()
+    count = db.export_catalog("modules", buf, fmt="csv", chunk_size=2)
+    rows = list(csv.DictReader(io.StringIO(buf.getvalue().decode("utf-8"))))
+    assert count == len(rows) == len(db.load_modules())
+    assert {"EXP-0", "EXP-4"} <= {r["model_number"] for r in rows}
+
+    buf.seek(0)
+    assert db.import_catalog(buf, "modules", fmt="csv")["errors"] == []
+    for i in range(5):
+        db.delete_module(f"EXP-{i}")
+
+
+def test_search_modules_prefix_substring_and_fuzzy():
+    db.save_module("Acme Solar", "ACM-400W", 400.0, 49.0, 41.0, 10.0, -0.3)
+    db.save_module("Other", "XYZ-ACM-1", 300.0, 40.0, 32.0, 9.0, -0.3)
+
+    assert db.search_modules("ACM")[:2] == ["ACM-400W", "XYZ-ACM-1"]
+    assert db.search_modules("acme")[0] == "ACM-400W"
+    assert "ACM-400W" in db.search_modules("ACM-40OW")   # typo
+    assert db.search_modules("AC") == ["ACM-400W", "XYZ-ACM-1"]
+    assert len(db.search_modules("", limit=2)) == 2
+
+    # Index follows replace / rename / delete
+    db.rename_module("ACM-400W", "Acme Solar", "ACM-410W", 410.0, 49.0, 41.0, 10.0, -0.3)
+    assert db.search_modules("ACM-4")[0] == "ACM-410W"
+    assert "ACM-400W" not in db.search_modules("ACM")
+    db.delete_module("ACM-410W")
+    db.delete_module("XYZ-ACM-1")
+    assert db.search_modules("ACM") == []
+
+    db.save_pcs("Search PCS", "SRCH-55", 450.0, 50.0, 4, 12.0)
+    assert db.search_pcs("srch")[0] == "Search PCS"
+    db.delete_pcs("Search PCS")
+
+
+def test_load_modules_page_filters_sorts_and_paginates():
+    for i, voc in enumerate((38.0, 42.0, 46.0, 50.0)):
+        db.save_module("PageCo", f"PG-{i}", 300.0 + i, voc, 32.0, 9.0, -0.3)
+
+    rows, total = db.load_modules_page(page=0, page_size=3, sort="voc_stc", descending=True,
+                                       manufacturer="PageCo")
+    assert total == 4
+    assert [r["model_number"] for r in rows] == ["PG-3", "PG-2", "PG-1"]
+    rows, _ = db.load_modules_page(page=1, page_size=3, sort="voc_stc", descending=True,
+                                   manufacturer="PageCo")
+    assert [r["model_number"] for r in rows] == ["PG-0"]
+
+    rows, total = db.load_modules_page(manufacturer="PageCo", voltage_min=40, voltage_max=47)
+    assert total == 2 and {r["model_number"] for r in rows} == {"PG-1", "PG-2"}
+    assert "PageCo" in db.list_manufacturers()
+    # The UI's sort choices come from the same whitelist the queries check
+    for col in db.sortable_columns("modules"):
+        db.load_modules_page(sort=col, manufacturer="PageCo")
+    for col in db.sortable_columns("pcs"):
+        db.load_pcs_page(sort=col)
+    for i in range(4):
+        db.delete_module(f"PG-{i}")
+
+
+def test_migrations_upgrade_legacy_schema_once(monkeypatch):
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE pcs(name TEXT PRIMARY KEY, max_voltage REAL, mppt_min_voltage REAL,"
+                 " mppt_count INTEGER, mppt_max_current REAL)")
+    conn.execute("INSERT INTO pcs VALUES ('Legacy', 400, 100, 2, 10)")
+    conn.commit()
+    monkeypatch.setattr(db, "_conn", conn)
+    monkeypatch.setattr(db, "_migrated_conn", None)
+
+    db.init_db()
+    stats = db.migration_stats()
+    assert stats["version"] == len(db._MIGRATIONS)
+    assert len(stats["applied"]) == len(db._MIGRATIONS)
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(pcs)")}
+    assert {"model_number", "is_default"} <= cols
+    # Existing PCS rows are kept, so no default PCS is seeded
+    assert [r[0] for r in conn.execute("SELECT name FROM pcs")] == ["Legacy"]
+
+    monkeypatch.setattr(db, "_migrated_conn", None)
+    db.init_db()
+    assert db.migration_stats()["applied"] == []
+
+
+def test_compat_matrix_is_maintained_incrementally():
+    import engine
+
+    db.save_pcs("CMP-PCS", "CMP", 450.0, 35.0, 3, 14.0)
+    db.save_module("Maker", "CMP-MOD", 250.0, 41.5, 33.0, 8.5, -0.29)
+    pcs = db.load_pcs()["CMP-PCS"]
+    mod = db.load_modules()["CMP-MOD"]
+
+    rows = {r["model_number"]: r for r in db.compatible_modules("CMP-PCS", -10)}
+    min_s, max_s = engine.series_bounds(pcs, mod, -10)
+    assert (rows["CMP-MOD"]["min_series"], rows["CMP-MOD"]["max_series"]) == (min_s, max_s)
+    assert rows["CMP-MOD"]["max_power_w"] == 3 * 1 * max_s * 250.0
+
+    # Lowering the MPPT current limit below Isc makes the module incompatible
+    db.update_pcs("CMP-PCS", "CMP-PCS", "CMP", 450.0, 35.0, 3, 8.0)
+    assert "CMP-MOD" not in {r["model_number"] for r in db.compatible_modules("CMP-PCS", -10)}
+
+    db.rename_module("CMP-MOD", "Maker", "CMP-MOD2", 250.0, 41.5, 33.0, 7.5, -0.29)
+    assert [r["model_number"] for r in db.compatible_modules("CMP-PCS", -10, limit=1)] == ["CMP-MOD2"]
+
+    db.delete_module("CMP-MOD2")
+    db.delete_pcs("CMP-PCS")
+    assert db._conn.execute(
+        "SELECT COUNT(*) FROM compat WHERE model_number LIKE 'CMP-%' OR pcs_name = 'CMP-PCS'"
+    ).fetchone()[0] == 0
+
+
+def test_circuits_per_mppt_column_limits_compat():
+    db.save_pcs("CIR-PCS", "CIR", 1000.0, 200.0, 4, 40.0, circuits=2)
+    db.save_module("Maker", "CIR-MOD", 400.0, 49.0, 41.0, 10.0, -0.3)
+    assert db.load_pcs()["CIR-PCS"]["circuits_per_mppt"] == 2
+
+    # 40A would allow 4 strings of 10A, but the PCS has 2 circuits per MPPT
+    rows = {r["model_number"]: r for r in db.compatible_modules("CIR-PCS", -10)}
+    assert rows["CIR-MOD"]["circuits"] == 2
+
+    db.update_pcs("CIR-PCS", "CIR-PCS", "CIR", 1000.0, 200.0, 4, 40.0, circuits=4)
+    rows = {r["model_number"]: r for r in db.compatible_modules("CIR-PCS", -10)}
+    assert rows["CIR-MOD"]["circuits"] == 4
+
+    db.delete_module("CIR-MOD")
+    db.delete_pcs("CIR-PCS")
+
+
+def test_project_totals_follow_unit_and_catalog_changes():
+    db.save_pcs("PRJ-PCS", "PRJ", 450.0, 35.0, 3, 14.0, ac_kw=5.5)
+    db.save_module("Maker", "PRJ-MOD", 250.0, 41.5, 33.0, 8.5, -0.29)
+    db.save_project("PRJ", -5)
+    good = [[9, 0, 0], [9, 0, 0], [8, 0, 0]]
+    nos = db.save_project_units("PRJ", [
+        {"pcs_name": "PRJ-PCS", "model_number": "PRJ-MOD", "series": good},
+        {"pcs_name": "PRJ-PCS", "model_number": "PRJ-MOD", "series": good},
+    ])
+    assert nos == [1, 2]
+    totals = db.project_totals("PRJ")
+    assert (totals["pcs_count"], totals["total_modules"], totals["invalid_units"]) == (2, 52, 0)
+    assert totals["dc_kw"] == 13.0 and totals["ac_kw"] == 11.0
+    assert totals["dc_ac_ratio"] == 13.0 / 11.0
+
+    # Only unit 2 changes: two strings on one 14A MPPT exceed the current limit
+    db.save_project_units("PRJ", [{"unit_no": 2, "pcs_name": "PRJ-PCS", "model_number": "PRJ-MOD",
+                                   "series": [[9, 9, 0], [0, 0, 0], [0, 0, 0]]}])
+    project = db.load_project("PRJ")
+    assert project["total_modules"] == 44 and project["invalid_units"] == 1
+    assert project["units"][1]["errors"] == [(0, None, "current")]
+
+    # Catalog edits re-validate the units that use the edited rows
+    db.save_pcs("PRJ-PCS", "PRJ", 450.0, 35.0, 3, 20.0, ac_kw=5.5)
+    assert db.project_totals("PRJ")["invalid_units"] == 0
+    db.delete_module("PRJ-MOD")
+    assert db.project_totals("PRJ")["invalid_units"] == 2
+
+    db.delete_project("PRJ")
+    db.delete_pcs("PRJ-PCS")
+    assert db.project_totals("PRJ") is None
+
+
+def test_project_units_follow_renames_and_pcs_shape():
+    db.save_pcs("REN-PCS", "REN", 450.0, 35.0, 3, 14.0, ac_kw=5.5)
+    db.save_module("Maker", "REN-MOD", 250.0, 41.5, 33.0, 8.5, -0.29)
+    db.save_project("REN", -5)
+    db.save_project_units("REN", [{"pcs_name": "REN-PCS", "model_number": "REN-MOD",
+                                   "series": [[9, 0, 0], [9, 0, 0], [9, 0, 0]]}])
+
+    db.update_pcs("REN-PCS", "REN-PCS2", "REN", 450.0, 35.0, 3, 14.0, ac_kw=5.5)
+    db.rename_module("REN-MOD", "Maker", "REN-MOD2", 250.0, 41.5, 33.0, 8.5, -0.29)
+    project = db.load_project("REN")
+    unit = project["units"][0]
+    assert (unit["pcs_name"], unit["model_number"], unit["errors"]) == ("REN-PCS2", "REN-MOD2", [])
+    assert (project["total_modules"], project["invalid_units"]) == (27, 0)
+
+    # Cutting the PCS to one MPPT input leaves strings on inputs it no longer has
+    db.update_pcs("REN-PCS2", "REN-PCS2", "REN", 450.0, 35.0, 1, 14.0, ac_kw=5.5)
+    project = db.load_project("REN")
+    assert project["invalid_units"] == 1
+    assert project["units"][0]["errors"] == [(None, None, "mppt_count")]
+
+    db.delete_project("REN")
+    db.delete_pcs("REN-PCS2")
+    db.delete_module("REN-MOD2")
+
+
+def test_catalog_refresh_stays_under_the_old_sqlite_parameter_limit():
+    import io
+
+    db.save_pcs("LIM-PCS", "LIM", 450.0, 35.0, 3, 14.0)
+    db.save_project("LIM", -5)
+    db.save_project_units("LIM", [{"pcs_name": "LIM-PCS", "model_number": "LIM-0",
+                                   "series": [[9, 0, 0], [0, 0, 0], [0, 0, 0]]}])
+    rows = "".join(f"Maker,LIM-{i},250,41.5,33,8.5,-0.29\n" for i in range(1200))
+    limit = db._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    try:
+        report = db.import_catalog(io.StringIO(
+            "manufacturer,model_number,pmax_stc,voc_stc,vmpp_noc,isc_noc,temp_coeff\n" + rows),
+            "modules", fmt="csv", chunk_size=1200)
+    finally:
+        db._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+    assert report["rows"] == 1200
+    project = db.load_project("LIM")
+    assert (project["total_modules"], project["invalid_units"]) == (9, 0)
+
+    db.delete_project("LIM")
+    db.delete_pcs("LIM-PCS")
+    for i in range(1200):
+        db.delete_module(f"LIM-{i}")
@@ -0,0 +1,57 @@
+import io
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import db
+import degradation
+import engine
+
+
+PCS = {"max_voltage": 450.0, "mppt_min_voltage": 200.0, "mppt_count": 3, "mppt_max_current": 14.0}
+MODULE = {"pmax_stc": 250.0, "voc_stc": 41.5, "vmpp_noc": 33.0, "isc_noc": 8.5, "temp_coeff": -0.29}
+
+
+def setup_module(module):
+    db._conn = sqlite3.connect(":memory:", check_same_thread=False)
+    db._migrated_conn = None
+    db.init_db()
+
+
+def test_project_layout_year_by_year():
+    proj = degradation.project_layout(PCS, dict(MODULE, degradation_rate=1.0), [[7, 7, 0], [8, 0, 0]], years=30)
+    _, vmpp_hot = engine.corrected_voltages(MODULE, engine.STC_TEMP)
+    assert len(proj["years"]) == 31
+    assert proj["pmax_w"][0] == 22 * 250.0 and abs(proj["pmax_w"][10] - 22 * 250.0 * 0.9) < 1e-9
+    assert abs(proj["vmpp_string"][0] - 7 * vmpp_hot) < 1e-9
+    first = proj["first_year_below"]
+    assert proj["below_mppt_min"][first] and not any(proj["below_mppt_min"][:first])
+
+
+def test_catalog_sweep_matches_project_layout():
+    modules = [dict(MODULE, vmpp_noc=v, degradation_rate=r)
+               for v in (30.0, 33.0, 36.0) for r in (None, 0.3, 0.8)]
+    out = degradation.catalog_sweep(PCS, modules, years=30)
+    for k, module in enumerate(modules):
+        min_s, _ = engine.series_bounds(PCS, module, -10)
+        assert out["series"][k] == min_s
+        proj = degradation.project_layout(PCS, module, [[min_s]], years=30)
+        expected = -1 if proj["first_year_below"] is None else proj["first_year_below"]
+        assert out["first_year_below"][k] == expected
+        assert out["lifetime_min_series"][k] * proj["vmpp_string"][-1] / min_s >= PCS["mppt_min_voltage"]
+
+
+def test_degradation_rate_is_stored_and_imported():
+    db.save_module("Maker", "DEG-1", 300.0, 40.0, 32.0, 9.0, -0.3, degradation=0.4)
+    db.save_module("Maker", "DEG-2", 300.0, 40.0, 32.0, 9.0, -0.3)
+    csv_text = ("manufacturer,model_number,pmax_stc,voc_stc,vmpp_noc,isc_noc,temp_coeff,degradation_rate\n"
+                "Maker,DEG-3,300,40,32,9,-0.3,0.25\n"
+                "Maker,DEG-4,300,40,32,9,-0.3,-0.5\n"
+                "Maker,DEG-5,300,40,32,9,-0.3,inf\n")
+    report = db.import_catalog(io.StringIO(csv_text), "modules")
+    assert report["rows"] == 1 and [line for line, _ in report["errors"]] == [3, 4]
+    mods = db.load_modules()
+    assert mods["DEG-1"]["degradation_rate"] == 0.4
+    assert degradation.degradation_rate(mods["DEG-2"]) == degradation.DEGRADATION_RATE
+    assert mods["DEG-3"]["degradation_rate"] == 0.25
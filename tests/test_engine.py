@@ -0,0 +1,138 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import engine
+
+
+PCS = {"max_voltage": 450.0, "mppt_min_voltage": 35.0, "mppt_count": 3, "mppt_max_current": 14.0}
+MODULE = {"pmax_stc": 250.0, "voc_stc": 41.5, "vmpp_noc": 33.0, "isc_noc": 8.5, "temp_coeff": -0.29}
+
+
+def test_series_bounds_matches_app_formula():
+    t_min = -10
+    voc_a = MODULE["voc_stc"] * (1 + MODULE["temp_coeff"] / 100 * (t_min - 25))
+    vmpp_a = MODULE["vmpp_noc"] * (1 + MODULE["temp_coeff"] / 100 * (50 - 25))
+    expected = (math.ceil(35.0 / vmpp_a), math.floor(450.0 / voc_a))
+    assert engine.series_bounds(PCS, MODULE, t_min) == expected
+
+
+def test_series_bounds_batch_matches_scalar():
+    rng = np.random.default_rng(0)
+    modules = [
+        {"voc_stc": v, "vmpp_noc": v * 0.8, "temp_coeff": tc}
+        for v, tc in zip(rng.uniform(20, 60, 30), rng.uniform(-0.5, -0.2, 30))
+    ]
+    pcs_units = [
+        {"max_voltage": vmax, "mppt_min_voltage": vmin}
+        for vmax, vmin in zip(rng.uniform(300, 1000, 7), rng.uniform(30, 200, 7))
+    ]
+    t_mins = [0, -5, -10, -15, -20, -25, -30]
+
+    out = engine.series_bounds_batch(modules, pcs_units, t_mins)
+    assert out["max_series"].shape == (30, 7, 7)
+    for i, m in enumerate(modules):
+        for j, p in enumerate(pcs_units):
+            for k, t in enumerate(t_mins):
+                assert (out["min_series"][i, j, k], out["max_series"][i, j, k]) == engine.series_bounds(p, m, t)
+
+
+def test_compatibility_batch_circuits_and_power():
+    modules = [MODULE, dict(MODULE, isc_noc=15.0)]
+    out = engine.compatibility_batch(modules, [PCS], [-5])
+
+    # 14A MPPT: 8.5A module fits 1 string per MPPT, 15A module none
+    assert out["circuits"].tolist() == [[1], [0]]
+    assert out["feasible"][:, 0, 0].tolist() == [True, False]
+    min_s, max_s = engine.series_bounds(PCS, MODULE, -5)
+    assert out["max_power_w"][0, 0, 0] == 3 * 1 * max_s * MODULE["pmax_stc"]
+    assert out["max_power_w"][1, 0, 0] == 0.0
+
+
+
+def test_compatibility_table_has_one_row_per_combination():
+    modules = {"A": MODULE, "B": dict(MODULE, isc_noc=15.0), "C": dict(MODULE, voc_stc=45.0)}
+    pcs_units = {"P1": PCS, "P2": dict(PCS, mppt_max_current=30.0, circuits_per_mppt=2)}
+    t_mins = [-5, -15]
+    table = engine.compatibility_table(modules, pcs_units, t_mins)
+    assert all(len(col) == 3 * 2 * 2 for col in table.values())
+    for k in range(12):
+        module, pcs = modules[table["model_number"][k]], pcs_units[table["pcs_name"][k]]
+        min_s, max_s = engine.series_bounds(pcs, module, table["t_min"][k])
+        assert (table["min_series"][k], table["max_series"][k]) == (min_s, max_s)
+    # B fits no string on P1 but two per MPPT on P2
+    rows = [k for k in range(12) if table["model_number"][k] == "B"]
+    assert {(table["pcs_name"][k], int(table["circuits"][k]), bool(table["feasible"][k])) for k in rows} == \
+        {("P1", 0, False), ("P2", 2, True)}
+
+def test_calc_cache_hits_evicts_and_clears(monkeypatch):
+    monkeypatch.setattr(engine, "CALC_CACHE_SIZE", 2)
+    engine.clear_calc_cache()
+    base = engine.calc_cache_stats()
+
+    assert engine.cached_series_bounds(PCS, MODULE, -5) == engine.series_bounds(PCS, MODULE, -5)
+    # Equal specs share an entry even when they are different dicts
+    engine.cached_series_bounds(dict(PCS), dict(MODULE), -5)
+    layout = [[10, 10, 0], [99, 0, 0], [0, 0, 0]]
+    assert engine.cached_validate_layout(PCS, MODULE, layout, -5) == tuple(engine.validate_layout(PCS, MODULE, layout, -5))
+    engine.cached_series_bounds(PCS, MODULE, -10)
+
+    stats = engine.calc_cache_stats()
+    assert (stats["hits"] - base["hits"], stats["misses"] - base["misses"]) == (1, 3)
+    assert stats["size"] == 2 and stats["evictions"] - base["evictions"] == 1
+
+    engine.clear_calc_cache()
+    assert engine.calc_cache_stats()["size"] == 0
+
+
+def test_validate_grid_flags_cells_like_validate_layout():
+    min_s, max_s = engine.series_bounds(PCS, MODULE, -5)
+    series = [
+        [min_s, min_s, 0, 0],
+        [max_s + 1, min_s, 0, 0],   # out of range, then mismatch
+        [0, min_s, 0, 0],
+    ]
+    out = engine.validate_grid(PCS, MODULE, series, -5)
+
+    assert out["range"].tolist()[1] == [True, False, False, False]
+    assert out["mismatch"].tolist()[1] == [False, True, False, False]
+    # 2 × 8.5A exceeds the 14A MPPT limit
+    assert out["current"].tolist() == [True, True, False]
+    assert out["total"] == 3 * min_s + max_s + 1 + min_s
+    assert engine.validate_layout(PCS, MODULE, series, -5) == [
+        (0, None, "current"), (1, 0, "range"), (1, 1, "mismatch"), (1, None, "current"),
+    ]
+
+
+def test_validate_layouts_batch_matches_single_layouts():
+    big = {"max_voltage": 1000.0, "mppt_min_voltage": 200.0, "mppt_count": 6, "mppt_max_current": 30.0}
+    units = [
+        (PCS, MODULE, [[9, 0, 0], [9, 0, 0], [8, 0, 0]]),
+        (PCS, MODULE, [[9, 9, 0], [0, 0, 0], [0, 0, 0]]),
+        (big, dict(MODULE, isc_noc=10.0), [[20, 20], [20, 19], [0, 0], [0, 0], [0, 0], [30, 0]]),
+        (big, MODULE, [[0, 0]] * 6),
+    ]
+    out = engine.validate_layouts_batch([u[0] for u in units], [u[1] for u in units], [u[2] for u in units], -10)
+
+    for k, (pcs, module, series) in enumerate(units):
+        single = engine.validate_grid(pcs, module, series, -10)
+        n, c = len(series), len(series[0])
+        assert (out["range"][k, :n, :c] == single["range"]).all()
+        assert (out["mismatch"][k, :n, :c] == single["mismatch"]).all()
+        assert (out["current"][k, :n] == single["current"]).all()
+        assert out["total"][k] == single["total"]
+        assert bool(out["valid"][k]) == (engine.validate_layout(pcs, module, series, -10) == [])
+
+
+def test_layouts_on_missing_inputs_or_circuits_are_invalid():
+    pcs = dict(PCS, mppt_count=2, circuits_per_mppt=1, mppt_max_current=30.0)
+    layouts = [[[9], [9]], [[9], [9], [9]], [[9, 9], [9]], [[9, 0, 0], [9, 0, 0], [0, 0, 0]]]
+    out = engine.validate_layouts_batch([pcs] * 4, [MODULE] * 4, layouts, -10)
+    assert out["valid"].tolist() == [True, False, False, True]
+    errors = engine.layout_errors(out)
+    assert errors[1] == [(None, None, "mppt_count")]
+    assert errors[2] == [(None, None, "circuits")]
+    assert engine.validate_layout(pcs, MODULE, layouts[1], -10) == [(None, None, "mppt_count")]
@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import engine
+import planner
+
+
+MODULES = {
+    "M250": {"manufacturer": "A", "pmax_stc": 250.0, "voc_stc": 41.5, "vmpp_noc": 33.0, "isc_noc": 8.5, "temp_coeff": -0.29},
+    "M400": {"manufacturer": "B", "pmax_stc": 400.0, "voc_stc": 49.0, "vmpp_noc": 41.0, "isc_noc": 10.0, "temp_coeff": -0.3},
+    "M-HOT": {"manufacturer": "C", "pmax_stc": 300.0, "voc_stc": 40.0, "vmpp_noc": 32.0, "isc_noc": 31.0, "temp_coeff": -0.3},
+}
+PCS_UNITS = {
+    "Small": {"model_number": "S", "max_voltage": 450.0, "mppt_min_voltage": 35.0, "mppt_count": 3, "mppt_max_current": 14.0},
+    "Large": {"model_number": "L", "max_voltage": 1000.0, "mppt_min_voltage": 150.0, "mppt_count": 6, "mppt_max_current": 30.0},
+}
+
+
+def test_find_systems_hits_target_with_valid_layouts():
+    out = planner.find_systems(50.0, MODULES, PCS_UNITS, -10, max_pcs=4, k=5)
+    systems = out["systems"]
+    assert out["complete"] and systems
+    assert systems[0]["error_kw"] == 0.0
+    keys = [(s["error_kw"], s["pcs_count"], s["total_modules"]) for s in systems]
+    assert keys == sorted(keys)
+    # The 31 A module never fits a 14/30 A MPPT input
+    assert all(s["model_number"] != "M-HOT" for s in systems)
+
+    for s in systems:
+        module, pcs = MODULES[s["model_number"]], PCS_UNITS[s["pcs_name"]]
+        assert len(s["layouts"]) == s["pcs_count"]
+        assert sum(sum(map(sum, layout)) for layout in s["layouts"]) == s["total_modules"]
+        for layout in s["layouts"]:
+            assert engine.validate_layout(pcs, module, layout, -10) == []
+
+
+def test_find_systems_respects_module_and_pcs_limits():
+    out = planner.find_systems(50.0, MODULES, PCS_UNITS, -10, max_modules=100, max_pcs=1, k=3)
+    for s in out["systems"]:
+        assert s["pcs_count"] == 1
+        assert s["total_modules"] <= 100
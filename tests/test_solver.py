@@ -0,0 +1,51 @@
+import itertools
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import engine
+import solver
+
+
+PCS = {"max_voltage": 450.0, "mppt_min_voltage": 150.0, "mppt_count": 3, "mppt_max_current": 20.0}
+MODULE = {"pmax_stc": 250.0, "voc_stc": 41.5, "vmpp_noc": 33.0, "isc_noc": 8.5, "temp_coeff": -0.29}
+
+
+def brute_force_totals():
+    options = [(0, 0)] + solver.mppt_options(PCS, MODULE, -5)
+    totals = set()
+    for combo in itertools.product(options, repeat=PCS["mppt_count"]):
+        total = sum(n * s for n, s in combo)
+        if total:
+            totals.add(total)
+    return sorted(totals)
+
+
+def test_solve_layouts_returns_valid_layouts_best_first():
+    layouts = solver.solve_layouts(PCS, MODULE, -5, k=4)
+    assert len(layouts) == 4
+    assert layouts[0]["total_modules"] == brute_force_totals()[-1]
+    assert [l["total_modules"] for l in layouts] == sorted((l["total_modules"] for l in layouts), reverse=True)
+    for layout in layouts:
+        assert len(layout["series"]) == PCS["mppt_count"]
+        assert engine.validate_layout(PCS, MODULE, layout["series"], -5) == []
+        assert layout["power_w"] == layout["total_modules"] * MODULE["pmax_stc"]
+
+
+def test_solve_layouts_closest_to_target():
+    totals = brute_force_totals()
+    target_modules = 23
+    expected = min(totals, key=lambda t: (abs(t - target_modules), -t))
+
+    layouts = solver.solve_layouts(PCS, MODULE, -5, k=3, target_kw=target_modules * 0.25)
+    assert layouts[0]["total_modules"] == expected
+    for layout in layouts:
+        assert engine.validate_layout(PCS, MODULE, layout["series"], -5) == []
+
+
+def test_validate_layout_reports_app_rule_violations():
+    min_s, max_s = engine.series_bounds(PCS, MODULE, -5)
+    assert engine.validate_layout(PCS, MODULE, [[max_s + 1, 0, 0], [0, 0, 0], [0, 0, 0]], -5) == [(0, 0, "range")]
+    assert engine.validate_layout(PCS, MODULE, [[min_s, min_s + 1, 0], [0, 0, 0], [0, 0, 0]], -5) == [(0, 1, "mismatch")]
+    assert engine.validate_layout(PCS, MODULE, [[min_s] * 3, [0, 0, 0], [0, 0, 0]], -5) == [(0, None, "current")]
+    assert engine.validate_layout(PCS, MODULE, [[0, 0, 0]] * 3, -5) == [(None, None, "empty")]
@@ -0,0 +1,51 @@
+import io
+import os
+import random
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import db
+import engine
+import stations
+
+
+def setup_module(module):
+    db._conn = sqlite3.connect(":memory:", check_same_thread=False)
+    db._migrated_conn = None
+    db.init_db()
+
+
+def test_import_stations_and_postal_lookup():
+    csv_text = (
+        "station_id,name,lat,lon,postal_code,record_low,design_high\n"
+        "14163,札幌,43.06,141.33,060-0001,-28.5,36.3\n"
+        "44132,東京,35.69,139.75,100-0001,-9.2,39.5\n"
+        "62078,大阪,34.68,135.52,530-0001,-7.5,\n"
+        "99999,不正,95.0,139.0,,0,\n"
+    )
+    report = db.import_catalog(io.StringIO(csv_text), "stations")
+    assert report["rows"] == 3 and len(report["errors"]) == 1
+    assert db.load_stations()["14163"]["postal_code"] == "0600001"
+
+    hit = stations.stations_near_postal("060", k=1)[0]
+    assert hit["station_id"] == "14163" and hit["distance_km"] < 1
+    assert stations.stations_near_postal("999") == []
+    # Tokyo is nearer to Osaka than Sapporo is
+    assert [s["name"] for s in stations.nearest_stations(34.7, 135.5, k=3)] == ["大阪", "東京", "札幌"]
+
+    t_min, t_max = stations.site_temperatures(db.load_stations()["44132"])
+    assert t_min == -9.2 and t_max > 39.5
+    assert stations.site_temperatures(db.load_stations()["62078"])[1] == engine.T_MAX
+
+
+def test_grid_search_matches_brute_force():
+    rng = random.Random(3)
+    catalog = {f"S{k}": {"lat": rng.uniform(24, 46), "lon": rng.uniform(123, 146)} for k in range(800)}
+    index = stations.build_index(catalog)
+    ids = list(catalog)
+    for _ in range(200):
+        lat, lon = rng.uniform(20, 50), rng.uniform(120, 150)
+        brute = sorted((stations.haversine_km(lat, lon, s["lat"], s["lon"]), sid) for sid, s in catalog.items())
+        got = stations.nearest(index, lat, lon, k=4)
+        assert [ids[i] for _, i in got] == [sid for _, sid in brute[:4]]
@@ -0,0 +1,39 @@
+import math
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import engine
+import tolerance
+
+
+PCS = {"max_voltage": 450.0, "mppt_min_voltage": 35.0, "mppt_count": 3, "mppt_max_current": 14.0}
+MODULE = {"pmax_stc": 250.0, "voc_stc": 41.5, "vmpp_noc": 33.0, "isc_noc": 8.5, "temp_coeff": -0.29}
+NO_SPREAD = dict(voc_sd=0.0, vmpp_sd=0.0, temp_coeff_sd=0.0, t_min_sd=0.0, t_max_sd=0.0)
+
+
+def test_without_spread_matches_series_bounds():
+    min_s, max_s = engine.series_bounds(PCS, MODULE, -10)
+    report = tolerance.exceedance_probability(PCS, MODULE, range(1, max_s + 3), -10,
+                                              samples=1000, seed=0, **NO_SPREAD)
+    assert (report["min_series"], report["max_series"]) == (min_s, max_s)
+    for row in report["rows"]:
+        assert row["p_fail"] == (0.0 if min_s <= row["series"] <= max_s else 1.0)
+
+
+def test_voc_spread_matches_normal_tail():
+    spread = dict(NO_SPREAD, voc_sd=0.02)
+    report = tolerance.exceedance_probability(PCS, MODULE, [10], -10, samples=250_000, seed=1,
+                                              chunk_size=40_000, **spread)
+    voc_cold, _ = engine.corrected_voltages(MODULE, -10)
+    z = (PCS["max_voltage"] / 10 / voc_cold - 1) / 0.02
+    expected = 0.5 * math.erfc(z / math.sqrt(2))
+    assert abs(report["rows"][0]["p_over_max_voltage"] - expected) < 0.005
+    assert report["rows"][0]["p_under_mppt_min"] == 0.0
+
+
+def test_seeded_result_does_not_depend_on_workers():
+    args = (PCS, MODULE, [9, 10], -10)
+    one = tolerance.exceedance_probability(*args, samples=50_000, seed=7, chunk_size=10_000)
+    two = tolerance.exceedance_probability(*args, samples=50_000, seed=7, chunk_size=10_000, workers=2)
+    assert one["rows"] == two["rows"]
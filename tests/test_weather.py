@@ -0,0 +1,64 @@
+import io
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import engine
+import weather
+
+
+PCS = {"max_voltage": 450.0, "mppt_min_voltage": 35.0, "mppt_count": 3, "mppt_max_current": 14.0}
+MODULE = {"pmax_stc": 250.0, "voc_stc": 41.5, "vmpp_noc": 33.0, "isc_noc": 8.5, "temp_coeff": -0.29}
+
+
+def test_load_hourly_finds_columns_and_drops_gaps():
+    csv_text = "日時,気温,日射量\n2020-01-01 00:00,-5,0\n2020-01-01 09:00,-4,\n2020-01-01 10:00,-3.5,420\n"
+    temp_air, irradiance = weather.load_hourly(io.StringIO(csv_text))
+    assert temp_air.tolist() == [-5.0, -3.5]
+    assert irradiance.tolist() == [0.0, 420.0]
+
+
+def test_voltage_report_matches_brute_force():
+    rng = np.random.default_rng(1)
+    temp_air = rng.uniform(-30, 40, 5000)
+    irradiance = np.where(rng.random(5000) < 0.5, 0.0, rng.uniform(1, 1000, 5000))
+    report = weather.voltage_report(PCS, MODULE, temp_air, irradiance)
+
+    lit = irradiance > 0
+    t_cell = temp_air[lit] + (weather.NOCT - 20) / 800 * irradiance[lit]
+    voc = engine.corrected_voltages(MODULE, t_cell, t_cell)[0]
+    vmpp = engine.corrected_voltages(MODULE, t_cell, t_cell)[1]
+    assert report["sunlit_hours"] == lit.sum()
+    assert report["voc_max"] == voc.max()
+    for row in report["rows"]:
+        n = row["series"]
+        assert row["hours_over_max_voltage"] == (n * voc > PCS["max_voltage"]).sum()
+        assert row["hours_under_mppt_min"] == (n * vmpp < PCS["mppt_min_voltage"]).sum()
+    assert report["max_series"] == max(r["series"] for r in report["rows"] if r["hours_over_max_voltage"] == 0)
+
+
+def test_yield_batch_matches_hourly_clipping():
+    rng = np.random.default_rng(2)
+    hours = 2 * weather.HOURS_PER_YEAR
+    temp_air = rng.uniform(-10, 35, hours)
+    irradiance = np.where(rng.random(hours) < 0.5, 0.0, rng.uniform(1, 1100, hours))
+    pcs_units = [dict(PCS, ac_rating_kw=4.0), dict(PCS, ac_rating_kw=4.0), PCS]
+    totals = [10, 27, 27]
+    results = weather.yield_batch(pcs_units, [MODULE] * 3, totals, temp_air, irradiance)
+
+    shape = weather.dc_shape(temp_air, irradiance)
+    for pcs, total, res in zip(pcs_units, totals, results):
+        dc = total * MODULE["pmax_stc"] / 1000 * shape
+        ac = dc * weather.INVERTER_EFFICIENCY
+        if pcs.get("ac_rating_kw"):
+            ac = np.minimum(ac, pcs["ac_rating_kw"])
+        assert np.isclose(res["dc_kwh"], dc.sum() / 2)
+        assert np.isclose(res["ac_kwh"], ac.sum() / 2)
+        assert np.isclose(res["clipped_kwh"], (dc * weather.INVERTER_EFFICIENCY - ac).sum() / 2)
+    assert results[0]["clipped_kwh"] < results[1]["clipped_kwh"]
+    assert results[2]["ac_missing"] and results[2]["clipped_kwh"] == 0
+
+    single = weather.energy_yield(pcs_units[1], MODULE, [[9, 9, 0], [9, 0, 0]], temp_air, irradiance)
+    assert single == results[1]
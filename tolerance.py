@@ -0,0 +1,107 @@
+# tolerance.py
+# Monte Carlo view of the ➂ series bounds. engine.series_bounds() treats
+# voc_stc, vmpp_noc and temp_coeff as exact and the site temperatures as
+# fixed points; here they are drawn from normal distributions (datasheet
+# tolerance / lot spread, year-to-year site extremes) and the result is the
+# probability that a series count goes over max_voltage on the cold day or
+# under mppt_min_voltage on the hot day.
+#
+# One draw is one string: all modules of a string come from the same lot,
+# so the string voltage is n × the drawn module voltage (the conservative
+# case; independent modules would average their spread out).
+#
+# Draws are generated and evaluated in chunks of CHUNK_SIZE, and only the
+# exceedance counts are kept, so memory is a few arrays of CHUNK_SIZE
+# floats per worker whatever the sample count. Each chunk has its own seed
+# spawned from one SeedSequence, so a seeded run gives the same result for
+# any number of workers.
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+
+CHUNK_SIZE = 100_000
+DEFAULT_SAMPLES = 200_000
+
+# 1σ spreads: module parameters relative to the datasheet value, site
+# temperatures in ℃
+VOC_SD       = 0.01
+VMPP_SD      = 0.015
+TEMP_COEFF_SD = 0.05
+T_MIN_SD     = 2.0
+T_MAX_SD     = 2.0
+
+def sample_voltages(module, size, rng, t_min, t_max=engine.T_MAX, voc_sd=VOC_SD, vmpp_sd=VMPP_SD,
+                    temp_coeff_sd=TEMP_COEFF_SD, t_min_sd=T_MIN_SD, t_max_sd=T_MAX_SD):
+    """Draw ``size`` (Voc on the cold day, Vmpp on the hot day) module voltage pairs."""
+    z = rng.standard_normal((5, size))
+    drawn = {
+        "voc_stc":    module["voc_stc"]    * (1 + voc_sd * z[0]),
+        "vmpp_noc":   module["vmpp_noc"]   * (1 + vmpp_sd * z[1]),
+        "temp_coeff": module["temp_coeff"] * (1 + temp_coeff_sd * z[2]),
+    }
+    return engine.corrected_voltages(drawn, t_min + t_min_sd * z[3], t_max + t_max_sd * z[4])
+
+def _chunk_counts(pcs, module, series, seed, size, t_min, t_max, spreads):
+    """(over, under, either) counts per series count for one chunk of draws."""
+    voc, vmpp = sample_voltages(module, size, np.random.default_rng(seed), t_min, t_max, **spreads)
+    counts = np.zeros((3, len(series)), dtype=np.int64)
+    for k, n in enumerate(series):
+        over  = voc  > pcs["max_voltage"] / n
+        under = vmpp < pcs["mppt_min_voltage"] / n
+        counts[:, k] = over.sum(), under.sum(), (over | under).sum()
+    return counts
+
+def _chunk_sizes(samples, chunk_size):
+    full, rest = divmod(samples, chunk_size)
+    return [chunk_size] * full + ([rest] if rest else [])
+
+def exceedance_probability(pcs, module, series, t_min, t_max=engine.T_MAX, samples=DEFAULT_SAMPLES,
+                           seed=None, workers=1, chunk_size=CHUNK_SIZE, **spreads):
+    """Probability that each series count in ``series`` violates the PCS voltage window.
+
+    ``spreads`` overrides the 1σ defaults (voc_sd, vmpp_sd, temp_coeff_sd,
+    t_min_sd, t_max_sd). ``workers`` > 1 spreads the chunks over a process
+    pool (None: CPU count). Returns a dict with ``samples``, ``seconds``,
+    the nominal ``min_series`` / ``max_series`` and ``rows``: per series
+    count the probabilities ``p_over_max_voltage``, ``p_under_mppt_min``
+    and ``p_fail`` (either).
+    """
+    series = [int(n) for n in series]
+    if samples <= 0 or not series or min(series) <= 0:
+        raise ValueError("samples and series counts must be positive")
+    workers = workers or os.cpu_count() or 1
+    sizes = _chunk_sizes(int(samples), int(chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = ((pcs, module, series, s, n, t_min, t_max, spreads) for s, n in zip(seeds, sizes))
+    counts = np.zeros((3, len(series)), dtype=np.int64)
+    start = time.perf_counter()
+
+    if workers == 1:
+        for job in jobs:
+            counts += _chunk_counts(*job)
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            for job in jobs:
+                pending.append(pool.submit(_chunk_counts, *job))
+                # Bounded number of chunks in flight
+                while len(pending) > 2 * workers:
+                    counts += pending.popleft().result()
+            while pending:
+                counts += pending.popleft().result()
+
+    min_s, max_s = engine.series_bounds(pcs, module, t_min, t_max)
+    p = counts / float(samples)
+    return {
+        "samples": int(samples),
+        "seconds": time.perf_counter() - start,
+        "min_series": min_s, "max_series": max_s,
+        "rows": [{"series": n, "p_over_max_voltage": float(p[0, k]),
+                  "p_under_mppt_min": float(p[1, k]), "p_fail": float(p[2, k])}
+                 for k, n in enumerate(series)],
+    }
@@ -0,0 +1,164 @@
+# weather.py
+# Check series counts against an hourly weather record instead of the single
+# worst-case point (t_min selectbox, engine.T_MAX) of the circuit-config
+# section.
+#
+# Cell temperature follows the NOCT model, and Voc / Vmpp use the same
+# linear temperature coefficient as engine.corrected_voltages(). Only hours
+# with sunlight (irradiance above a threshold) are counted: at night the
+# array produces no voltage. Exceedance hours for every candidate series
+# count come from one sort of the hourly voltages plus np.searchsorted, so
+# the cost is O(H log H) however many series counts are checked. The same
+# record also gives the annual energy yield with inverter clipping (see
+# "Energy yield" below).
+import numpy as np
+import pandas as pd
+
+import engine
+
+NOCT = 45.0              # ℃, nominal operating cell temperature (800 W/m², 20 ℃ ambient)
+MIN_IRRADIANCE = 0.0     # W/m², hours at or below this are treated as dark
+
+# Accepted column names (lower-cased) of the hourly file
+_TEMP_COLUMNS = ("temp_air", "temperature", "temp", "気温")
+_IRR_COLUMNS  = ("ghi", "irradiance", "poa", "日射量")
+
+def _pick(columns, names, what):
+    lookup = {str(c).strip().lower(): c for c in columns}
+    for name in names:
+        if name in lookup:
+            return lookup[name]
+    raise ValueError(f"no {what} column (expected one of: {', '.join(names)})")
+
+def load_hourly(source):
+    """Read an hourly weather CSV; returns (temp_air ℃, irradiance W/m²) float arrays.
+
+    ``source`` is a path or file object. Temperature and irradiance columns
+    are found by name (temp_air / temperature / 気温, ghi / irradiance /
+    poa / 日射量); other columns such as timestamps are ignored. Rows with
+    missing values are dropped.
+    """
+    df = pd.read_csv(source, encoding="utf-8-sig")
+    t_col = _pick(df.columns, _TEMP_COLUMNS, "temperature")
+    g_col = _pick(df.columns, _IRR_COLUMNS, "irradiance")
+    df = df[[t_col, g_col]].apply(pd.to_numeric, errors="coerce").dropna()
+    return df[t_col].to_numpy(dtype=float), df[g_col].to_numpy(dtype=float)
+
+def cell_temperature(temp_air, irradiance, noct=NOCT):
+    """NOCT model: T_cell = T_air + (NOCT - 20) / 800 × G."""
+    return np.asarray(temp_air, dtype=float) + (noct - 20) / 800 * np.asarray(irradiance, dtype=float)
+
+def hourly_voltages(module, temp_air, irradiance, noct=NOCT, min_irradiance=MIN_IRRADIANCE):
+    """Per-hour module Voc and Vmpp for the sunlit hours (arrays of equal length)."""
+    irradiance = np.asarray(irradiance, dtype=float)
+    lit = irradiance > min_irradiance
+    t_cell = cell_temperature(np.asarray(temp_air, dtype=float)[lit], irradiance[lit], noct)
+    tc = module["temp_coeff"] / 100
+    voc  = module["voc_stc"]  * (1 + tc * (t_cell - engine.STC_TEMP))
+    vmpp = module["vmpp_noc"] * (1 + tc * (t_cell - engine.STC_TEMP))
+    return voc, vmpp, t_cell
+
+def voltage_report(pcs, module, temp_air, irradiance, series=None, noct=NOCT,
+                   min_irradiance=MIN_IRRADIANCE):
+    """Record-extreme string voltages and exceedance hours per series count.
+
+    Returns a dict with ``hours`` (rows) and ``sunlit_hours``, the record
+    ``voc_max`` / ``vmpp_min`` (per module) and cell temperatures, the
+    series range the record allows (``min_series`` / ``max_series``) and
+    ``rows``: for each series count n in ``series`` (default: 1 to a few
+    above max_series) the hours with n × Voc above max_voltage and the
+    hours with n × Vmpp below mppt_min_voltage.
+    """
+    voc, vmpp, t_cell = hourly_voltages(module, temp_air, irradiance, noct, min_irradiance)
+    report = {"hours": int(np.size(temp_air)), "sunlit_hours": int(voc.size)}
+    if voc.size == 0:
+        return dict(report, voc_max=None, vmpp_min=None, t_cell_min=None, t_cell_max=None,
+                    min_series=None, max_series=None, rows=[])
+
+    voc_max, vmpp_min = float(voc.max()), float(vmpp.min())
+    max_s = int(np.floor(pcs["max_voltage"] / voc_max)) if voc_max > 0 else 0
+    min_s = int(np.ceil(pcs["mppt_min_voltage"] / vmpp_min)) if vmpp_min > 0 else 0
+    if series is None:
+        series = range(1, max(max_s, min_s) + 3)
+    n = np.asarray(list(series), dtype=float)
+
+    # Hours with n × V beyond a limit == hours with V beyond limit / n
+    voc_sorted, vmpp_sorted = np.sort(voc), np.sort(vmpp)
+    over  = voc.size - np.searchsorted(voc_sorted, pcs["max_voltage"] / n, side="right")
+    under = np.searchsorted(vmpp_sorted, pcs["mppt_min_voltage"] / n, side="left")
+
+    return dict(
+        report,
+        voc_max=voc_max, vmpp_min=vmpp_min,
+        t_cell_min=float(t_cell.min()), t_cell_max=float(t_cell.max()),
+        min_series=min_s, max_series=max_s,
+        rows=[{"series": int(s), "hours_over_max_voltage": int(o), "hours_under_mppt_min": int(u)}
+              for s, o, u in zip(n, over, under)],
+    )
+
+# --- Energy yield ---
+# Hourly DC power of a layout is its STC capacity (total modules × pmax_stc)
+# times one per-hour shape, G/1000 × (1 + γ (T_cell - 25)), shared by every
+# layout. AC output is min(DC × efficiency, ac_rating_kw), so with the shape
+# sorted once and its prefix sums, the clipped energy of any layout is one
+# np.searchsorted: hours under the clipping threshold contribute their DC,
+# the rest the AC rating. Comparing L layouts over H hours costs
+# O(H log H + L log H) instead of O(L × H).
+POWER_TEMP_COEFF    = -0.40   # %/℃, Pmax (the catalog only has the Voc coefficient)
+INVERTER_EFFICIENCY = 0.96
+HOURS_PER_YEAR      = 8760
+
+def dc_shape(temp_air, irradiance, noct=NOCT, power_temp_coeff=POWER_TEMP_COEFF):
+    """Per-hour DC output per kW of STC capacity (kW/kWp), never negative."""
+    irradiance = np.asarray(irradiance, dtype=float)
+    t_cell = cell_temperature(temp_air, irradiance, noct)
+    shape = irradiance / 1000 * (1 + power_temp_coeff / 100 * (t_cell - engine.STC_TEMP))
+    return np.clip(shape, 0.0, None)
+
+def yield_batch(pcs_units, modules, totals, temp_air, irradiance, noct=NOCT,
+                power_temp_coeff=POWER_TEMP_COEFF, efficiency=INVERTER_EFFICIENCY):
+    """Annual energy of many layouts over one hourly record; layout k is
+    (pcs_units[k], modules[k], totals[k] modules).
+
+    Returns a list of dicts with ``dc_kw`` (STC capacity), ``peak_dc_kw``,
+    annual ``dc_kwh`` (array output), ``ac_kwh`` and ``clipped_kwh``
+    (AC energy lost to the rating), ``clipped_hours`` (per year),
+    ``clipping_ratio`` (clipped share of the unclipped AC energy),
+    ``dc_ac_ratio``, ``specific_yield`` (kWh/kWp) and ``ac_missing`` (the
+    PCS has no ac_rating_kw, so nothing is clipped).
+    """
+    shape = np.sort(dc_shape(temp_air, irradiance, noct, power_temp_coeff))
+    prefix = np.concatenate(([0.0], np.cumsum(shape)))
+    years = shape.size / HOURS_PER_YEAR if shape.size else 1.0
+
+    dc_kw = np.array([t * m["pmax_stc"] / 1000 for t, m in zip(totals, modules)], dtype=float)
+    ac_kw = np.array([p.get("ac_rating_kw") or np.inf for p in pcs_units], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Hours with shape × dc_kw × efficiency at or above the AC rating are clipped
+        threshold = np.where(dc_kw > 0, ac_kw / (efficiency * dc_kw), np.inf)
+    split = np.searchsorted(shape, threshold, side="left")
+    clipped_hours = shape.size - split
+
+    dc_kwh = dc_kw * prefix[-1]
+    # No AC rating: threshold is inf, so no hour is clipped
+    ac_kwh = dc_kw * prefix[split] * efficiency + np.where(np.isfinite(ac_kw), ac_kw, 0.0) * clipped_hours
+    clipped_kwh = dc_kwh * efficiency - ac_kwh
+    peak = dc_kw * (shape[-1] if shape.size else 0.0)
+
+    return [{
+        "dc_kw": float(dc_kw[k]),
+        "peak_dc_kw": float(peak[k]),
+        "dc_kwh": float(dc_kwh[k] / years),
+        "ac_kwh": float(ac_kwh[k] / years),
+        "clipped_kwh": float(clipped_kwh[k] / years),
+        "clipped_hours": float(clipped_hours[k] / years),
+        "clipping_ratio": float(clipped_kwh[k] / (dc_kwh[k] * efficiency)) if dc_kwh[k] > 0 else 0.0,
+        "dc_ac_ratio": float(dc_kw[k] / ac_kw[k]) if np.isfinite(ac_kw[k]) else None,
+        "specific_yield": float(ac_kwh[k] / years / dc_kw[k]) if dc_kw[k] > 0 else 0.0,
+        "ac_missing": not np.isfinite(ac_kw[k]),
+    } for k in range(len(dc_kw))]
+
+def energy_yield(pcs, module, series, temp_air, irradiance, **kwargs):
+    """yield_batch() for one string layout (MPPT inputs × circuits of series counts)."""
+    total = sum(s for row in series for s in row if s > 0)
+    return yield_batch([pcs], [module], [total], temp_air, irradiance, **kwargs)[0]